@@ -0,0 +1,123 @@
+"""Upload size limits, enforced while the request body is still arriving.
+
+``UploadLimitMiddleware`` caps whole request bodies at
+``settings.max_upload_bytes`` (``bulk_max_upload_bytes`` for bulk job
+archives): a larger ``Content-Length`` is refused before anything is read,
+and a chunked body is cut off with 413 as soon as it crosses the limit, so an
+oversized upload is never spooled in full. ``read_image`` then caps each
+uploaded file at ``settings.max_image_bytes``.
+"""
+
+import asyncio
+import shutil
+import zipfile
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.services import images
+
+CHUNK_SIZE = 64 * 1024
+BULK_PATH = "/api/v1/jobs/"
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+
+
+async def read_image(upload: UploadFile) -> bytes:
+    """Read an uploaded image in chunks, refusing it with 413 past ``max_image_bytes``."""
+    limit = settings.max_image_bytes
+    if upload.size is not None and limit and upload.size > limit:
+        raise _too_large(limit)
+    chunks = []
+    received = 0
+    while chunk := await upload.read(CHUNK_SIZE):
+        received += len(chunk)
+        if limit and received > limit:
+            raise _too_large(limit)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def read_image_archive(upload: UploadFile, max_images: int) -> list[tuple[str, bytes]]:
+    """Read the images of an uploaded zip archive as ``(name, bytes)`` in name order.
+    Raises HTTPException for a bad archive, too many images or an oversized image."""
+    try:
+        with zipfile.ZipFile(upload.file) as archive:
+            members = sorted(
+                (info for info in archive.infolist() if _is_image(info.filename)),
+                key=lambda info: info.filename,
+            )
+            if len(members) > max_images:
+                raise HTTPException(status_code=400, detail=f"Maximum {max_images} images allowed")
+            limit = settings.max_image_bytes
+            for info in members:
+                # Checked before inflating anything
+                if limit and info.file_size > limit:
+                    raise _too_large(limit)
+            return [(info.filename, archive.read(info)) for info in members]
+    except zipfile.BadZipFile as e:
+        raise HTTPException(status_code=400, detail=f"Not a zip archive: {e}") from e
+
+
+def _is_image(name: str) -> bool:
+    base = name.rsplit("/", 1)[-1]
+    return not base.startswith(".") and base.lower().endswith(images.IMAGE_SUFFIXES)
+
+
+async def save_upload(upload: UploadFile, path: Path) -> None:
+    """Copy an upload (already spooled by the request parser) to ``path``."""
+
+    def copy() -> None:
+        upload.file.seek(0)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(upload.file, f, CHUNK_SIZE)
+
+    await asyncio.to_thread(copy)
+
+
+class UploadLimitMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["path"].startswith(BULK_PATH):
+            limit = settings.bulk_max_upload_bytes
+        else:
+            limit = settings.max_upload_bytes
+        if not limit:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 413,
+                    "headers": [(b"content-type", b"application/json"), (b"connection", b"close")],
+                }
+            )
+            body = b'{"detail":"Upload exceeds %d bytes"}' % limit
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Re-raised by FastAPI's body parsing and rendered by its handlers
+                    raise _too_large(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
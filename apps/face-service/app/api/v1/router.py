@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1.routes import attendance, camera, enrollment, health, stream
+from app.api.v1.routes import attendance, camera, enrollment, health, jobs, stream
 
 api_router = APIRouter(prefix="/api/v1")
 api_router.include_router(health.router, tags=["health"])
@@ -8,3 +8,4 @@ api_router.include_router(enrollment.router)
 api_router.include_router(camera.router)
 api_router.include_router(attendance.router)
 api_router.include_router(stream.router)
+api_router.include_router(jobs.router)
@@ -1,9 +1,23 @@
+import asyncio
 import logging
+from collections.abc import AsyncIterator
+from typing import Any
 
-from fastapi import APIRouter, File, Form, UploadFile
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 
-from app.models.attendance import IdentifyResponse
-from app.services import face_engine, storage
+from app.api.uploads import read_image, read_image_archive
+from app.core.config import settings
+from app.models.attendance import (
+    BatchIdentifyResult,
+    FaceIdentification,
+    IdentifyResponse,
+    MultiIdentifyResponse,
+)
+from app.services import face_engine
+from app.services.gallery import Gallery, gallery_cache
+from app.services.images import UNDECODABLE
+from app.services.inference import inference_executor
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/attendance", tags=["attendance"])
@@ -15,24 +29,179 @@ async def identify_face(
     image: UploadFile = File(...),
 ) -> IdentifyResponse:
     """Identify a face against all enrolled employees for a company."""
-    image_bytes = await image.read()
+    image_bytes = await read_image(image)
     if not image_bytes:
         return IdentifyResponse(
             identified=False,
             message="Image is empty",
         )
 
-    enrolled = storage.load_all_encodings(company_id)
-    if not enrolled:
+    # A cold gallery load reads the store from disk, so keep it off the event loop
+    gallery = await asyncio.to_thread(gallery_cache.get, company_id)
+    if not gallery:
         return IdentifyResponse(
             identified=False,
             message="No enrolled employees found for this company",
         )
 
-    result = face_engine.identify_face(image_bytes, enrolled)
+    try:
+        encoding = await inference_executor.run(
+            face_engine.extract_encoding, image_bytes, tenant=company_id
+        )
+    except ValueError as e:
+        return IdentifyResponse(identified=False, message=str(e))
+
+    # Matching a large gallery takes a while too; numpy releases the GIL meanwhile
+    result = await asyncio.to_thread(face_engine.identify_encoding, encoding, gallery)
     return IdentifyResponse(
         identified=result["identified"],
         employee_id=result.get("employee_id"),
         confidence=result["confidence"],
         message=result["message"],
     )
+
+
+@router.post("/identify/faces", response_model=MultiIdentifyResponse)
+async def identify_faces(
+    company_id: str = Form(...),
+    image: UploadFile = File(...),
+) -> MultiIdentifyResponse:
+    """Identify every face in an image, e.g. a group walking through an entrance."""
+    image_bytes = await read_image(image)
+    if not image_bytes:
+        return MultiIdentifyResponse(faces=[], message="Image is empty")
+
+    gallery = await asyncio.to_thread(gallery_cache.get, company_id)
+    if not gallery:
+        return MultiIdentifyResponse(
+            faces=[], message="No enrolled employees found for this company"
+        )
+
+    try:
+        faces, embeddings = await inference_executor.run(
+            face_engine.embed_image_faces, image_bytes, tenant=company_id
+        )
+    except UNDECODABLE:
+        return MultiIdentifyResponse(faces=[], message="Image could not be decoded")
+    results = await asyncio.to_thread(face_engine.identify_embeddings, faces, embeddings, gallery)
+    if not results:
+        return MultiIdentifyResponse(faces=[], message="No face detected in image")
+    identified = sum(r["identified"] for r in results)
+    return MultiIdentifyResponse(
+        faces=[FaceIdentification(**r) for r in results],
+        message=f"Identified {identified} of {len(results)} faces",
+    )
+
+
+@router.post("/identify/batch", response_class=StreamingResponse)
+async def identify_batch(
+    company_id: str = Form(...),
+    images: list[UploadFile] = File(default=[]),
+    archive: UploadFile | None = File(default=None),
+) -> StreamingResponse:
+    """Identify many single-face photos at once, e.g. a kiosk's offline backlog.
+
+    Photos come as ``images`` parts, a zip ``archive``, or both. They are
+    decoded, detected and embedded in chunks on the inference pool, and every
+    chunk is matched in one matrix product. Results stream back as NDJSON, one
+    ``BatchIdentifyResult`` per photo in the order they complete.
+    """
+    max_images = settings.identify_batch_max_images
+    photos = [(image.filename or "", await read_image(image)) for image in images]
+    if len(photos) > max_images or (archive is not None and len(photos) == max_images):
+        # Refused before the archive is opened; it could not add a single image
+        raise HTTPException(status_code=400, detail=f"Maximum {max_images} images allowed")
+    if archive is not None:
+        photos += await asyncio.to_thread(read_image_archive, archive, max_images - len(photos))
+    if not photos:
+        raise HTTPException(status_code=400, detail="At least one image is required")
+
+    gallery = await asyncio.to_thread(gallery_cache.get, company_id)
+    ready: list[BatchIdentifyResult] = []
+    todo: list[int] = []
+    for i, (filename, image_bytes) in enumerate(photos):
+        if not image_bytes:
+            ready.append(_failed(i, filename, "Image is empty"))
+        elif not gallery:
+            ready.append(_failed(i, filename, "No enrolled employees found for this company"))
+        else:
+            todo.append(i)
+
+    chunk = max(settings.identify_batch_chunk, 1)
+    chunks = [todo[start : start + chunk] for start in range(0, len(todo), chunk)]
+    # Refuse the whole batch with 503 now rather than part of it mid-stream
+    inference_executor.admit(len(chunks))
+    pending = {
+        asyncio.wrap_future(
+            inference_executor.submit(
+                face_engine.extract_encodings,
+                [photos[i][1] for i in indices],
+                tenant=company_id,
+                source="batch",
+            )
+        ): indices
+        for indices in chunks
+    }
+    return StreamingResponse(
+        _stream_batch(photos, ready, pending, gallery), media_type="application/x-ndjson"
+    )
+
+
+def _failed(index: int, filename: str, message: str) -> BatchIdentifyResult:
+    return BatchIdentifyResult(index=index, filename=filename, identified=False, message=message)
+
+
+async def _stream_batch(
+    photos: list[tuple[str, bytes]],
+    ready: list[BatchIdentifyResult],
+    pending: dict[asyncio.Future[Any], list[int]],
+    gallery: Gallery,
+) -> AsyncIterator[str]:
+    try:
+        for result in ready:
+            yield result.model_dump_json() + "\n"
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=inference_executor.timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                for i in [i for indices in pending.values() for i in indices]:
+                    result = _failed(i, photos[i][0], "Face processing timed out")
+                    yield result.model_dump_json() + "\n"
+                return
+            for future in done:
+                indices = pending.pop(future)
+                try:
+                    extracted = future.result()
+                except Exception as e:
+                    logger.warning("Batch identify chunk failed: %s", e)
+                    results = [_failed(i, photos[i][0], "Face processing failed") for i in indices]
+                else:
+                    results = await asyncio.to_thread(
+                        _identify_chunk, photos, indices, extracted, gallery
+                    )
+                for result in results:
+                    yield result.model_dump_json() + "\n"
+    finally:
+        # The client went away or the batch timed out: drop chunks nobody will read
+        for future in pending:
+            future.cancel()
+
+
+def _identify_chunk(
+    photos: list[tuple[str, bytes]],
+    indices: list[int],
+    extracted: list[dict[str, Any]],
+    gallery: Gallery,
+) -> list[BatchIdentifyResult]:
+    encoded = [i for i, r in zip(indices, extracted, strict=True) if "embedding" in r]
+    matches = face_engine.identify_encodings(
+        [r["embedding"] for r in extracted if "embedding" in r], gallery
+    )
+    by_index = dict(zip(encoded, matches, strict=True))
+    return [
+        BatchIdentifyResult(index=i, filename=photos[i][0], **by_index[i])
+        if i in by_index
+        else _failed(i, photos[i][0], r["message"])
+        for i, r in zip(indices, extracted, strict=True)
+    ]
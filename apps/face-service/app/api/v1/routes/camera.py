@@ -1,24 +1,27 @@
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
 from fastapi import APIRouter, HTTPException
 
+from app.core.config import settings
 from app.models.enrollment import TestRtspRequest, TestRtspResponse
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/camera", tags=["camera"])
 
+# Dedicated threads so a camera that hangs on open can't tie up the default pool
+_rtsp_probe_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rtsp-probe")
 
-@router.post("/test-rtsp", response_model=TestRtspResponse)
-async def test_rtsp_connection(request: TestRtspRequest) -> TestRtspResponse:
-    """Test an RTSP URL connectivity by attempting to grab a single frame."""
-    rtsp_url = request.rtsp_url
-
-    if not rtsp_url:
-        raise HTTPException(status_code=400, detail="RTSP URL is required")
 
+def _grab_frame(rtsp_url: str, timeout_ms: int) -> TestRtspResponse:
+    cap = cv2.VideoCapture(
+        rtsp_url,
+        cv2.CAP_FFMPEG,
+        [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms, cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms],
+    )
     try:
-        cap = cv2.VideoCapture(rtsp_url)
         if not cap.isOpened():
             return TestRtspResponse(
                 success=False,
@@ -26,8 +29,6 @@ async def test_rtsp_connection(request: TestRtspRequest) -> TestRtspResponse:
             )
 
         ret, _ = cap.read()
-        cap.release()
-
         if not ret:
             return TestRtspResponse(
                 success=False,
@@ -38,6 +39,32 @@ async def test_rtsp_connection(request: TestRtspRequest) -> TestRtspResponse:
             success=True,
             message="Successfully connected to RTSP stream and captured a frame.",
         )
+    finally:
+        cap.release()
+
+
+@router.post("/test-rtsp", response_model=TestRtspResponse)
+async def test_rtsp_connection(request: TestRtspRequest) -> TestRtspResponse:
+    """Test an RTSP URL connectivity by attempting to grab a single frame."""
+    rtsp_url = request.rtsp_url
+
+    if not rtsp_url:
+        raise HTTPException(status_code=400, detail="RTSP URL is required")
+
+    timeout = settings.rtsp_test_timeout_seconds
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(_rtsp_probe_pool, _grab_frame, rtsp_url, int(timeout * 1000)),
+            # OpenCV enforces the timeout per operation; allow for open + read
+            timeout=2 * timeout + 1,
+        )
+    except TimeoutError:
+        logger.warning("RTSP test timed out for %s", rtsp_url)
+        return TestRtspResponse(
+            success=False,
+            message=f"Timed out after {timeout:g}s waiting for the RTSP stream.",
+        )
     except Exception as e:
         logger.warning("RTSP test failed for %s: %s", rtsp_url, e)
         return TestRtspResponse(
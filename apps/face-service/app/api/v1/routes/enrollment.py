@@ -1,7 +1,9 @@
+import asyncio
 import logging
 
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile
 
+from app.api.uploads import read_image
 from app.core.config import settings
 from app.models.enrollment import (
     DetectResponse,
@@ -10,6 +12,8 @@ from app.models.enrollment import (
     VerifyResponse,
 )
 from app.services import face_engine, storage
+from app.services.gallery import gallery_cache
+from app.services.inference import inference_executor
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/enroll", tags=["enrollment"])
@@ -31,37 +35,29 @@ async def enroll_face(
     if len(images) == 0:
         raise HTTPException(status_code=400, detail="At least one image is required")
 
-    encodings: list[list[float]] = []
+    images_bytes: list[bytes] = []
     for i, image in enumerate(images):
-        image_bytes = await image.read()
+        image_bytes = await read_image(image)
         if not image_bytes:
             raise HTTPException(status_code=400, detail=f"Image {i + 1} is empty")
+        images_bytes.append(image_bytes)
 
-        # Validate single face
-        detection = face_engine.detect_face(image_bytes)
-        if not detection["detected"]:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Image {i + 1}: {detection['message']}",
-            )
-        if detection["face_count"] > 1:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Image {i + 1}: {detection['message']}",
-            )
-
-        # Extract encoding
-        try:
-            encoding = face_engine.extract_encoding(image_bytes)
-            encodings.append(encoding)
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=f"Image {i + 1}: {e}")
-
-        # Save photo
-        storage.save_photo(company_id, employee_id, image_bytes, i)
+    # Detect, validate and embed every image in one pass and one batched model call
+    analyses = await inference_executor.run(
+        face_engine.analyze_faces, images_bytes, tenant=company_id
+    )
+    for i, analysis in enumerate(analyses):
+        if "embedding" not in analysis:
+            raise HTTPException(status_code=400, detail=f"Image {i + 1}: {analysis['message']}")
+    encodings: list[list[float]] = [analysis["embedding"] for analysis in analyses]
+
+    # Save photos
+    for i, image_bytes in enumerate(images_bytes):
+        await asyncio.to_thread(storage.save_photo, company_id, employee_id, image_bytes, i)
 
     # Save all encodings
-    storage.save_encoding(company_id, employee_id, encodings)
+    await asyncio.to_thread(storage.save_encoding, company_id, employee_id, encodings)
+    await asyncio.to_thread(gallery_cache.upsert, company_id, employee_id, encodings)
 
     return EnrollmentResponse(
         success=True,
@@ -73,15 +69,16 @@ async def enroll_face(
 @router.delete("/{company_id}/{employee_id}")
 async def delete_enrollment(company_id: str, employee_id: str) -> dict:
     """Delete all face data for an employee."""
-    storage.delete_encoding(company_id, employee_id)
-    storage.delete_photos(company_id, employee_id)
+    await asyncio.to_thread(storage.delete_encoding, company_id, employee_id)
+    await asyncio.to_thread(gallery_cache.remove, company_id, employee_id)
+    await asyncio.to_thread(storage.delete_photos, company_id, employee_id)
     return {"success": True, "message": "Face enrollment data deleted"}
 
 
 @router.get("/{company_id}/{employee_id}/status", response_model=EnrollmentStatusResponse)
 async def get_enrollment_status(company_id: str, employee_id: str) -> EnrollmentStatusResponse:
     """Get enrollment status for an employee."""
-    face_count = storage.get_photo_count(company_id, employee_id)
+    face_count = await asyncio.to_thread(storage.get_photo_count, company_id, employee_id)
     return EnrollmentStatusResponse(
         enrolled=face_count > 0,
         face_count=face_count,
@@ -95,15 +92,21 @@ async def verify_face(
     image: UploadFile = File(...),
 ) -> VerifyResponse:
     """Verify a face against stored encodings."""
-    stored = storage.load_encoding(company_id, employee_id)
+    stored = await asyncio.to_thread(storage.load_encoding, company_id, employee_id)
     if not stored:
         raise HTTPException(status_code=404, detail="No face enrollment found for this employee")
 
-    image_bytes = await image.read()
+    image_bytes = await read_image(image)
     if not image_bytes:
         raise HTTPException(status_code=400, detail="Image is empty")
 
-    result = face_engine.verify_face(image_bytes, stored)
+    analysis = await inference_executor.run(
+        face_engine.analyze_face, image_bytes, tenant=company_id
+    )
+    if "embedding" not in analysis:
+        return VerifyResponse(match=False, confidence=0.0, message=analysis["message"])
+
+    result = face_engine.verify_encoding(analysis["embedding"], stored)
     return VerifyResponse(
         match=result["match"],
         confidence=result["confidence"],
@@ -116,11 +119,11 @@ async def detect_face_endpoint(
     image: UploadFile = File(...),
 ) -> DetectResponse:
     """Check if an image contains a valid face."""
-    image_bytes = await image.read()
+    image_bytes = await read_image(image)
     if not image_bytes:
         raise HTTPException(status_code=400, detail="Image is empty")
 
-    result = face_engine.detect_face(image_bytes)
+    result = await inference_executor.run(face_engine.detect_face, image_bytes)
     return DetectResponse(
         detected=result["detected"],
         face_count=result["face_count"],
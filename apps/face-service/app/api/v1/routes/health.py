@@ -1,6 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
 from app.core.config import settings
+from app.services import face_engine
 
 router = APIRouter()
 
@@ -12,3 +14,13 @@ async def health_check() -> dict[str, str]:
         "service": settings.app_name,
         "version": settings.version,
     }
+
+
+@router.get("/ready")
+async def readiness_check() -> JSONResponse:
+    """Readiness: 200 once the face model is loaded, 503 while warming up or failed."""
+    state = face_engine.warmup
+    return JSONResponse(
+        status_code=200 if state.status == "ready" else 503,
+        content={"status": state.status, "error": state.error, "warmup_seconds": state.seconds},
+    )
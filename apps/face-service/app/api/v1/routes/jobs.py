@@ -0,0 +1,69 @@
+import asyncio
+import logging
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+
+from app.api.uploads import save_upload
+from app.models.jobs import BulkJobListResponse, BulkJobResponse, ReembedRequest
+from app.services.bulk_jobs import bulk_jobs
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.post("/enroll", response_model=BulkJobResponse, status_code=202)
+async def bulk_enroll(
+    company_id: str = Form(...),
+    archive: UploadFile = File(...),
+) -> BulkJobResponse:
+    """Enroll every employee in a zip archive of photos in the background.
+
+    Photos go in one directory per employee (``<employee_id>/<photo>.jpg``) or
+    are listed in a ``manifest.csv`` with ``employee_id,filename`` rows.
+    """
+    path = await asyncio.to_thread(bulk_jobs.archive_path)
+    await save_upload(archive, path)
+    try:
+        job = await asyncio.to_thread(bulk_jobs.submit_enroll, company_id, path)
+    except ValueError as e:
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return BulkJobResponse(**job.status_dict())
+
+
+@router.post("/reembed", response_model=BulkJobResponse, status_code=202)
+async def bulk_reembed(request: ReembedRequest) -> BulkJobResponse:
+    """Recompute a company's encodings from its stored photos in the background."""
+    try:
+        job = await asyncio.to_thread(bulk_jobs.submit_reembed, request.company_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    return BulkJobResponse(**job.status_dict())
+
+
+@router.get("", response_model=BulkJobListResponse)
+async def list_jobs(company_id: str | None = None) -> BulkJobListResponse:
+    """List queued, running and recently finished jobs."""
+    return BulkJobListResponse(
+        jobs=[BulkJobResponse(**job.status_dict()) for job in bulk_jobs.jobs(company_id)]
+    )
+
+
+@router.get("/{job_id}", response_model=BulkJobResponse)
+async def get_job(job_id: str) -> BulkJobResponse:
+    """Progress of a job."""
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return BulkJobResponse(**job.status_dict())
+
+
+@router.delete("/{job_id}", response_model=BulkJobResponse)
+async def cancel_job(job_id: str) -> BulkJobResponse:
+    """Cancel a queued or running job."""
+    job = bulk_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not bulk_jobs.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job is already {job.status}")
+    return BulkJobResponse(**job.status_dict())
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+
+from app.services.metrics import CONTENT_TYPE, registry
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """Prometheus text exposition of the service's timings, counters and gauges."""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
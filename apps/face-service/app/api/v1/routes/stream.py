@@ -1,13 +1,16 @@
+import asyncio
 import logging
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 
 from app.models.attendance import (
+    ClusterStatusResponse,
     StreamStartRequest,
     StreamStartResponse,
     StreamStatusResponse,
     StreamStopRequest,
 )
+from app.services.cluster import cluster_coordinator
 from app.services.stream_manager import stream_manager
 
 logger = logging.getLogger(__name__)
@@ -16,15 +19,13 @@ router = APIRouter(prefix="/stream", tags=["stream"])
 
 @router.post("/start", response_model=StreamStartResponse)
 async def start_stream(request: StreamStartRequest) -> StreamStartResponse:
-    """Start processing an RTSP stream for face recognition."""
-    started = stream_manager.start_stream(
-        camera_id=request.camera_id,
-        rtsp_url=request.rtsp_url,
-        company_id=request.company_id,
-        location_id=request.location_id,
-        callback_url=request.callback_url,
-        frame_interval=request.frame_interval,
-    )
+    """Start processing an RTSP stream for face recognition. With sharding on, the
+    least loaded node starts it."""
+    spec = request.model_dump()
+    if cluster_coordinator is not None:
+        started = await asyncio.to_thread(cluster_coordinator.start_stream, **spec)
+    else:
+        started = stream_manager.start_stream(**spec)
     if started:
         return StreamStartResponse(
             success=True,
@@ -38,8 +39,11 @@ async def start_stream(request: StreamStartRequest) -> StreamStartResponse:
 
 @router.post("/stop", response_model=StreamStartResponse)
 async def stop_stream(request: StreamStopRequest) -> StreamStartResponse:
-    """Stop processing an RTSP stream."""
-    stopped = stream_manager.stop_stream(request.camera_id)
+    """Stop processing an RTSP stream, on whichever node runs it."""
+    if cluster_coordinator is not None:
+        stopped = await asyncio.to_thread(cluster_coordinator.stop_stream, request.camera_id)
+    else:
+        stopped = stream_manager.stop_stream(request.camera_id)
     if stopped:
         return StreamStartResponse(
             success=True,
@@ -53,5 +57,17 @@ async def stop_stream(request: StreamStopRequest) -> StreamStartResponse:
 
 @router.get("/status", response_model=StreamStatusResponse)
 async def get_stream_status() -> StreamStatusResponse:
-    """Get status of all active streams."""
-    return StreamStatusResponse(active_streams=stream_manager.get_status())
+    """Get status of the streams running on this node."""
+    return StreamStatusResponse(
+        active_streams=stream_manager.get_status(),
+        pipeline=stream_manager.get_pipeline_stats(),
+        cluster=cluster_coordinator.stats() if cluster_coordinator is not None else None,
+    )
+
+
+@router.get("/cluster", response_model=ClusterStatusResponse)
+async def get_cluster_status() -> ClusterStatusResponse:
+    """Get every node of the cluster and every camera with the node running it."""
+    if cluster_coordinator is None:
+        raise HTTPException(status_code=404, detail="Streams are not sharded (CLUSTER_BACKEND)")
+    return ClusterStatusResponse(**await asyncio.to_thread(cluster_coordinator.status))
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -11,11 +13,107 @@ class Settings(BaseSettings):
     cors_origins: list[str] = ["http://localhost:3000"]
 
     # Face recognition settings
+    # face_model / face_detector name a DeepFace model, or a TensorFlow-free
+    # backend: "Facenet512-onnx" and "cv2-yunet" / "cv2-ssd" (see face_backends)
     face_model: str = "Facenet512"
     face_detector: str = "ssd"
+    onnx_precision: Literal["fp32", "fp16", "int8"] = "fp32"  # Facenet512-onnx weights
     storage_path: str = "./storage"
     max_faces_per_employee: int = 5
     min_confidence: float = 0.60
+    min_face_confidence: float = 0.0  # detector confidence required for enrollment/verify
+    store_compact_ratio: float = 0.25  # compact an embedding store once this share is dead
+    gallery_cache_max_bytes: int = 512 * 1024 * 1024
+    # Several uvicorn workers: galleries stay read-only memory maps of the store
+    # files, shared by all workers, and are reloaded when the store's version moves
+    shared_gallery: bool = False
+    image_max_side: int = 1280  # uploads are decoded no larger than this; 0 = full size
+    max_image_bytes: int = 10 * 1024 * 1024  # per uploaded image
+    max_upload_bytes: int = 64 * 1024 * 1024  # per request body, enforced while receiving
+    identify_batch_max_images: int = 200  # per /attendance/identify/batch request
+    identify_batch_chunk: int = 8  # images decoded, detected and embedded per inference job
+    # Detections and embeddings of recently seen uploads, keyed by content (image_cache)
+    image_cache_max_bytes: int = 64 * 1024 * 1024  # 0 disables the cache
+    image_cache_ttl_seconds: float = 600.0
+    model_cache_path: str = ""  # model weights; defaults to <storage_path>/models
+    warmup_in_background: bool = True  # load the model after the API is up (see /ready)
+
+    # Gallery search: "exact" scans every embedding, "ivf" probes an approximate
+    # index for galleries of at least ivf_min_rows embeddings
+    match_index: Literal["exact", "ivf"] = "exact"
+    ivf_min_rows: int = 20000
+    ivf_nlist: int = 0  # 0 = about sqrt(rows)
+    ivf_nprobe: int = 8
+
+    # Inference executor shared by stream workers and HTTP routes. "process" runs
+    # one model per worker process; "thread" shares a single model in-process.
+    inference_mode: Literal["thread", "process"] = "thread"
+    inference_workers: int = 2
+    inference_max_in_flight: int = 4
+    inference_max_batch: int = 32  # face crops per merged embedding call
+    inference_max_queue: int = 64  # HTTP requests get 503 beyond this many queued jobs
+    inference_timeout_seconds: float = 30.0
+    rtsp_test_timeout_seconds: float = 10.0
+
+    # Stream pipeline
+    pipeline_frame_queue_size: int = 32  # frames waiting for detection, oldest dropped first
+    pipeline_embed_batch_size: int = 16  # face crops per embedding call
+
+    # Stream capture. "opencv" decodes in-process; "ffmpeg" reads raw frames from
+    # an ffmpeg subprocess, which can also skip everything but keyframes.
+    capture_backend: Literal["opencv", "ffmpeg"] = "opencv"
+    capture_width: int = 0  # downscale frames wider than this; 0 keeps full resolution
+    capture_hw_accel: bool = False  # opencv: ask FFmpeg for a hardware decoder
+    capture_keyframes_only: bool = False  # ffmpeg: decode keyframes only
+    # Frames per keyframe (the cameras' GOP length). With keyframes only, the frame
+    # and motion sampling intervals below are divided by it to count keyframes.
+    capture_keyframe_interval: int = 30
+    ffmpeg_path: str = "ffmpeg"  # ffprobe is expected next to it
+
+    # Motion gating: stream workers only run inference on frames that changed.
+    # While there is motion a frame is sampled every motion_active_interval
+    # frames; a still scene is sampled every motion_idle_interval frames.
+    motion_gating: bool = True
+    motion_threshold: float = 0.01  # share of downscaled pixels that must change
+    motion_active_interval: int = 5
+    motion_idle_interval: int = 300
+    motion_hold_seconds: float = 2.0  # stay in the fast rate this long after motion
+
+    # Face tracking: a tracked face is embedded at most track_max_embeddings
+    # times (matching the mean embedding) and not again once identified
+    face_tracking: bool = True
+    track_iou_threshold: float = 0.3
+    track_max_age_seconds: float = 2.0  # forget a track not seen for this long
+    track_max_embeddings: int = 3
+
+    # Check-in dedup across cameras: an employee is reported once per location
+    # window. "redis" shares the keys between instances and restarts.
+    dedup_backend: Literal["memory", "redis"] = "memory"
+    dedup_window_seconds: float = 300.0
+    dedup_location_windows: dict[str, float] = {}  # location_id -> window seconds
+
+    # Sharding of RTSP streams across replicas: every camera is leased to one node,
+    # nodes take over the cameras of a dead node and shed cameras when overloaded
+    cluster_backend: Literal["off", "memory", "redis"] = "off"  # memory: single node
+    cluster_node_id: str = ""  # defaults to <hostname>-<pid>
+    cluster_lease_seconds: float = 15.0  # a dead node's cameras move after this long
+    cluster_interval_seconds: float = 3.0  # lease renewal, heartbeat and rebalancing
+    cluster_rebalance_tolerance: float = 1.25  # shed a camera above this times mean load
+    cluster_min_hold_seconds: float = 60.0  # keep a camera this long before moving it
+
+    # Attendance callbacks, delivered in the background with retries
+    callback_batch_url: str = ""  # endpoint taking {"events": [...]}; empty = one POST each
+    callback_batch_size: int = 20
+    callback_max_queue: int = 1000  # events beyond this go straight to the spool
+    callback_max_retries: int = 5  # then the event is spooled to disk
+    callback_backoff_seconds: float = 0.5  # doubles per retry
+    callback_backoff_max_seconds: float = 30.0
+    callback_timeout_seconds: float = 10.0
+    callback_spool_max_bytes: int = 10 * 1024 * 1024
+
+    # Bulk enrollment and re-embedding jobs (/api/v1/jobs)
+    bulk_batch_size: int = 16  # employees per inference job
+    bulk_max_upload_bytes: int = 2 * 1024 * 1024 * 1024  # enrollment archives
 
     # Internal API settings
     internal_api_secret: str = ""
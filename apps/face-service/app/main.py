@@ -2,14 +2,23 @@ import logging
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from app.api.uploads import UploadLimitMiddleware
 from app.api.v1.router import api_router
 from app.api.v1.routes.health import router as health_router
+from app.api.v1.routes.metrics import router as metrics_router
 from app.core.config import settings
 from app.services import storage
-from app.services.face_engine import preload_model
+from app.services.bulk_jobs import bulk_jobs
+from app.services.cluster import cluster_coordinator
+from app.services.inference import (
+    InferenceOverloadedError,
+    InferenceTimeoutError,
+    inference_executor,
+)
 from app.services.stream_manager import stream_manager
 
 logging.basicConfig(level=logging.INFO)
@@ -21,11 +30,22 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     # Startup
     logger.info("Starting face service...")
     storage.ensure_directories()
-    preload_model()
-    logger.info("Face service ready")
+    storage.migrate_json_encodings()
+    if settings.warmup_in_background:
+        # Serve /health right away; /ready reports when the model is loaded
+        inference_executor.start_warm_up()
+    else:
+        inference_executor.warm_up()
+    if cluster_coordinator is not None:
+        cluster_coordinator.start()
+    logger.info("Face service started")
     yield
     # Shutdown
     logger.info("Shutting down face service")
+    bulk_jobs.stop()
+    if cluster_coordinator is not None:
+        # Hands this node's cameras to the other nodes
+        cluster_coordinator.stop()
     stream_manager.stop_all()
 
 
@@ -43,9 +63,31 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so oversized bodies are refused before anything else reads them
+app.add_middleware(UploadLimitMiddleware)
+
+
+@app.exception_handler(InferenceOverloadedError)
+async def inference_overloaded_handler(
+    request: Request, exc: InferenceOverloadedError
+) -> JSONResponse:
+    logger.warning("Shedding %s: %s", request.url.path, exc)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Face service is busy, please retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.exception_handler(InferenceTimeoutError)
+async def inference_timeout_handler(request: Request, exc: InferenceTimeoutError) -> JSONResponse:
+    logger.warning("Timed out %s: %s", request.url.path, exc)
+    return JSONResponse(status_code=504, content={"detail": "Face processing timed out"})
+
 
-# Mount health at root level (no /api/v1 prefix) for easy health checks
+# Mount health and metrics at root level (no /api/v1 prefix) for probes and scrapers
 app.include_router(health_router, tags=["health"])
+app.include_router(metrics_router, tags=["health"])
 
 # Mount versioned API
 app.include_router(api_router)
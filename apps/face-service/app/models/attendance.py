@@ -1,4 +1,7 @@
-from pydantic import BaseModel
+from typing import Any
+
+import httpx
+from pydantic import BaseModel, field_validator
 
 
 class IdentifyResponse(BaseModel):
@@ -8,13 +11,56 @@ class IdentifyResponse(BaseModel):
     message: str
 
 
+class FaceBox(BaseModel):
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+class FaceIdentification(BaseModel):
+    bbox: FaceBox
+    identified: bool
+    employee_id: str | None = None
+    confidence: float = 0.0
+
+
+class MultiIdentifyResponse(BaseModel):
+    faces: list[FaceIdentification]
+    message: str
+
+
+class BatchIdentifyResult(BaseModel):
+    """One NDJSON line of ``/attendance/identify/batch``."""
+
+    index: int  # position of the image in the request (uploaded images, then the archive)
+    filename: str
+    identified: bool
+    employee_id: str | None = None
+    confidence: float = 0.0
+    message: str
+
+
 class StreamStartRequest(BaseModel):
     camera_id: str
     rtsp_url: str
     company_id: str
     location_id: str
     callback_url: str
-    frame_interval: int = 30  # process every Nth frame
+    frame_interval: int = 30  # process every Nth frame (motion gating adapts this)
+
+    @field_validator("callback_url")
+    @classmethod
+    def _check_callback_url(cls, value: str) -> str:
+        # Refuse here what the callback dispatcher could never POST to
+        try:
+            url = httpx.URL(value)
+            url.host.encode("idna")
+        except (httpx.InvalidURL, UnicodeError) as e:
+            raise ValueError(f"Invalid callback URL: {e}") from e
+        if url.scheme not in ("http", "https") or not url.host:
+            raise ValueError("Callback URL must be an absolute http(s) URL")
+        return value
 
 
 class StreamStartResponse(BaseModel):
@@ -27,4 +73,12 @@ class StreamStopRequest(BaseModel):
 
 
 class StreamStatusResponse(BaseModel):
-    active_streams: list[dict]
+    active_streams: list[dict[str, Any]]  # cameras running on this node
+    pipeline: dict[str, Any] = {}
+    cluster: dict[str, Any] | None = None  # this node's share when streams are sharded
+
+
+class ClusterStatusResponse(BaseModel):
+    node_id: str  # the node that answered
+    nodes: list[dict[str, Any]]
+    cameras: list[dict[str, Any]]
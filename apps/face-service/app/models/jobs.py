@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, field_validator
+
+from app.core.config import settings
+
+
+class ReembedRequest(BaseModel):
+    company_id: str
+    model: str | None = None  # must be the service's face_model, the default
+
+    @field_validator("model")
+    @classmethod
+    def _check_model(cls, value: str | None) -> str | None:
+        # Identify and enroll embed with face_model; a store of another model breaks them
+        if value is not None and value != settings.face_model:
+            raise ValueError(
+                f"Re-embedding uses the service's face_model ({settings.face_model}); "
+                "change FACE_MODEL and restart to switch models"
+            )
+        return value
+
+
+class JobError(BaseModel):
+    employee_id: str
+    message: str
+
+
+class BulkJobResponse(BaseModel):
+    job_id: str
+    kind: Literal["enroll", "reembed"]
+    company_id: str
+    model: str
+    status: Literal["queued", "running", "completed", "failed", "cancelled"]
+    total: int
+    processed: int
+    enrolled: int
+    failed: int
+    errors: list[JobError]  # the first 100 failed employees
+    message: str
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    employees_per_second: float | None = None
+
+
+class BulkJobListResponse(BaseModel):
+    jobs: list[BulkJobResponse]
@@ -0,0 +1,107 @@
+import logging
+import math
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class IVFIndex:
+    """Inverted-file index over a normalized embedding matrix.
+
+    Rows are bucketed by their nearest of ``nlist`` centroids (spherical k-means).
+    A search only scores the rows in the ``nprobe`` buckets closest to the probe,
+    trading a little recall for a scan of roughly ``nprobe / nlist`` of the gallery.
+    The index stores row positions, so it is kept in step with the gallery matrix
+    through ``add``, ``compact`` and ``reassign``; they return a new index and leave this
+    one as is.
+    """
+
+    def __init__(self, centroids: np.ndarray, lists: list[np.ndarray], trained_rows: int) -> None:
+        self.centroids = centroids
+        self.lists = lists
+        self.trained_rows = trained_rows
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def size(self) -> int:
+        return sum(len(rows) for rows in self.lists)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.centroids.nbytes + sum(rows.nbytes for rows in self.lists))
+
+    @classmethod
+    def build(
+        cls,
+        matrix: np.ndarray,
+        nlist: int = 0,
+        iterations: int = 10,
+        sample_per_list: int = 64,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Train centroids on (a sample of) ``matrix`` and bucket every row."""
+        n_rows = len(matrix)
+        nlist = min(nlist or max(1, int(math.sqrt(n_rows))), n_rows)
+        rng = np.random.default_rng(seed)
+        sample_size = min(n_rows, nlist * sample_per_list)
+        sample = matrix[rng.choice(n_rows, size=sample_size, replace=False)]
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty buckets from random samples instead of letting them die
+            sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        index = cls(centroids, [np.zeros(0, dtype=np.int64) for _ in range(nlist)], n_rows)
+        index = index.add(0, matrix)
+        logger.info("Built IVF index: %d rows in %d lists", n_rows, nlist)
+        return index
+
+    def add(self, start: int, rows: np.ndarray) -> "IVFIndex":
+        """Index ``rows`` that were appended to the gallery at position ``start``."""
+        if not len(rows):
+            return self
+        assignment = self._assign(rows)
+        positions = np.arange(start, start + len(rows), dtype=np.int64)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(self.nlist + 1))
+        lists = [
+            np.concatenate([existing, positions[order[bounds[i] : bounds[i + 1]]]])
+            if bounds[i] < bounds[i + 1]
+            else existing
+            for i, existing in enumerate(self.lists)
+        ]
+        return IVFIndex(self.centroids, lists, self.trained_rows)
+
+    def compact(self, keep: np.ndarray) -> "IVFIndex":
+        """Drop removed rows and renumber the rest after the gallery dropped rows."""
+        new_position = np.cumsum(keep) - 1
+        lists = [new_position[rows[keep[rows]]] for rows in self.lists]
+        return IVFIndex(self.centroids, lists, self.trained_rows)
+
+    def reassign(self, matrix: np.ndarray) -> "IVFIndex":
+        """Bucket every row of ``matrix`` under the trained centroids, for a gallery
+        whose rows were rearranged (reloaded from storage)."""
+        empty = [np.zeros(0, dtype=np.int64) for _ in range(self.nlist)]
+        return IVFIndex(self.centroids, empty, self.trained_rows).add(0, matrix)
+
+    def candidates(self, probes: np.ndarray, nprobe: int) -> list[np.ndarray]:
+        """Row positions worth scoring for each probe."""
+        nprobe = min(nprobe, self.nlist)
+        closest = np.argpartition(-(probes @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        return [np.concatenate([self.lists[i] for i in buckets]) for buckets in closest]
+
+    def _assign(self, rows: np.ndarray) -> np.ndarray:
+        assignment: np.ndarray = np.argmax(rows @ self.centroids.T, axis=1)
+        return assignment
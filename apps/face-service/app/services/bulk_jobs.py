@@ -0,0 +1,399 @@
+"""Bulk enrollment and re-embedding jobs.
+
+An enrollment job enrolls every employee in a zip archive of photos; a
+re-embedding job recomputes a company's encodings from its stored photos,
+e.g. with a new ``face_model``. Jobs run one at a time on a background thread.
+Employees go to the shared inference executor in chunks of
+``settings.bulk_batch_size``, one ``analyze_faces`` call (and so one batched
+embedding) per chunk, with as many chunks in flight as the executor runs at
+once. Bulk work is its own source in the executor's round-robin, so HTTP
+requests and cameras of the same company keep getting their turn.
+
+Enrollment commits each chunk with one ``put_many``. Re-embedding always uses
+the service's ``face_model``, which identify and enroll use too. It holds the
+new encodings until every chunk is done and then writes them in one commit.
+Employees enrolled again or deleted while the job runs keep what they have
+then, and employees whose photos fail keep their old encodings (failures are
+listed in the job). Only when the model's dimension changed does the commit
+replace the whole store, so matching never sees two models mixed; failed
+employees then need enrolling again.
+Job state is kept in memory only: after a restart, an interrupted enrollment
+is submitted again.
+"""
+
+import csv
+import io
+import logging
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict, deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import face_engine, images, storage
+from app.services.gallery import gallery_cache
+from app.services.inference import InferenceExecutor, inference_executor
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.csv"
+MAX_ERRORS = 100  # per job; later failures are only counted
+MAX_FINISHED_JOBS = 100
+
+JobStatus = Literal["queued", "running", "completed", "failed", "cancelled"]
+
+
+def _check_employee_id(employee_id: str) -> str:
+    # Employee ids become directory names under storage/photos
+    if not employee_id or employee_id in (".", "..") or "/" in employee_id or "\\" in employee_id:
+        raise ValueError(f"Invalid employee id {employee_id!r}")
+    return employee_id
+
+
+def read_archive(path: Path) -> dict[str, list[str]]:
+    """Map employee ids to their photos in a zip archive.
+
+    Photos are assigned by a ``manifest.csv`` with ``employee_id,filename`` rows
+    if the archive has one, otherwise by their directory: ``<employee_id>/<photo>``.
+    Raises ValueError for an unreadable archive or manifest.
+    """
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = {n for n in archive.namelist() if not n.endswith("/")}
+            manifest = archive.read(MANIFEST_FILE) if MANIFEST_FILE in names else None
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Not a zip archive: {e}") from e
+
+    photos: dict[str, list[str]] = {}
+    if manifest is not None:
+        try:
+            rows = list(csv.DictReader(io.StringIO(manifest.decode("utf-8-sig"))))
+            pairs = [(row["employee_id"].strip(), row["filename"].strip()) for row in rows]
+        except (UnicodeDecodeError, KeyError, AttributeError) as e:
+            raise ValueError(f"{MANIFEST_FILE} needs employee_id and filename columns") from e
+        for employee_id, filename in pairs:
+            if filename not in names:
+                raise ValueError(f"{MANIFEST_FILE}: {filename} is not in the archive")
+            photos.setdefault(_check_employee_id(employee_id), []).append(filename)
+    else:
+        for name in sorted(names):
+            parts = name.split("/")
+            # Skips loose files, deeper trees and resource forks (__MACOSX/, ._*)
+            if (
+                len(parts) == 2
+                and not parts[1].startswith(".")
+                and name.lower().endswith(images.IMAGE_SUFFIXES)
+            ):
+                photos.setdefault(_check_employee_id(parts[0]), []).append(name)
+    if not photos:
+        raise ValueError("No employee photos found in the archive")
+    return photos
+
+
+@dataclass
+class BulkJob:
+    kind: Literal["enroll", "reembed"]
+    company_id: str
+    model: str
+    employees: dict[str, list[str]]  # employee -> archive members; empty for stored photos
+    archive: Path | None = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = "queued"
+    processed: int = 0
+    enrolled: int = 0
+    failed: int = 0
+    errors: list[dict[str, Any]] = field(default_factory=list)
+    message: str = ""
+    created_at: datetime = field(default_factory=lambda: datetime.now(UTC))
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    cancel_requested: bool = False
+
+    @property
+    def total(self) -> int:
+        return len(self.employees)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def fail_employee(self, employee_id: str, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({"employee_id": employee_id, "message": message})
+
+    def status_dict(self) -> dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = ((self.finished_at or datetime.now(UTC)) - self.started_at).total_seconds()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "company_id": self.company_id,
+            "model": self.model,
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "enrolled": self.enrolled,
+            "failed": self.failed,
+            "errors": list(self.errors),
+            "message": self.message,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "employees_per_second": self.processed / elapsed if elapsed else None,
+        }
+
+
+class BulkJobManager:
+    """Queue of bulk jobs, run one after another on a single thread."""
+
+    def __init__(self, inference: InferenceExecutor, batch_size: int = 16) -> None:
+        self.inference = inference
+        self.batch_size = max(batch_size, 1)
+        self._jobs: OrderedDict[str, BulkJob] = OrderedDict()
+        self._queue: deque[BulkJob] = deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+
+    def archive_path(self) -> Path:
+        """A fresh path to store an uploaded archive at until its job is done."""
+        directory = Path(settings.storage_path) / "jobs"
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / f"{uuid.uuid4().hex}.zip"
+
+    def submit_enroll(self, company_id: str, archive: Path) -> BulkJob:
+        """Queue enrollment of every employee in ``archive``, which the job deletes
+        when done. Raises ValueError if the archive cannot be read."""
+        employees = read_archive(archive)
+        job = BulkJob("enroll", company_id, settings.face_model, employees, archive=archive)
+        return self._enqueue(job)
+
+    def submit_reembed(self, company_id: str) -> BulkJob:
+        """Queue re-embedding of a company's stored photos with ``settings.face_model``.
+        Raises ValueError without photos."""
+        employees: dict[str, list[str]] = {e: [] for e in storage.list_photo_employees(company_id)}
+        if not employees:
+            raise ValueError(f"No stored photos for company {company_id}")
+        job = BulkJob("reembed", company_id, settings.face_model, employees)
+        return self._enqueue(job)
+
+    def get(self, job_id: str) -> BulkJob | None:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs(self, company_id: str | None = None) -> list[BulkJob]:
+        with self._cond:
+            jobs = list(self._jobs.values())
+        return [j for j in jobs if company_id is None or j.company_id == company_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a job after its chunks in flight. Chunks an enrollment already
+        committed stay enrolled; a cancelled re-embedding changes nothing."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancel_requested = True
+            if job in self._queue:
+                self._queue.remove(job)
+                self._finish(job, "cancelled")
+            return True
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="bulk-jobs", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._thread = None
+            for job in self._jobs.values():
+                job.cancel_requested = True
+            while self._queue:
+                self._finish(self._queue.popleft(), "cancelled")
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout=30)
+
+    def _enqueue(self, job: BulkJob) -> BulkJob:
+        self.start()
+        with self._cond:
+            finished = [j.id for j in self._jobs.values() if j.finished]
+            for job_id in finished[: max(len(finished) - MAX_FINISHED_JOBS + 1, 0)]:
+                del self._jobs[job_id]
+            self._jobs[job.id] = job
+            self._queue.append(job)
+            self._cond.notify_all()
+        logger.info("Queued %s job %s for company %s", job.kind, job.id, job.company_id)
+        return job
+
+    def _finish(self, job: BulkJob, status: JobStatus, message: str = "") -> None:
+        job.status = status
+        job.message = message or job.message
+        job.finished_at = datetime.now(UTC)
+        if job.archive is not None:
+            job.archive.unlink(missing_ok=True)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopping or self._queue)
+                if self._stopping:
+                    return
+                job = self._queue.popleft()
+                job.status = "running"
+                job.started_at = datetime.now(UTC)
+            try:
+                status, message = self._process(job)
+            except Exception as e:
+                logger.exception("Bulk job %s failed", job.id)
+                status, message = "failed", str(e)
+            with self._cond:
+                self._finish(job, status, message)
+            logger.info(
+                "Bulk job %s %s: %d enrolled, %d failed", job.id, status, job.enrolled, job.failed
+            )
+
+    def _process(self, job: BulkJob) -> tuple[JobStatus, str]:
+        version = 0
+        fingerprints: dict[str, bytes] = {}
+        if job.kind == "reembed":
+            # Before reading any photo, to know later who was enrolled meanwhile
+            version, fingerprints = storage.encoding_fingerprints(job.company_id)
+        reembedded: dict[str, np.ndarray] = {}
+        pending: deque[tuple[list[tuple[str, list[bytes]]], Future[list[dict[str, Any]]]]] = deque()
+        window = self.inference.max_in_flight
+        employees = list(job.employees)
+        try:
+            with _photo_loader(job) as load:
+                for start in range(0, len(employees), self.batch_size):
+                    if job.cancel_requested:
+                        break
+                    chunk = []
+                    for employee_id in employees[start : start + self.batch_size]:
+                        try:
+                            chunk.append((employee_id, load(employee_id)))
+                        except ValueError as e:
+                            job.processed += 1
+                            job.fail_employee(employee_id, str(e))
+                    if not chunk:
+                        continue
+                    batch = [image for _, photos in chunk for image in photos]
+                    future = self.inference.submit(
+                        face_engine.analyze_faces,
+                        batch,
+                        job.model,
+                        tenant=job.company_id,
+                        source="bulk",
+                    )
+                    pending.append((chunk, future))
+                    if len(pending) >= window:
+                        self._collect(job, *pending.popleft(), reembedded)
+                while pending:
+                    self._collect(job, *pending.popleft(), reembedded)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+        if job.cancel_requested:
+            return "cancelled", "Cancelled"
+        if job.kind == "reembed":
+            if not reembedded:
+                return "failed", "No employee could be re-embedded; encodings left unchanged"
+            stale = storage.update_encodings(job.company_id, reembedded, version, fingerprints)
+            gallery_cache.invalidate(job.company_id)
+            if stale:
+                job.enrolled -= len(stale)
+                return "completed", (
+                    f"Enrolled {job.enrolled} of {job.total} employees; "
+                    f"kept {len(stale)} enrolled again or deleted meanwhile"
+                )
+        return "completed", f"Enrolled {job.enrolled} of {job.total} employees"
+
+    def _collect(
+        self,
+        job: BulkJob,
+        chunk: list[tuple[str, list[bytes]]],
+        future: Future[list[dict[str, Any]]],
+        reembedded: dict[str, np.ndarray],
+    ) -> None:
+        analyses = future.result()
+        enrolled: dict[str, np.ndarray] = {}
+        start = 0
+        for employee_id, photos in chunk:
+            results = analyses[start : start + len(photos)]
+            start += len(photos)
+            rejected = [(i, a) for i, a in enumerate(results) if "embedding" not in a]
+            if rejected:
+                i, analysis = rejected[0]
+                job.fail_employee(employee_id, f"Image {i + 1}: {analysis['message']}")
+                continue
+            enrolled[employee_id] = np.array([a["embedding"] for a in results], dtype=np.float32)
+
+        if job.kind == "enroll" and enrolled:
+            for employee_id, photos in chunk:
+                if employee_id in enrolled:
+                    storage.delete_photos(job.company_id, employee_id)
+                    for i, image_bytes in enumerate(photos):
+                        storage.save_photo(job.company_id, employee_id, image_bytes, i)
+            storage.save_encodings(job.company_id, enrolled)
+            gallery_cache.upsert_many(job.company_id, enrolled)
+        else:
+            reembedded.update(enrolled)
+        job.enrolled += len(enrolled)
+        job.processed += len(chunk)
+
+
+def _checked(photos: list[bytes]) -> list[bytes]:
+    if not photos:
+        raise ValueError("No photos")
+    for i, image_bytes in enumerate(photos):
+        if not image_bytes:
+            raise ValueError(f"Image {i + 1} is empty")
+    return photos
+
+
+@contextmanager
+def _photo_loader(job: BulkJob) -> Iterator[Callable[[str], list[bytes]]]:
+    """Yield a function reading one employee's photos, which raises ValueError
+    for photos that cannot be enrolled."""
+    if job.archive is None:
+        yield lambda employee_id: _checked(storage.load_photos(job.company_id, employee_id))
+        return
+
+    with zipfile.ZipFile(job.archive) as archive:
+
+        def load(employee_id: str) -> list[bytes]:
+            names = job.employees[employee_id]
+            if len(names) > settings.max_faces_per_employee:
+                raise ValueError(f"Maximum {settings.max_faces_per_employee} images allowed")
+            for name in names:
+                # Checked before reading, so a zip bomb is never inflated
+                if archive.getinfo(name).file_size > settings.max_image_bytes:
+                    raise ValueError(f"{name} exceeds {settings.max_image_bytes} bytes")
+            try:
+                return _checked([archive.read(name) for name in names])
+            except zipfile.BadZipFile as e:
+                raise ValueError(f"Corrupt archive entry: {e}") from e
+
+        yield load
+
+
+# Singleton instance
+bulk_jobs = BulkJobManager(inference_executor, batch_size=settings.bulk_batch_size)
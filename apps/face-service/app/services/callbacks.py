@@ -0,0 +1,307 @@
+"""Background delivery of attendance callbacks to the web backend.
+
+Stream workers hand events to ``CallbackDispatcher.send``, which only
+enqueues them. A single dispatch thread delivers them over one pooled,
+keep-alive ``httpx.Client``: one POST per event, or when a batch endpoint is
+configured, one POST of ``{"events": [...]}`` per batch. Failed deliveries are
+retried with exponential backoff; events that run out of retries, or arrive
+while the queue is full, go to a size-bounded on-disk spool that is replayed
+once the backend is reachable again.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_SECONDS = registry.histogram(
+    "callback_delivery_seconds",
+    "From identification to the backend accepting the callback, retries included",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 3600.0),
+)
+
+# Client errors worth retrying; any other 4xx means the event itself was rejected
+RETRYABLE_STATUS = {408, 425, 429}
+
+
+@dataclass
+class CallbackEvent:
+    url: str
+    payload: dict[str, Any]
+    created_at: float = field(default_factory=time.time)
+    attempts: int = 0
+
+    def to_json(self) -> str:
+        return json.dumps({"url": self.url, "payload": self.payload, "created_at": self.created_at})
+
+    @classmethod
+    def from_json(cls, line: str) -> "CallbackEvent":
+        data = json.loads(line)
+        return cls(data["url"], data["payload"], data["created_at"])
+
+
+class CallbackSpool:
+    """Append-only JSON-lines file of undelivered events, capped at ``max_bytes``.
+    Events that do not fit are dropped and counted."""
+
+    def __init__(self, path: Path, max_bytes: int) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def size(self) -> int:
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def append(self, events: list[CallbackEvent]) -> int:
+        """Write as many events as fit. Returns how many were written."""
+        if not events:
+            return 0
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            size = self.size()
+            written = 0
+            with open(self.path, "a") as f:
+                for event in events:
+                    line = event.to_json() + "\n"
+                    if size + len(line) > self.max_bytes:
+                        self.dropped += 1
+                        continue
+                    f.write(line)
+                    size += len(line)
+                    written += 1
+                f.flush()
+                os.fsync(f.fileno())
+            if written < len(events):
+                logger.error("Callback spool full, dropped %d events", len(events) - written)
+            return written
+
+    def take(self, limit: int) -> list[CallbackEvent]:
+        """Remove and return up to ``limit`` of the oldest events."""
+        with self._lock:
+            if not self.path.exists():
+                return []
+            lines = self.path.read_text().splitlines(keepends=True)
+            taken, rest = lines[:limit], lines[limit:]
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text("".join(rest))
+            os.replace(tmp, self.path)
+            return [CallbackEvent.from_json(line) for line in taken if line.strip()]
+
+
+class CallbackDispatcher:
+    def __init__(
+        self,
+        spool_dir: Path,
+        secret: str = "",
+        batch_url: str = "",
+        batch_size: int = 20,
+        max_queue: int = 1000,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 10.0,
+        spool_max_bytes: int = 10 * 1024 * 1024,
+        transport: httpx.BaseTransport | None = None,
+    ) -> None:
+        self.secret = secret
+        self.batch_url = batch_url
+        self.batch_size = max(batch_size, 1)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.spool = CallbackSpool(spool_dir / "callbacks.jsonl", spool_max_bytes)
+        self._transport = transport
+        self._client: httpx.Client | None = None
+        self._queue: deque[CallbackEvent] = deque()
+        self._retries: list[tuple[float, int, CallbackEvent]] = []  # (due, seq, event) heap
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self._next_replay = 0.0
+        self.delivered = 0
+        self.rejected = 0
+        self.failed_attempts = 0
+        self.spooled = 0
+        self.batches = 0
+        self._latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._client = httpx.Client(timeout=self.timeout, transport=self._transport)
+            self._thread = threading.Thread(target=self._run, name="callbacks", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop delivering and spool whatever is still queued, so nothing is lost."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._thread = None
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout=self.timeout + 5)
+        with self._cond:
+            leftover = list(self._queue) + [event for _, _, event in sorted(self._retries)]
+            self._queue.clear()
+            self._retries.clear()
+        self._spool(leftover)
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def send(self, url: str, payload: dict[str, Any]) -> None:
+        """Queue an event for delivery; never blocks on the network."""
+        event = CallbackEvent(url, payload)
+        with self._cond:
+            if len(self._queue) < self.max_queue:
+                self._queue.append(event)
+                self._cond.notify_all()
+                return
+        self._spool([event])
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "retry_pending": len(self._retries),
+                "delivered": self.delivered,
+                "rejected": self.rejected,
+                "failed_attempts": self.failed_attempts,
+                "batches": self.batches,
+                "spooled": self.spooled,
+                "spool_bytes": self.spool.size(),
+                "spool_dropped": self.spool.dropped,
+                "avg_delivery_ms": (
+                    1000 * self._latency_seconds / self.delivered if self.delivered else 0.0
+                ),
+                "max_delivery_ms": 1000 * self.max_latency_seconds,
+            }
+
+    def _headers(self) -> dict[str, str]:
+        return {"x-api-secret": self.secret} if self.secret else {}
+
+    def _next_batch(self) -> list[CallbackEvent]:
+        # Caller holds self._cond. Due retries go first; they are the oldest events.
+        now = time.monotonic()
+        batch: list[CallbackEvent] = []
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self._retries)[2])
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    batch = self._next_batch()
+                    if batch:
+                        break
+                    if not self._retries and self._replay_due():
+                        batch = self.spool.take(self.batch_size)
+                        self._next_replay = time.monotonic() + self.backoff_max
+                        if batch:
+                            break
+                    due = self._retries[0][0] - time.monotonic() if self._retries else 1.0
+                    self._cond.wait(max(min(due, 1.0), 0.0))
+                if self._stopping:
+                    return
+            try:
+                self._deliver(batch)
+            except Exception:
+                # Never let one bad batch end the only dispatch thread
+                logger.exception("Dropped %d callbacks that could not be delivered", len(batch))
+
+    def _replay_due(self) -> bool:
+        return time.monotonic() >= self._next_replay and self.spool.size() > 0
+
+    def _deliver(self, batch: list[CallbackEvent]) -> None:
+        if self.batch_url and len(batch) > 1:
+            self.batches += 1
+            ok = self._post(self.batch_url, {"events": [event.payload for event in batch]})
+            outcomes = [(event, ok) for event in batch]
+        else:
+            outcomes = [(event, self._post(event.url, event.payload)) for event in batch]
+
+        failed = []
+        now = time.time()
+        for event, ok in outcomes:
+            if ok is None:
+                failed.append(event)
+            elif ok:
+                latency = max(now - event.created_at, 0.0)
+                DELIVERY_SECONDS.observe(latency)
+                self.delivered += 1
+                self._latency_seconds += latency
+                self.max_latency_seconds = max(self.max_latency_seconds, latency)
+            else:
+                self.rejected += 1
+        if len(failed) < len(batch):
+            self._next_replay = 0.0  # the backend is up: replay the spool promptly
+        self._retry(failed)
+
+    def _post(self, url: str, body: dict[str, Any]) -> bool | None:
+        """True on success, False if the backend rejected the event, None to retry."""
+        client = self._client
+        if client is None:
+            return None  # stopped meanwhile
+        try:
+            response = client.post(url, json=body, headers=self._headers())
+        except httpx.HTTPError as e:
+            logger.warning("Callback to %s failed: %s", url, e)
+            return None
+        except Exception as e:
+            # e.g. InvalidURL or an unencodable host: retrying will not help
+            logger.error("Callback to %r cannot be sent: %s", url, e)
+            return False
+        if response.is_success:
+            return True
+        if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS:
+            logger.warning("Callback to %s failed with HTTP %d", url, response.status_code)
+            return None
+        logger.error("Callback to %s rejected with HTTP %d", url, response.status_code)
+        return False
+
+    def _retry(self, events: list[CallbackEvent]) -> None:
+        exhausted = []
+        with self._cond:
+            for event in events:
+                self.failed_attempts += 1
+                event.attempts += 1
+                if event.attempts > self.max_retries:
+                    exhausted.append(event)
+                    self._next_replay = time.monotonic() + self.backoff_max
+                    continue
+                delay = min(self.backoff * 2 ** (event.attempts - 1), self.backoff_max)
+                due = time.monotonic() + delay * random.uniform(0.8, 1.2)
+                heapq.heappush(self._retries, (due, next(self._seq), event))
+        self._spool(exhausted)
+
+    def _spool(self, events: list[CallbackEvent]) -> None:
+        if events:
+            self.spooled += self.spool.append(events)
@@ -0,0 +1,204 @@
+"""Frame sources for stream workers.
+
+Workers call ``grab()`` for every frame and ``retrieve()`` only for frames
+they actually look at, so skipped frames are never color-converted, scaled or
+copied out of the decoder.
+
+* ``OpenCVSource`` decodes in-process, optionally with hardware acceleration,
+  and downscales retrieved frames to ``width``.
+* ``FFmpegSource`` reads raw BGR frames from an ``ffmpeg`` subprocess that does
+  the scaling itself and can decode keyframes only, so most of the stream is
+  never decoded at all. Point it at a camera substream for even less work.
+
+Both accept local video files as well as RTSP URLs.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Protocol
+
+import cv2
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class FrameSource(Protocol):
+    def open(self) -> bool: ...
+
+    def grab(self) -> bool:
+        """Advance to the next frame, doing as little work as possible. False at end/error."""
+        ...
+
+    def retrieve(self) -> np.ndarray | None:
+        """Decode the last grabbed frame as a BGR array. It may be reused by the next call."""
+        ...
+
+    def close(self) -> None: ...
+
+
+def _scaled_size(width: int, height: int, target_width: int) -> tuple[int, int]:
+    if not target_width or target_width >= width:
+        return width, height
+    # Even dimensions keep ffmpeg's scaler and most codecs happy
+    return target_width - target_width % 2, max(2, round(height * target_width / width / 2) * 2)
+
+
+class OpenCVSource:
+    def __init__(
+        self, url: str, width: int = 0, hw_accel: bool = False, timeout_ms: int = 10000
+    ) -> None:
+        self.url = url
+        self.width = width
+        self.hw_accel = hw_accel
+        self.timeout_ms = timeout_ms
+        self._cap: cv2.VideoCapture | None = None
+        self._size: tuple[int, int] | None = None
+
+    def open(self) -> bool:
+        params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, self.timeout_ms]
+        params += [cv2.CAP_PROP_READ_TIMEOUT_MSEC, self.timeout_ms]
+        if self.hw_accel:
+            params += [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY]
+        self._cap = cv2.VideoCapture(self.url, cv2.CAP_FFMPEG, params)
+        return self._cap.isOpened()
+
+    def grab(self) -> bool:
+        return self._cap is not None and self._cap.grab()
+
+    def retrieve(self) -> np.ndarray | None:
+        if self._cap is None:
+            return None
+        ok, frame = self._cap.retrieve()
+        if not ok:
+            return None
+        if self.width:
+            if self._size is None:
+                self._size = _scaled_size(frame.shape[1], frame.shape[0], self.width)
+            if self._size != (frame.shape[1], frame.shape[0]):
+                frame = cv2.resize(frame, self._size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def close(self) -> None:
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
+class FFmpegSource:
+    def __init__(
+        self,
+        url: str,
+        width: int = 0,
+        keyframes_only: bool = False,
+        ffmpeg: str = "ffmpeg",
+        timeout_ms: int = 10000,
+    ) -> None:
+        self.url = url
+        self.width = width
+        self.keyframes_only = keyframes_only
+        self.ffmpeg = ffmpeg
+        self.timeout_ms = timeout_ms
+        self._proc: subprocess.Popen[bytes] | None = None
+        self._buffer: bytearray | None = None
+        self._shape: tuple[int, int, int] = (0, 0, 3)
+
+    @staticmethod
+    def available(ffmpeg: str = "ffmpeg") -> bool:
+        return shutil.which(ffmpeg) is not None and shutil.which(_ffprobe(ffmpeg)) is not None
+
+    def _input_args(self, decode: bool = True) -> list[str]:
+        args = []
+        if self.url.startswith("rtsp://"):
+            args += ["-rtsp_transport", "tcp", "-timeout", str(self.timeout_ms * 1000)]
+        if decode and self.keyframes_only:
+            args += ["-skip_frame", "nokey"]
+        return args + ["-i", self.url]
+
+    def _probe(self) -> tuple[int, int] | None:
+        cmd = [_ffprobe(self.ffmpeg), "-v", "error", "-select_streams", "v:0"]
+        cmd += ["-show_entries", "stream=width,height", "-of", "json"]
+        cmd += self._input_args(decode=False)
+        try:
+            out = subprocess.run(
+                cmd, capture_output=True, timeout=self.timeout_ms / 1000 + 5, check=True
+            ).stdout
+            stream = json.loads(out)["streams"][0]
+            return int(stream["width"]), int(stream["height"])
+        except (OSError, subprocess.SubprocessError, KeyError, IndexError, ValueError) as e:
+            logger.warning("ffprobe failed for %s: %s", self.url, e)
+            return None
+
+    def open(self) -> bool:
+        size = self._probe()
+        if size is None:
+            return False
+        width, height = _scaled_size(*size, self.width)
+        cmd = [self.ffmpeg, "-nostdin", "-loglevel", "error", *self._input_args(), "-an"]
+        if self.keyframes_only:
+            cmd += ["-vsync", "passthrough"]
+        if (width, height) != size:
+            cmd += ["-vf", f"scale={width}:{height}:flags=area"]
+        cmd += ["-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        self._shape = (height, width, 3)
+        self._buffer = bytearray(height * width * 3)
+        self._proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+        )
+        return True
+
+    def grab(self) -> bool:
+        # Frames arrive already decoded, so reading one into the buffer is all there is
+        if self._proc is None or self._proc.stdout is None or self._buffer is None:
+            return False
+        fd = self._proc.stdout.fileno()
+        view = memoryview(self._buffer)
+        filled = 0
+        while filled < len(view):
+            n = os.readv(fd, [view[filled:]])
+            if not n:
+                return False
+            filled += n
+        return True
+
+    def retrieve(self) -> np.ndarray | None:
+        if self._buffer is None:
+            return None
+        return np.frombuffer(self._buffer, dtype=np.uint8).reshape(self._shape)
+
+    def close(self) -> None:
+        if self._proc is not None:
+            self._proc.kill()
+            self._proc.wait()
+            if self._proc.stdout is not None:
+                self._proc.stdout.close()
+            self._proc = None
+
+
+def _ffprobe(ffmpeg: str) -> str:
+    return str(Path(ffmpeg).with_name("ffprobe"))
+
+
+def frames_per_grab() -> int:
+    """How many stream frames one ``grab()`` of ``create_source``'s sources covers."""
+    if settings.capture_backend == "ffmpeg" and settings.capture_keyframes_only:
+        return max(settings.capture_keyframe_interval, 1)
+    return 1
+
+
+def create_source(url: str) -> FrameSource:
+    """Build the frame source configured in settings."""
+    if settings.capture_backend == "ffmpeg":
+        return FFmpegSource(
+            url,
+            width=settings.capture_width,
+            keyframes_only=settings.capture_keyframes_only,
+            ffmpeg=settings.ffmpeg_path,
+        )
+    return OpenCVSource(url, width=settings.capture_width, hw_accel=settings.capture_hw_accel)
@@ -0,0 +1,537 @@
+"""Sharding of RTSP streams across service replicas.
+
+Every replica (node) runs a ``ClusterCoordinator`` next to its local
+``StreamManager``. The cameras started through any node form the cluster's
+desired set; each camera is run by the node that holds its lease.
+
+Every ``interval`` seconds a node
+
+* renews the leases of its cameras, stops any camera it lost or that was
+  stopped through another node, and releases cameras whose stream worker
+  gave up reconnecting, for any node to try again,
+* spreads cameras without a live lease over the live nodes, least loaded
+  first and preferring nodes the camera has not just failed on, and starts
+  the ones that fall to itself (releasing any that fail to start),
+* hands one camera back when its load is above ``tolerance`` times the mean,
+  for the least loaded node to pick up, and
+* publishes a heartbeat with its measured load (frames decoded per second over
+  all its cameras) and the status of its cameras.
+
+A node that dies stops renewing, so its leases expire after
+``lease_seconds`` and the other nodes take over its cameras. ``RedisClusterStore``
+shares this state between replicas through ``settings.redis_url``;
+``MemoryClusterStore`` keeps it in process, for a single node and tests.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from app.core.config import settings
+from app.services.stream_manager import StreamManager, stream_manager
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "attndly:cluster:"
+CAMERAS_KEY = KEY_PREFIX + "cameras"
+LEASE_PREFIX = KEY_PREFIX + "lease:"
+NODE_PREFIX = KEY_PREFIX + "node:"
+
+# Camera spec fields left out of the status view: stream URLs carry credentials
+PRIVATE_FIELDS = ("rtsp_url", "callback_url")
+
+
+class ClusterStore(Protocol):
+    def add_camera(self, camera_id: str, spec: dict[str, Any]) -> bool:
+        """Add a camera to the desired set. False if it is already there."""
+        ...
+
+    def remove_camera(self, camera_id: str) -> bool:
+        """Remove a camera from the desired set. False if it was not there."""
+        ...
+
+    def cameras(self) -> dict[str, dict[str, Any]]:
+        """camera_id -> spec (the keyword arguments of ``StreamManager.start_stream``)."""
+        ...
+
+    def acquire(self, camera_id: str, node_id: str, ttl: float) -> bool:
+        """Take the lease of a camera for ``ttl`` seconds if nobody holds it."""
+        ...
+
+    def renew(self, camera_id: str, node_id: str, ttl: float) -> bool:
+        """Extend a lease held by ``node_id``. False if it is not theirs (any more)."""
+        ...
+
+    def release(self, camera_id: str, node_id: str) -> None:
+        """Drop a lease if ``node_id`` holds it."""
+        ...
+
+    def owners(self) -> dict[str, str]:
+        """camera_id -> node_id of every live lease."""
+        ...
+
+    def heartbeat(self, node_id: str, info: dict[str, Any], ttl: float) -> None:
+        """Publish a node's info, which expires after ``ttl`` seconds."""
+        ...
+
+    def drop_node(self, node_id: str) -> None: ...
+
+    def nodes(self) -> dict[str, dict[str, Any]]:
+        """node_id -> info of every live node."""
+        ...
+
+
+class MemoryClusterStore:
+    """The cluster state in process: desired cameras, leases and heartbeats with
+    expiries on ``clock``."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._cameras: dict[str, dict[str, Any]] = {}
+        self._leases: dict[str, tuple[str, float]] = {}
+        self._nodes: dict[str, tuple[dict[str, Any], float]] = {}
+        self._lock = threading.Lock()
+
+    def add_camera(self, camera_id: str, spec: dict[str, Any]) -> bool:
+        with self._lock:
+            if camera_id in self._cameras:
+                return False
+            self._cameras[camera_id] = dict(spec)
+            return True
+
+    def remove_camera(self, camera_id: str) -> bool:
+        with self._lock:
+            return self._cameras.pop(camera_id, None) is not None
+
+    def cameras(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {camera_id: dict(spec) for camera_id, spec in self._cameras.items()}
+
+    def acquire(self, camera_id: str, node_id: str, ttl: float) -> bool:
+        now = self._clock()
+        with self._lock:
+            lease = self._leases.get(camera_id)
+            if lease is not None and lease[1] > now:
+                return False
+            self._leases[camera_id] = (node_id, now + ttl)
+            return True
+
+    def renew(self, camera_id: str, node_id: str, ttl: float) -> bool:
+        now = self._clock()
+        with self._lock:
+            lease = self._leases.get(camera_id)
+            if lease is None or lease[0] != node_id or lease[1] <= now:
+                return False
+            self._leases[camera_id] = (node_id, now + ttl)
+            return True
+
+    def release(self, camera_id: str, node_id: str) -> None:
+        with self._lock:
+            lease = self._leases.get(camera_id)
+            if lease is not None and lease[0] == node_id:
+                del self._leases[camera_id]
+
+    def owners(self) -> dict[str, str]:
+        now = self._clock()
+        with self._lock:
+            return {c: node for c, (node, expires) in self._leases.items() if expires > now}
+
+    def heartbeat(self, node_id: str, info: dict[str, Any], ttl: float) -> None:
+        with self._lock:
+            self._nodes[node_id] = (info, self._clock() + ttl)
+
+    def drop_node(self, node_id: str) -> None:
+        with self._lock:
+            self._nodes.pop(node_id, None)
+
+    def nodes(self) -> dict[str, dict[str, Any]]:
+        now = self._clock()
+        with self._lock:
+            return {node: info for node, (info, expires) in self._nodes.items() if expires > now}
+
+
+# Compare-and-set on the lease owner, so a node can only extend or drop its own lease
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisClusterStore:
+    """Desired cameras in one hash; leases and heartbeats as keys with a TTL that
+    Redis expires. An injected ``client`` must use ``decode_responses=True``."""
+
+    def __init__(self, url: str = "", client: Any = None) -> None:
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                message = "CLUSTER_BACKEND=redis needs the redis extra"
+                raise RuntimeError(f"{message} (pip install 'face-service[redis]')") from e
+            client = redis.Redis.from_url(
+                url, socket_timeout=1.0, socket_connect_timeout=1.0, decode_responses=True
+            )
+        self._client = client
+        self._renew = client.register_script(RENEW_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def add_camera(self, camera_id: str, spec: dict[str, Any]) -> bool:
+        return bool(self._client.hsetnx(CAMERAS_KEY, camera_id, json.dumps(spec)))
+
+    def remove_camera(self, camera_id: str) -> bool:
+        return bool(self._client.hdel(CAMERAS_KEY, camera_id))
+
+    def cameras(self) -> dict[str, dict[str, Any]]:
+        return {c: json.loads(spec) for c, spec in self._client.hgetall(CAMERAS_KEY).items()}
+
+    def acquire(self, camera_id: str, node_id: str, ttl: float) -> bool:
+        return bool(self._client.set(LEASE_PREFIX + camera_id, node_id, nx=True, px=_ms(ttl)))
+
+    def renew(self, camera_id: str, node_id: str, ttl: float) -> bool:
+        return bool(self._renew(keys=[LEASE_PREFIX + camera_id], args=[node_id, _ms(ttl)]))
+
+    def release(self, camera_id: str, node_id: str) -> None:
+        self._release(keys=[LEASE_PREFIX + camera_id], args=[node_id])
+
+    def owners(self) -> dict[str, str]:
+        return {k.removeprefix(LEASE_PREFIX): v for k, v in self._scan(LEASE_PREFIX).items()}
+
+    def heartbeat(self, node_id: str, info: dict[str, Any], ttl: float) -> None:
+        self._client.set(NODE_PREFIX + node_id, json.dumps(info), px=_ms(ttl))
+
+    def drop_node(self, node_id: str) -> None:
+        self._client.delete(NODE_PREFIX + node_id)
+
+    def nodes(self) -> dict[str, dict[str, Any]]:
+        return {
+            k.removeprefix(NODE_PREFIX): json.loads(v) for k, v in self._scan(NODE_PREFIX).items()
+        }
+
+    def _scan(self, prefix: str) -> dict[str, str]:
+        keys = list(self._client.scan_iter(match=prefix + "*", count=500))
+        if not keys:
+            return {}
+        # A key can expire between the scan and the read
+        return {k: v for k, v in zip(keys, self._client.mget(keys), strict=True) if v is not None}
+
+
+def _ms(seconds: float) -> int:
+    return max(int(seconds * 1000), 1)
+
+
+class ClusterCoordinator:
+    """Runs this node's share of the cluster's cameras on a local ``StreamManager``."""
+
+    def __init__(
+        self,
+        store: ClusterStore,
+        manager: StreamManager,
+        node_id: str,
+        lease_seconds: float = 15.0,
+        interval: float = 3.0,
+        tolerance: float = 1.25,
+        min_hold: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.store = store
+        self.manager = manager
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.tolerance = tolerance
+        self.min_hold = min_hold
+        self._clock = clock
+        self._owned: dict[str, float] = {}  # camera_id -> acquired at
+        self._loads: dict[str, float] = {}  # camera_id -> frames decoded per second
+        self._counts: dict[str, tuple[float, int]] = {}  # camera_id -> (at, frames decoded)
+        self._statuses: dict[str, dict[str, Any]] = {}
+        self._failed: dict[str, float] = {}  # camera_id -> when its stream died or failed here
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.claimed = 0
+        self.released = 0
+        self.lost = 0
+        self.dead = 0
+        self.errors = 0
+
+    @property
+    def owned(self) -> list[str]:
+        return sorted(self._owned)
+
+    @property
+    def load(self) -> float:
+        estimate = self._mean_load()
+        return sum(self._loads.get(camera_id, estimate) for camera_id in self._owned)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="cluster", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop this node's cameras and give their leases up, so the other nodes
+        take them over right away instead of after the lease expires."""
+        self._stop_event.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        try:
+            with self._lock:
+                for camera_id in list(self._owned):
+                    self._drop(camera_id)
+            self.store.drop_node(self.node_id)
+        except Exception as e:
+            # The leases and heartbeat then simply expire
+            logger.warning("Could not hand over the cameras of node %s: %s", self.node_id, e)
+
+    def start_stream(self, **spec: Any) -> bool:
+        """Add a camera to the cluster. False if the cluster already has it.
+        The least loaded node starts it within one interval."""
+        if not self.store.add_camera(spec["camera_id"], spec):
+            return False
+        self._wake.set()
+        return True
+
+    def stop_stream(self, camera_id: str) -> bool:
+        """Remove a camera from the cluster. Its node stops it within one interval,
+        or right away if that is this node."""
+        removed = self.store.remove_camera(camera_id)
+        with self._lock:
+            if camera_id in self._owned:
+                self._drop(camera_id)
+        return removed
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                # Keep the local cameras running; leases are renewed on the next tick
+                self.errors += 1
+                logger.warning("Cluster coordination failed on %s: %s", self.node_id, e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def tick(self) -> None:
+        """One round of lease renewal, heartbeat, takeover and rebalancing."""
+        with self._lock:
+            now = self._clock()
+            desired = self.store.cameras()
+            statuses = {s["camera_id"]: s for s in self.manager.get_status()}
+            self._failed = {c: at for c, at in self._failed.items() if now - at < self.min_hold}
+            self._renew(desired, statuses, now)
+            self._measure(now, statuses)
+            nodes = self.store.nodes()
+            loads = {node_id: float(info["load"]) for node_id, info in nodes.items()}
+            loads[self.node_id] = self.load
+            failed = {node_id: set(info.get("failed", ())) for node_id, info in nodes.items()}
+            failed[self.node_id] = set(self._failed)
+            self._take_orphans(desired, loads, failed, now)
+            self._rebalance(loads, now)
+            # Last, so the other nodes plan with the cameras taken or handed back here
+            self.store.heartbeat(self.node_id, self._info(), self.lease_seconds)
+
+    def _renew(
+        self, desired: dict[str, dict[str, Any]], statuses: dict[str, dict[str, Any]], now: float
+    ) -> None:
+        for camera_id in list(self._owned):
+            if camera_id not in desired:
+                logger.info("Camera %s was stopped through another node", camera_id)
+                self._drop(camera_id)
+            elif not statuses.get(camera_id, {}).get("running"):
+                # The worker gave up reconnecting: let any node try the camera again
+                logger.warning("Stream of camera %s ended, releasing its lease", camera_id)
+                self.dead += 1
+                self._failed[camera_id] = now
+                self._drop(camera_id)
+            elif not self.store.renew(camera_id, self.node_id, self.lease_seconds):
+                logger.warning("Lost the lease of camera %s, stopping it", camera_id)
+                self.lost += 1
+                self._drop(camera_id, release=False)
+
+    def _measure(self, now: float, statuses: dict[str, dict[str, Any]]) -> None:
+        for camera_id in self._owned:
+            status = statuses.get(camera_id)
+            if status is None:
+                continue
+            self._statuses[camera_id] = status
+            decoded = status["frames_decoded"]
+            previous = self._counts.get(camera_id)
+            if previous is not None and now > previous[0]:
+                self._loads[camera_id] = (decoded - previous[1]) / (now - previous[0])
+            self._counts[camera_id] = (now, decoded)
+
+    def _mean_load(self) -> float:
+        # Cameras not measured yet count as this node's average camera, or 1
+        measured = [self._loads[c] for c in self._owned if c in self._loads]
+        return sum(measured) / len(measured) if measured and sum(measured) else 1.0
+
+    def _info(self) -> dict[str, Any]:
+        return {
+            "load": self.load,
+            "cameras": {c: self._statuses.get(c, {"camera_id": c}) for c in self._owned},
+            "failed": sorted(self._failed),
+            "updated_at": time.time(),
+        }
+
+    def _take_orphans(
+        self,
+        desired: dict[str, dict[str, Any]],
+        loads: dict[str, float],
+        failed: dict[str, set[str]],
+        now: float,
+    ) -> None:
+        owners = self.store.owners()
+        orphans = sorted(camera_id for camera_id in desired if camera_id not in owners)
+        if not orphans:
+            return
+        # Every node computes the same greedy assignment from the shared loads and
+        # claims its part; a camera two nodes both claim goes to the first acquire.
+        # Nodes a camera recently failed on are passed over while others remain.
+        projected = dict(loads)
+        per_camera = self._mean_load()
+        for camera_id in orphans:
+            candidates = [n for n in projected if camera_id not in failed.get(n, ())]
+            node_id = min(candidates or projected, key=lambda n: (projected[n], n))
+            projected[node_id] += per_camera
+            if node_id != self.node_id:
+                continue
+            if not self.store.acquire(camera_id, self.node_id, self.lease_seconds):
+                continue
+            try:
+                started = self.manager.start_stream(**desired[camera_id])
+            except Exception as e:
+                logger.warning("Could not start camera %s: %s", camera_id, e)
+                started = False
+            if not started:
+                self._failed[camera_id] = now
+                self.store.release(camera_id, self.node_id)
+                continue
+            self._owned[camera_id] = now
+            self.claimed += 1
+            logger.info("Node %s took over camera %s", self.node_id, camera_id)
+
+    def _rebalance(self, loads: dict[str, float], now: float) -> None:
+        if len(loads) < 2 or len(self._owned) < 2:
+            return
+        mean = sum(loads.values()) / len(loads)
+        if mean <= 0 or loads[self.node_id] <= self.tolerance * mean:
+            return
+        # The camera that, moved to the least loaded node, leaves the two closest,
+        # among those held long enough not to bounce between nodes
+        gap = loads[self.node_id] - min(loads.values())
+        estimate = self._mean_load()
+        movable = [
+            (abs(gap - 2 * load), load, camera_id)
+            for camera_id, since in self._owned.items()
+            if now - since >= self.min_hold
+            and 0 < (load := self._loads.get(camera_id, estimate)) < gap
+        ]
+        if not movable:
+            return
+        _, load, camera_id = min(movable)
+        logger.info(
+            "Node %s hands camera %s (load %.1f) back: %.1f against a mean of %.1f",
+            self.node_id,
+            camera_id,
+            load,
+            loads[self.node_id],
+            mean,
+        )
+        self._drop(camera_id)
+        self.released += 1
+
+    def _drop(self, camera_id: str, release: bool = True) -> None:
+        # Stop before releasing, so the next owner never overlaps with this one
+        self.manager.stop_stream(camera_id)
+        if release:
+            self.store.release(camera_id, self.node_id)
+        self._owned.pop(camera_id, None)
+        self._loads.pop(camera_id, None)
+        self._counts.pop(camera_id, None)
+        self._statuses.pop(camera_id, None)
+
+    def status(self) -> dict[str, Any]:
+        """The cluster as every node sees it: live nodes with their load, and every
+        camera with the node running it (None while it waits for one)."""
+        nodes = self.store.nodes()
+        owners = self.store.owners()
+        cameras = []
+        for camera_id, spec in sorted(self.store.cameras().items()):
+            node_id = owners.get(camera_id)
+            node_cameras = nodes.get(node_id, {}).get("cameras", {}) if node_id else {}
+            cameras.append(
+                {
+                    **{k: v for k, v in spec.items() if k not in PRIVATE_FIELDS},
+                    "node_id": node_id,
+                    "status": node_cameras.get(camera_id),
+                }
+            )
+        return {
+            "node_id": self.node_id,
+            "nodes": [
+                {
+                    "node_id": node_id,
+                    "load": info["load"],
+                    "cameras": len(info["cameras"]),
+                    "updated_at": info["updated_at"],
+                }
+                for node_id, info in sorted(nodes.items())
+            ],
+            "cameras": cameras,
+        }
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "node_id": self.node_id,
+            "cameras": len(self._owned),
+            "load": self.load,
+            "claimed": self.claimed,
+            "released": self.released,
+            "lost": self.lost,
+            "dead": self.dead,
+            "errors": self.errors,
+        }
+
+
+def create_cluster_coordinator(manager: StreamManager) -> ClusterCoordinator | None:
+    """The coordinator for ``settings.cluster_backend``, or None when streams are
+    not shared between replicas."""
+    if settings.cluster_backend == "off":
+        return None
+    store: ClusterStore = (
+        RedisClusterStore(settings.redis_url)
+        if settings.cluster_backend == "redis"
+        else MemoryClusterStore()
+    )
+    return ClusterCoordinator(
+        store,
+        manager,
+        node_id=settings.cluster_node_id or f"{socket.gethostname()}-{os.getpid()}",
+        lease_seconds=settings.cluster_lease_seconds,
+        interval=settings.cluster_interval_seconds,
+        tolerance=settings.cluster_rebalance_tolerance,
+        min_hold=settings.cluster_min_hold_seconds,
+    )
+
+
+# Singleton instance
+cluster_coordinator = create_cluster_coordinator(stream_manager)
@@ -0,0 +1,103 @@
+"""Check-in deduplication shared by all stream workers.
+
+An identification is a duplicate if the same employee of the same company was
+already reported at the same location within that location's window, from
+any camera. ``MemoryDedupStore`` keeps the keys in process (lost on
+restart); ``RedisDedupStore`` keeps them in Redis so they survive restarts
+and are shared between service instances. Both decide in O(1).
+"""
+
+import heapq
+import logging
+import threading
+import time
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "attndly:dedup:"
+
+
+def dedup_key(company_id: str, location_id: str, employee_id: str) -> str:
+    return f"{company_id}:{location_id}:{employee_id}"
+
+
+def window_for(location_id: str) -> float:
+    return settings.dedup_location_windows.get(location_id, settings.dedup_window_seconds)
+
+
+class DedupStore(Protocol):
+    def check_and_set(self, key: str, window: float) -> bool:
+        """Return True if ``key`` was seen within its window; otherwise record it
+        for ``window`` seconds and return False."""
+        ...
+
+
+class MemoryDedupStore:
+    """Dict of key -> expiry, pruned through a heap of expiries so it stays bounded
+    by the number of keys seen within one window."""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic) -> None:
+        self._clock = clock
+        self._expiry: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def check_and_set(self, key: str, window: float) -> bool:
+        now = self._clock()
+        with self._lock:
+            self._prune(now)
+            expires = self._expiry.get(key)
+            if expires is not None and expires > now:
+                return True
+            self._expiry[key] = now + window
+            heapq.heappush(self._heap, (now + window, key))
+            return False
+
+    def _prune(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            expires, key = heapq.heappop(self._heap)
+            # A key re-recorded since has a later expiry and a newer heap entry
+            if self._expiry.get(key) == expires:
+                del self._expiry[key]
+
+
+class RedisDedupStore:
+    """``SET key NX PX window`` per check, so Redis owns the TTL. Falls back to an
+    in-process store while Redis is unreachable."""
+
+    def __init__(self, url: str = "", client: Any = None) -> None:
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError(
+                    "DEDUP_BACKEND=redis needs the redis extra (pip install 'face-service[redis]')"
+                ) from e
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._client = client
+        self._fallback = MemoryDedupStore()
+        self.errors = 0
+
+    def check_and_set(self, key: str, window: float) -> bool:
+        try:
+            created = self._client.set(
+                KEY_PREFIX + key, "1", nx=True, px=max(int(window * 1000), 1)
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Redis dedup check failed, using local dedup: %s", e)
+            return self._fallback.check_and_set(key, window)
+        return not created
+
+
+def create_dedup_store() -> DedupStore:
+    if settings.dedup_backend == "redis":
+        return RedisDedupStore(settings.redis_url)
+    return MemoryDedupStore()
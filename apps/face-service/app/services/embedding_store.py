@@ -0,0 +1,318 @@
+"""Compact on-disk embedding store, one directory per company.
+
+Layout of ``<storage>/encodings/<company_id>/``::
+
+    index.json              {"generation", "dim", "rows", "dead", "employees": {id: [start, count]}}
+    embeddings-<gen>.f32    raw little-endian float32 rows, ``dim`` columns each
+    version                 little-endian uint64, incremented by every index commit
+    .lock                   ``flock``-ed by writers (exclusive) and readers (shared)
+
+Rows are L2-normalized on write so the matcher can use a memory map of the
+data file as its gallery matrix without copying. Replacing or deleting an
+employee only tombstones their old rows; ``compact`` rewrites the live rows
+into a new generation of the data file once enough of it is dead. The index is
+always replaced atomically and is the commit point for every write.
+
+Several processes (uvicorn workers) can share one store: writes hold an
+exclusive lock on the store across processes, so there is a single writer at a
+time, and every commit bumps the ``version`` counter, which readers poll
+through a memory map to notice that they should reload.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.json"
+VERSION_FILE = "version"
+LOCK_FILE = ".lock"
+DTYPE = np.dtype("<f4")
+
+
+def normalize(encodings: np.ndarray | list[list[float]] | list[float]) -> np.ndarray:
+    """Return encodings as float32 rows scaled to unit L2 norm. Zero rows stay zero."""
+    arr = np.asarray(encodings, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(arr / norms, dtype=np.float32)
+
+
+@dataclass
+class StoreIndex:
+    generation: int = 0
+    dim: int = 0
+    rows: int = 0
+    dead: int = 0
+    employees: dict[str, tuple[int, int]] = field(default_factory=dict)
+
+    @property
+    def data_file(self) -> str:
+        return f"embeddings-{self.generation}.f32"
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "dim": self.dim,
+            "rows": self.rows,
+            "dead": self.dead,
+            "employees": {e: list(span) for e, span in self.employees.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> "StoreIndex":
+        return cls(
+            generation=data["generation"],
+            dim=data["dim"],
+            rows=data["rows"],
+            dead=data["dead"],
+            employees={e: (span[0], span[1]) for e, span in data["employees"].items()},
+        )
+
+
+class EmbeddingStore:
+    """Append-only float32 embedding file plus an id/offset index for one company."""
+
+    def __init__(self, directory: Path, compact_ratio: float = 0.25) -> None:
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        self._lock_file: IO[bytes] | None = None  # open while this process holds the flock
+        self._version_map: mmap.mmap | None = None
+
+    @contextmanager
+    def _locked(self, exclusive: bool = True) -> Iterator[None]:
+        """Hold the store's thread lock and, unless already held, its file lock:
+        exclusive for writers, shared for readers. Reading a store that does not
+        exist yet takes no file lock."""
+        with self._lock:
+            if self._lock_file is not None or not (exclusive or self.directory.exists()):
+                yield
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / LOCK_FILE, "ab") as f:
+                fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self._lock_file = f
+                try:
+                    yield
+                finally:
+                    self._lock_file = None  # closing the file releases the flock
+
+    @contextmanager
+    def exclusive(self) -> Iterator[None]:
+        """Hold the store's exclusive lock across several reads and writes."""
+        with self._locked():
+            yield
+
+    def version(self) -> int:
+        """The commit counter of the store, 0 before the first commit. Cheap enough
+        to call per request: the counter file is memory-mapped on first use."""
+        if self._version_map is None:
+            try:
+                with open(self.directory / VERSION_FILE, "rb") as f:
+                    self._version_map = mmap.mmap(f.fileno(), 8, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):  # not written yet
+                return 0
+        version: int = struct.unpack_from("<Q", self._version_map)[0]
+        return version
+
+    def read_index(self) -> StoreIndex:
+        path = self.directory / INDEX_FILE
+        if not path.exists():
+            return StoreIndex()
+        return StoreIndex.from_json(json.loads(path.read_text()))
+
+    def get(self, employee_id: str) -> np.ndarray | None:
+        """Return a copy of one employee's rows, or None if not stored."""
+        with self._locked(exclusive=False):
+            index = self.read_index()
+            span = index.employees.get(employee_id)
+            if span is None:
+                return None
+            return np.array(self._memmap(index)[span[0] : span[0] + span[1]])
+
+    def put(self, employee_id: str, encodings: list[list[float]] | np.ndarray) -> None:
+        """Store an employee's encodings, replacing any previous ones."""
+        self.put_many({employee_id: encodings})
+
+    def put_many(self, enrolled: Mapping[str, list[list[float]] | np.ndarray]) -> None:
+        """Store several employees' encodings in one append and one index commit."""
+        batches = {e: normalize(encs) for e, encs in enrolled.items() if len(encs)}
+        with self._locked():
+            index = self.read_index()
+            if batches:
+                dim = next(iter(batches.values())).shape[1]
+                if index.dim and dim != index.dim:
+                    raise ValueError(f"Encoding dimension {dim} does not match store ({index.dim})")
+                index.dim = dim
+            for employee_id in enrolled:
+                self._tombstone(index, employee_id)
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / index.data_file, "ab") as f:
+                # Drop any rows left behind by a write that never reached the index
+                f.truncate(index.rows * index.dim * DTYPE.itemsize)
+                for employee_id, rows in batches.items():
+                    f.write(rows.astype(DTYPE, copy=False).tobytes())
+                    index.employees[employee_id] = (index.rows, len(rows))
+                    index.rows += len(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            self._commit(index)
+            self._maybe_compact(index)
+
+    def replace_all(self, enrolled: Mapping[str, list[list[float]] | np.ndarray]) -> None:
+        """Make ``enrolled`` the store's only contents, in a new data file and one
+        index commit. Unlike ``put_many`` the dimension may change (a new model)."""
+        batches = {e: normalize(encs) for e, encs in enrolled.items() if len(encs)}
+        dims = {rows.shape[1] for rows in batches.values()}
+        if len(dims) > 1:
+            raise ValueError(f"Encodings of several dimensions: {sorted(dims)}")
+        with self._locked():
+            index = self.read_index()
+            new = StoreIndex(generation=index.generation + 1, dim=dims.pop() if dims else 0)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / new.data_file, "wb") as f:
+                for employee_id, rows in batches.items():
+                    f.write(rows.astype(DTYPE, copy=False).tobytes())
+                    new.employees[employee_id] = (new.rows, len(rows))
+                    new.rows += len(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            self._commit(new)
+            (self.directory / index.data_file).unlink(missing_ok=True)
+
+    def fingerprints(self) -> tuple[int, dict[str, bytes]]:
+        """The store's version with a digest of each employee's rows, to tell later
+        which employees were written since (see ``put_unchanged``)."""
+        with self._locked(exclusive=False):
+            matrix, employee_ids, counts = self.load()
+            digests = {}
+            start = 0
+            for employee_id, count in zip(employee_ids, counts, strict=True):
+                rows = matrix[start : start + count]
+                digests[employee_id] = hashlib.blake2b(rows.tobytes(), digest_size=16).digest()
+                start += count
+            return self.version(), digests
+
+    def put_unchanged(
+        self,
+        enrolled: Mapping[str, list[list[float]] | np.ndarray],
+        version: int,
+        fingerprints: dict[str, bytes],
+    ) -> list[str]:
+        """``put_many`` for the employees whose rows are still the ones ``fingerprints``
+        saw at ``version``. Employees written or deleted since are left as they are
+        now. Encodings of another dimension (a new model) cannot sit next to the
+        stored ones and replace the whole store instead. Returns the employees left out.
+        """
+        with self._locked():
+            stale: list[str] = []
+            if self.version() != version:
+                _, current = self.fingerprints()
+                stale = [e for e in enrolled if current.get(e) != fingerprints.get(e)]
+            fresh = {e: rows for e, rows in enrolled.items() if e not in stale}
+            index = self.read_index()
+            dims = {len(rows[0]) for rows in fresh.values() if len(rows)}
+            if index.dim and dims and dims != {index.dim}:
+                self.replace_all(fresh)
+            elif fresh:
+                self.put_many(fresh)
+            return stale
+
+    def delete(self, employee_id: str) -> bool:
+        """Tombstone an employee's rows. Returns False if they were not stored."""
+        with self._locked():
+            index = self.read_index()
+            if not self._tombstone(index, employee_id):
+                return False
+            self._commit(index)
+            self._maybe_compact(index)
+            return True
+
+    def load(self) -> tuple[np.ndarray, list[str], list[int]]:
+        """Return (matrix, employee_ids, counts) with rows grouped in employee order.
+
+        Without tombstones the matrix is a read-only memory map of the data file,
+        which processes loading the same store share through the page cache.
+        """
+        with self._locked(exclusive=False):
+            index = self.read_index()
+            spans = sorted(index.employees.items(), key=lambda item: item[1][0])
+            employee_ids = [employee_id for employee_id, _ in spans]
+            counts = [count for _, (_, count) in spans]
+            if not spans:
+                return np.zeros((0, index.dim), dtype=np.float32), [], []
+            matrix = self._memmap(index)
+            if index.dead:
+                matrix = np.concatenate([matrix[start : start + n] for _, (start, n) in spans])
+            return matrix, employee_ids, counts
+
+    def compact(self) -> None:
+        """Rewrite the live rows into a fresh data file and drop the old one."""
+        with self._locked():
+            index = self.read_index()
+            matrix, employee_ids, counts = self.load()
+            old_file = self.directory / index.data_file
+            new = StoreIndex(generation=index.generation + 1, dim=index.dim)
+            with open(self.directory / new.data_file, "wb") as f:
+                f.write(np.ascontiguousarray(matrix, dtype=DTYPE).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            for employee_id, count in zip(employee_ids, counts, strict=True):
+                new.employees[employee_id] = (new.rows, count)
+                new.rows += count
+            self._commit(new)
+            old_file.unlink(missing_ok=True)
+            logger.info("Compacted %s: %d live of %d rows", self.directory, new.rows, index.rows)
+
+    def _memmap(self, index: StoreIndex) -> np.ndarray:
+        if not index.rows:
+            return np.zeros((0, index.dim), dtype=np.float32)
+        return np.memmap(
+            self.directory / index.data_file, dtype=DTYPE, mode="r", shape=(index.rows, index.dim)
+        )
+
+    def _tombstone(self, index: StoreIndex, employee_id: str) -> bool:
+        span = index.employees.pop(employee_id, None)
+        if span is None:
+            return False
+        index.dead += span[1]
+        return True
+
+    def _commit(self, index: StoreIndex) -> None:
+        tmp = self.directory / f"{INDEX_FILE}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index.to_json(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.directory / INDEX_FILE)
+        self._bump_version()
+
+    def _bump_version(self) -> None:
+        # Caller holds the exclusive lock. Written in place, never replaced, so
+        # readers' memory maps of the counter see the new value.
+        fd = os.open(self.directory / VERSION_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            current = os.pread(fd, 8, 0)
+            version = struct.unpack("<Q", current)[0] + 1 if len(current) == 8 else 1
+            os.pwrite(fd, struct.pack("<Q", version), 0)
+        finally:
+            os.close(fd)
+
+    def _maybe_compact(self, index: StoreIndex) -> None:
+        if index.dead and index.dead >= self.compact_ratio * index.rows:
+            self.compact()
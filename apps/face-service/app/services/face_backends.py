@@ -0,0 +1,429 @@
+"""Face detector and embedder implementations behind ``face_engine``.
+
+``settings.face_detector`` and ``settings.face_model`` pick the implementation:
+
+* ``cv2-yunet`` / ``cv2-ssd`` run YuNet (ONNX) or the res10 SSD (Caffe, OpenCV
+  < 5 only) directly through ``cv2``, with DeepFace-style eye alignment.
+* ``Facenet512-onnx`` runs the Facenet512 ONNX graph with onnxruntime (or
+  ``cv2.dnn`` when it is not installed), in fp32, fp16 or int8
+  (``settings.onnx_precision``).
+* Any other name is passed to DeepFace, which imports TensorFlow.
+
+Crops follow DeepFace's conventions (channel order, 0-1 floats, alignment and
+resize/padding), so either backend produces embeddings that match galleries
+enrolled with the other. Weights live where DeepFace keeps them
+(``<DEEPFACE_HOME>/.deepface/weights``) and are downloaded on first use.
+"""
+
+import functools
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Literal, Protocol
+
+import cv2
+import httpx
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+WEIGHT_URLS = {
+    "face_detection_yunet_2023mar.onnx": [
+        "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx"
+    ],
+    "deploy.prototxt": [
+        "https://github.com/opencv/opencv/raw/3.4.0/samples/dnn/face_detector/deploy.prototxt"
+    ],
+    "res10_300x300_ssd_iter_140000.caffemodel": [
+        "https://github.com/opencv/opencv_3rdparty/raw/dnn_samples_face_detector_20170830/res10_300x300_ssd_iter_140000.caffemodel"
+    ],
+    "facenet512_weights.onnx": [
+        "https://github.com/serengil/deepface_models/releases/download/v1.0/facenet512_weights.onnx",
+        "https://huggingface.co/serengil/deepface/resolve/main/facenet512_weights.onnx",
+    ],
+}
+
+# Detections below this score are ignored, as DeepFace does for SSD and YuNet
+DETECTION_THRESHOLD = 0.9
+
+Precision = Literal["fp32", "fp16", "int8"]
+# A detector's face box (x, y, w, h), score and eye positions, before cropping
+Region = tuple[tuple[int, int, int, int], float, tuple[int, int] | None, tuple[int, int] | None]
+
+
+class Detector(Protocol):
+    def load(self) -> None: ...
+
+    def detect(self, img: np.ndarray) -> list[dict[str, Any]]:
+        """``face_engine.detect_faces`` for an RGB uint8 image."""
+        ...
+
+
+class Embedder(Protocol):
+    def load(self) -> None: ...
+
+    def embed(self, faces: list[np.ndarray]) -> np.ndarray:
+        """``face_engine.embed_faces`` for a non-empty list of detector crops."""
+        ...
+
+
+def model_cache_dir() -> Path:
+    return Path(settings.model_cache_path or Path(settings.storage_path) / "models")
+
+
+def weights_dir() -> Path:
+    home = os.environ.get("DEEPFACE_HOME") or model_cache_dir()
+    return Path(home) / ".deepface" / "weights"
+
+
+def fetch_weights(name: str) -> Path:
+    """Path of a weights file, downloading it into ``weights_dir()`` if missing."""
+    path = weights_dir() / name
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    for url in WEIGHT_URLS.get(name, []):
+        logger.info("Downloading %s from %s", name, url)
+        tmp = path.with_suffix(path.suffix + ".part")
+        try:
+            with httpx.stream("GET", url, follow_redirects=True, timeout=60) as response:
+                response.raise_for_status()
+                with open(tmp, "wb") as f:
+                    for chunk in response.iter_bytes():
+                        f.write(chunk)
+            os.replace(tmp, path)
+            return path
+        except (httpx.HTTPError, OSError) as e:
+            logger.warning("Download of %s failed: %s", name, e)
+            tmp.unlink(missing_ok=True)
+    raise FileNotFoundError(f"Model weights {name} not found in {path.parent}")
+
+
+@functools.cache
+def _deepface() -> Any:
+    """Import DeepFace, and TensorFlow with it, on first use rather than at startup.
+
+    Model weights are kept under ``model_cache_dir()`` (unless DEEPFACE_HOME is
+    already set) so they are downloaded once per volume, not once per container.
+    """
+    if "DEEPFACE_HOME" not in os.environ:
+        model_cache_dir().mkdir(parents=True, exist_ok=True)
+        os.environ["DEEPFACE_HOME"] = str(model_cache_dir().resolve())
+    from deepface import DeepFace
+
+    return DeepFace
+
+
+class DeepFaceDetector:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def load(self) -> None:
+        if self.name != "skip":
+            _deepface().build_model(self.name, task="face_detector")
+
+    def detect(self, img: np.ndarray) -> list[dict[str, Any]]:
+        try:
+            results = _deepface().extract_faces(
+                img_path=img,
+                detector_backend=self.name,
+                enforce_detection=True,
+                align=True,
+            )
+        except ValueError:
+            return []
+        return [
+            {
+                "face": r["face"],
+                "facial_area": r["facial_area"],
+                "confidence": float(r.get("confidence", 0)),
+            }
+            for r in results
+        ]
+
+
+class DeepFaceEmbedder:
+    def __init__(self, model_name: str) -> None:
+        self.model_name = model_name
+
+    def load(self) -> None:
+        _deepface().build_model(self.model_name, task="facial_recognition")
+
+    def embed(self, faces: list[np.ndarray]) -> np.ndarray:
+        # With detection skipped DeepFace treats inputs as BGR, so flip the RGB crops
+        # back; preprocessing then matches what represent() does after detecting.
+        results = _deepface().represent(
+            img_path=[face[:, :, ::-1] for face in faces],
+            model_name=self.model_name,
+            detector_backend="skip",
+            enforce_detection=False,
+        )
+        if len(faces) == 1:
+            results = [results]
+        return np.stack(
+            [
+                np.asarray(
+                    (r[0] if isinstance(r, list) else r)["embedding"], dtype=np.float32
+                ).ravel()
+                for r in results
+            ]
+        )
+
+
+def _sub_image(img: np.ndarray, x: int, y: int, w: int, h: int) -> np.ndarray:
+    """The face box grown by half its size on every side, zero-padded at the edges."""
+    rx, ry = w // 2, h // 2
+    x1, y1 = max(0, x - rx), max(0, y - ry)
+    x2, y2 = min(img.shape[1], x + w + rx), min(img.shape[0], y + h + ry)
+    if x1 == x - rx and y1 == y - ry and x2 == x + w + rx and y2 == y + h + ry:
+        return img[y1:y2, x1:x2]
+    out = np.zeros((h + 2 * ry, w + 2 * rx, img.shape[2]), dtype=img.dtype)
+    region = img[y1:y2, x1:x2]
+    start_x, start_y = x1 - (x - rx), y1 - (y - ry)
+    out[start_y : start_y + region.shape[0], start_x : start_x + region.shape[1]] = region
+    return out
+
+
+def _project(
+    box: tuple[int, int, int, int], angle: float, size: tuple[int, int]
+) -> tuple[int, int, int, int]:
+    # Port of deepface.modules.detection.project_facial_area, for identical crops
+    direction = 1 if angle >= 0 else -1
+    angle = abs(angle) % 360
+    if angle == 0:
+        return box
+    angle = angle * np.pi / 180
+    height, width = size
+    x = (box[0] + box[2]) / 2 - width / 2
+    y = (box[1] + box[3]) / 2 - height / 2
+    x_new = x * np.cos(angle) + y * direction * np.sin(angle) + width / 2
+    y_new = -x * direction * np.sin(angle) + y * np.cos(angle) + height / 2
+    half_w, half_h = (box[2] - box[0]) / 2, (box[3] - box[1]) / 2
+    return (
+        max(int(x_new - half_w), 0),
+        max(int(y_new - half_h), 0),
+        min(int(x_new + half_w), width),
+        min(int(y_new + half_h), height),
+    )
+
+
+def align_crop(
+    img: np.ndarray,
+    box: tuple[int, int, int, int],
+    left_eye: tuple[int, int] | None,
+    right_eye: tuple[int, int] | None,
+) -> np.ndarray:
+    """Crop a face, rotated so the eyes are level, the way DeepFace's extract_faces does."""
+    x, y, w, h = box
+    sub = _sub_image(img, x, y, w, h)
+    angle = 0.0
+    if left_eye is not None and right_eye is not None and sub.size:
+        angle = float(
+            np.degrees(np.arctan2(left_eye[1] - right_eye[1], left_eye[0] - right_eye[0]))
+        )
+        rows, cols = sub.shape[:2]
+        matrix = cv2.getRotationMatrix2D((cols // 2, rows // 2), angle, 1.0)
+        sub = cv2.warpAffine(
+            sub, matrix, (cols, rows), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_CONSTANT
+        )
+    x1, y1, x2, y2 = _project((w // 2, h // 2, w // 2 + w, h // 2 + h), angle, sub.shape[:2])
+    return sub[int(y1) : int(y2), int(x1) : int(x2)]
+
+
+class OpenCVDetector:
+    """YuNet or SSD through cv2. Not thread-safe internally, so calls are serialized."""
+
+    def __init__(self, kind: Literal["yunet", "ssd"], threshold: float = DETECTION_THRESHOLD):
+        self.kind = kind
+        self.threshold = threshold
+        self._model: Any = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        if self._model is not None:
+            return
+        if self.kind == "yunet":
+            self._model = cv2.FaceDetectorYN.create(
+                str(fetch_weights("face_detection_yunet_2023mar.onnx")), "", (320, 320)
+            )
+            self._model.setScoreThreshold(self.threshold)
+        else:
+            if not hasattr(cv2.dnn, "readNetFromCaffe"):
+                raise RuntimeError(
+                    f"cv2-ssd needs OpenCV < 5 (Caffe import), have {cv2.__version__}"
+                )
+            self._model = cv2.dnn.readNetFromCaffe(
+                str(fetch_weights("deploy.prototxt")),
+                str(fetch_weights("res10_300x300_ssd_iter_140000.caffemodel")),
+            )
+
+    def detect(self, img: np.ndarray) -> list[dict[str, Any]]:
+        self.load()
+        with self._lock:
+            regions = self._yunet(img) if self.kind == "yunet" else self._ssd(img)
+        height, width = img.shape[:2]
+        faces = []
+        for (x, y, w, h), confidence, left_eye, right_eye in regions:
+            w = max(0, min(width, x + w) - max(0, x))
+            h = max(0, min(height, y + h) - max(0, y))
+            x, y = max(0, x), max(0, y)
+            crop = align_crop(img, (x, y, w, h), left_eye, right_eye)
+            if not crop.size:
+                continue
+            faces.append(
+                {
+                    # Same layout DeepFace returns for our RGB frames
+                    "face": crop[:, :, ::-1].astype(np.float32) / 255.0,
+                    "facial_area": {
+                        "x": x,
+                        "y": y,
+                        "w": min(width - x - 1, w),
+                        "h": min(height - y - 1, h),
+                        "left_eye": left_eye,
+                        "right_eye": right_eye,
+                    },
+                    "confidence": round(confidence, 2),
+                }
+            )
+        return faces
+
+    def _yunet(self, img: np.ndarray) -> list[Region]:
+        # Fed as DeepFace feeds it (our RGB frames in its BGR slot) and downscaled to
+        # at most 640px the same way, but without DeepFace's 50% black border: that
+        # quadruples the pixels and halves small faces before the downscale.
+        height, width = img.shape[:2]
+        scale = min(1.0, 640.0 / max(height, width))
+        if scale < 1.0:
+            img = cv2.resize(img, (int(width * scale), int(height * scale)))
+        self._model.setInputSize((img.shape[1], img.shape[0]))
+        _, found = self._model.detect(np.ascontiguousarray(img))
+        regions: list[Region] = []
+        for row in [] if found is None else found:
+            x, y, w, h, rx, ry, lx, ly = (int(v) for v in row[:8])
+            x, y = max(x, 0), max(y, 0)
+            x, y, w, h, rx, ry, lx, ly = (int(v / scale) for v in (x, y, w, h, rx, ry, lx, ly))
+            regions.append(((x, y, w, h), float(row[-1]), (lx, ly), (rx, ry)))
+        return regions
+
+    def _ssd(self, img: np.ndarray) -> list[Region]:
+        height, width = img.shape[:2]
+        self._model.setInput(cv2.dnn.blobFromImage(cv2.resize(img, (300, 300))))
+        detections = self._model.forward()[0][0]
+        regions: list[Region] = []
+        for det in detections:
+            if det[1] != 1 or det[2] < self.threshold:
+                continue
+            left, top, right, bottom = (int(v * 300) for v in det[3:7])
+            x, y = int(left * width / 300), int(top * height / 300)
+            w, h = int(right * width / 300) - x, int(bottom * height / 300) - y
+            # No landmarks: crops are not rotated (DeepFace adds a Haar eye search here)
+            regions.append(((x, y, w, h), float(det[2]), None, None))
+        return regions
+
+
+def resize_pad(face: np.ndarray, size: tuple[int, int]) -> np.ndarray:
+    """Port of ``deepface.modules.preprocessing.resize_image`` for one face crop."""
+    factor = min(size[0] / face.shape[0], size[1] / face.shape[1])
+    face = cv2.resize(face, (int(face.shape[1] * factor), int(face.shape[0] * factor)))
+    d0, d1 = size[0] - face.shape[0], size[1] - face.shape[1]
+    face = np.pad(face, ((d0 // 2, d0 - d0 // 2), (d1 // 2, d1 - d1 // 2), (0, 0)))
+    if face.shape[:2] != size:
+        face = cv2.resize(face, (size[1], size[0]))
+    face = np.asarray(face, dtype=np.float32)
+    return face / 255.0 if face.max() > 1 else face
+
+
+def _variant(path: Path, precision: Precision) -> Path:
+    """The fp16/int8 conversion of an fp32 ONNX graph, created next to it once."""
+    if precision == "fp32":
+        return path
+    target = path.with_name(f"{path.stem}.{precision}.onnx")
+    if target.exists():
+        return target
+    logger.info("Converting %s to %s", path.name, precision)
+    tmp = target.with_suffix(".part")
+    if precision == "int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(path), str(tmp), weight_type=QuantType.QInt8)
+    else:
+        import onnx
+        from onnxconverter_common import float16
+
+        onnx.save(float16.convert_float_to_float16(onnx.load(str(path)), keep_io_types=True), tmp)
+    os.replace(tmp, target)
+    return target
+
+
+class OnnxEmbedder:
+    """An ONNX face embedding graph taking NHWC float32 input."""
+
+    def __init__(
+        self, weights: str, input_size: tuple[int, int], precision: Precision = "fp32"
+    ) -> None:
+        self.weights = weights
+        self.input_size = input_size
+        self.precision = precision
+        self._session: Any = None
+        self._net: Any = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        if self._session is not None or self._net is not None:
+            return
+        path = fetch_weights(self.weights)
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            if self.precision == "int8":
+                raise RuntimeError(
+                    "int8 embeddings need onnxruntime (face-service[onnx])"
+                ) from None
+            # cv2.dnn runs the fp32 graph; fp16 is a compute target rather than a file
+            self._net = cv2.dnn.readNetFromONNX(str(path))
+            if self.precision == "fp16":
+                self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU_FP16)
+            return
+        options = ort.SessionOptions()
+        options.log_severity_level = 3
+        self._session = ort.InferenceSession(
+            str(_variant(path, self.precision)), options, providers=["CPUExecutionProvider"]
+        )
+
+    def embed(self, faces: list[np.ndarray]) -> np.ndarray:
+        self.load()
+        # The crops are RGB; flip them to the BGR order DeepFaceEmbedder feeds its model
+        batch = np.stack([resize_pad(face[:, :, ::-1], self.input_size) for face in faces])
+        if self._session is not None:
+            name = self._session.get_inputs()[0].name
+            output = self._session.run(None, {name: batch})[0]
+        else:
+            with self._lock:
+                self._net.setInput(batch)
+                output = self._net.forward()
+        return np.asarray(output, dtype=np.float32).reshape(len(faces), -1)
+
+
+def create_detector(name: str) -> Detector:
+    if name in ("cv2-yunet", "cv2-ssd"):
+        return OpenCVDetector(name.removeprefix("cv2-"))  # type: ignore[arg-type]
+    return DeepFaceDetector(name)
+
+
+def create_embedder(name: str, precision: Precision = "fp32") -> Embedder:
+    if name == "Facenet512-onnx":
+        return OnnxEmbedder("facenet512_weights.onnx", (160, 160), precision)
+    return DeepFaceEmbedder(name)
+
+
+@functools.cache
+def get_detector(name: str) -> Detector:
+    return create_detector(name)
+
+
+@functools.cache
+def get_embedder(name: str, precision: Precision = "fp32") -> Embedder:
+    return create_embedder(name, precision)
@@ -1,83 +1,313 @@
-import io
 import logging
+import threading
+import time
+from collections.abc import Hashable
+from dataclasses import asdict, dataclass, replace
+from typing import Any
 
 import numpy as np
-from deepface import DeepFace
-from PIL import Image
 
 from app.core.config import settings
+from app.services import face_backends, images, matcher
+from app.services.gallery import Gallery
+from app.services.image_cache import digest, image_cache
+from app.services.images import UNDECODABLE
+from app.services.metrics import registry
 
 logger = logging.getLogger(__name__)
 
+DECODE_SECONDS = registry.histogram("face_image_decode_seconds", "Image bytes to RGB array")
+DETECT_SECONDS = registry.histogram("face_detect_seconds", "Face detection per image")
+EMBED_SECONDS = registry.histogram("face_embed_seconds", "Embedding model call per batch")
+
+
+@dataclass
+class WarmupState:
+    status: str = "idle"  # idle -> warming_up -> ready | failed
+    error: str | None = None
+    seconds: float | None = None
+
+
+warmup = WarmupState()
+
+
+@dataclass(frozen=True)
+class ImageFaces:
+    """Everything computed for one uploaded image, as kept in ``image_cache``."""
+
+    faces: list[dict[str, Any]]  # facial_area (in decoded pixels) and confidence per detected face
+    scale: float  # decoded / uploaded pixels
+    crops: list[np.ndarray]  # aligned face crops, until they are embedded
+    embeddings: np.ndarray | None = None  # one row per face
+
+    @property
+    def nbytes(self) -> int:
+        embedded = self.embeddings.nbytes if self.embeddings is not None else 0
+        return embedded + sum(crop.nbytes for crop in self.crops)
+
+
+@DECODE_SECONDS.time()
+def _decode(image_bytes: bytes) -> images.DecodedImage:
+    return images.decode(image_bytes)
+
 
 def _load_image(image_bytes: bytes) -> np.ndarray:
-    """Load image bytes into a numpy array (RGB)."""
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    return np.array(img)
+    """Load image bytes into a numpy array (RGB), upright and downscaled to
+    ``settings.image_max_side``."""
+    return _decode(image_bytes).pixels
+
+
+def frame_to_image(frame: np.ndarray) -> np.ndarray:
+    """Convert an OpenCV BGR frame to the RGB layout ``_load_image`` produces, which
+    is what enrolled encodings were computed from."""
+    return np.ascontiguousarray(frame[:, :, ::-1])
 
 
 def preload_model() -> None:
-    """Pre-load the face recognition model so the first request isn't slow."""
-    logger.info("Pre-loading face model: %s with detector: %s", settings.face_model, settings.face_detector)
-    # Build the model by running a dummy representation
-    # DeepFace caches models after first use
-    dummy = np.zeros((224, 224, 3), dtype=np.uint8)
+    """Build the recognition model and detector, then run one embedding so the
+    first request isn't slow. Raises if the model cannot be loaded."""
+    logger.info(
+        "Pre-loading face model: %s with detector: %s", settings.face_model, settings.face_detector
+    )
+    _detector().load()
+    _embedder().load()
+    embed_faces([np.zeros((160, 160, 3), dtype=np.float32)])
+    logger.info("Face model pre-loaded successfully")
+
+
+def warm_up() -> bool:
+    """``preload_model`` that records its progress for the readiness probe instead
+    of raising. Also the initializer of inference worker processes."""
+    state = warmup
+    state.status = "warming_up"
+    started = time.monotonic()
     try:
-        DeepFace.represent(
-            img_path=dummy,
-            model_name=settings.face_model,
-            detector_backend=settings.face_detector,
-            enforce_detection=False,
-        )
-        logger.info("Face model pre-loaded successfully")
+        preload_model()
     except Exception as e:
-        logger.warning("Model pre-load warning (expected on dummy image): %s", e)
+        logger.error("Face model warm-up failed: %s", e)
+        state.status, state.error = "failed", str(e)
+        return False
+    finally:
+        state.seconds = round(time.monotonic() - started, 3)
+    state.status = "ready"
+    return True
+
+
+def warmup_report() -> dict[str, Any]:
+    """This process's ``warmup`` state, for the parent of an inference worker."""
+    return asdict(warmup)
+
+
+def start_warm_up() -> threading.Thread:
+    """Run ``warm_up`` on a background thread so the API can serve /health meanwhile."""
+    thread = threading.Thread(target=warm_up, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def _detector() -> face_backends.Detector:
+    return face_backends.get_detector(settings.face_detector)
+
+
+def _embedder(model: str | None = None) -> face_backends.Embedder:
+    return face_backends.get_embedder(model or settings.face_model, settings.onnx_precision)
+
+
+def _cache_key(image_bytes: bytes) -> Hashable | None:
+    if not image_cache.enabled:
+        return None
+    # Everything that changes the detections or embeddings of the same bytes
+    return (
+        digest(image_bytes),
+        settings.face_detector,
+        settings.image_max_side,
+        settings.face_model,
+        settings.onnx_precision,
+    )
+
+
+def _image_faces(image_bytes: bytes, cached: bool = True) -> tuple[Hashable | None, ImageFaces]:
+    """Decode an image and detect its faces, or take both from the cache.
+
+    Returns the cache key (None when not cached) with the result. Raises one of
+    ``UNDECODABLE`` for bytes that are not an image.
+    """
+    key = _cache_key(image_bytes) if cached else None
+    if key is not None:
+        found = image_cache.get(key)
+        if found is not None:
+            return key, found
+    pixels, scale = _decode(image_bytes)
+    detections = detect_faces(pixels)
+    found = ImageFaces(
+        faces=[
+            {"facial_area": d["facial_area"], "confidence": d["confidence"]} for d in detections
+        ],
+        scale=scale,
+        crops=[d["face"] for d in detections],
+    )
+    if key is not None:
+        image_cache.put(key, found, found.nbytes)
+    return key, found
+
+
+def _embeddings(
+    images: list[tuple[Hashable | None, ImageFaces]], model: str | None = None
+) -> list[np.ndarray]:
+    """The embeddings of every face of each image: cached ones as they are, the
+    rest from a single ``embed_faces`` call (``model`` as there)."""
+    crops = [crop for _, found in images if found.embeddings is None for crop in found.crops]
+    embedded = embed_faces(crops, model=model) if crops else np.zeros((0, 0), dtype=np.float32)
+    results = []
+    offset = 0
+    for key, found in images:
+        rows = found.embeddings
+        if rows is None:
+            rows = embedded[offset : offset + len(found.crops)].copy()
+            rows.flags.writeable = False  # shared with later cache hits
+            offset += len(found.crops)
+            # The crops are not needed once embedded
+            found = replace(found, crops=[], embeddings=rows)
+            if key is not None:
+                image_cache.put(key, found, found.nbytes)
+        results.append(rows)
+    return results
 
 
 def detect_face(image_bytes: bytes) -> dict:
     """Check if an image contains a valid face. Returns detection info."""
-    img = _load_image(image_bytes)
     try:
-        results = DeepFace.extract_faces(
-            img_path=img,
-            detector_backend=settings.face_detector,
-            enforce_detection=True,
-        )
-        face_count = len(results)
-        if face_count == 0:
-            return {"detected": False, "face_count": 0, "message": "No face detected"}
-        if face_count > 1:
-            return {
-                "detected": True,
-                "face_count": face_count,
-                "message": "Multiple faces detected. Please ensure only one person is in the photo.",
-            }
-        confidence = float(results[0].get("confidence", 0))
+        _, found = _image_faces(image_bytes)
+        detections = found.faces
+    except Exception as e:
+        logger.warning("Face detection failed: %s", e)
+        detections = []
+    analysis = _analysis(detections)
+    analysis.pop("facial_area", None)
+    return analysis
+
+
+def extract_encoding(image_bytes: bytes) -> list[float]:
+    """Extract a 512-dimensional face encoding from an image."""
+    result = extract_encodings([image_bytes])[0]
+    if "embedding" not in result:
+        raise ValueError(result["message"])
+    embedding: list[float] = result["embedding"]
+    return embedding
+
+
+def extract_encodings(images: list[bytes]) -> list[dict[str, Any]]:
+    """``extract_encoding`` for many images, with one model call for all their faces.
+
+    Returns one dict per image: ``{"embedding": [...]}``, or ``{"message": ...}``
+    for an image that cannot be decoded or does not show exactly one face.
+    """
+    results: list[dict[str, Any]] = []
+    single: list[tuple[dict[str, Any], Hashable | None, ImageFaces]] = []
+    for image_bytes in images:
+        try:
+            key, found = _image_faces(image_bytes)
+        except UNDECODABLE:
+            results.append({"message": "Image could not be decoded"})
+            continue
+        if not found.faces:
+            results.append({"message": "No face detected in image"})
+        elif len(found.faces) > 1:
+            message = "Multiple faces detected. Please ensure only one person is in the photo."
+            results.append({"message": message})
+        else:
+            results.append({})
+            single.append((results[-1], key, found))
+
+    embeddings = _embeddings([(key, found) for _, key, found in single])
+    for (result, _, _), rows in zip(single, embeddings, strict=True):
+        result["embedding"] = [float(x) for x in rows[0]]
+    return results
+
+
+@DETECT_SECONDS.time()
+def detect_faces(img: np.ndarray) -> list[dict[str, Any]]:
+    """Detect and align every face in an RGB image.
+
+    Returns one dict per face with the aligned ``face`` crop (RGB, 0-1 floats),
+    its ``facial_area`` and detector ``confidence``. No face gives an empty list.
+    """
+    return _detector().detect(img)
+
+
+def embed_faces(faces: list[np.ndarray], model: str | None = None) -> np.ndarray:
+    """Embed already detected face crops from ``detect_faces`` in one model call,
+    with ``model`` instead of ``settings.face_model`` if given.
+    Returns a (len(faces), dim) float32 array."""
+    if not faces:
+        return np.zeros((0, 0), dtype=np.float32)
+    with EMBED_SECONDS.time():
+        return _embedder(model).embed(faces)
+
+
+def _analysis(detections: list[dict[str, Any]]) -> dict[str, Any]:
+    if not detections:
+        return {
+            "detected": False,
+            "face_count": 0,
+            "message": "No face detected in image. Please try again with a clearer photo.",
+        }
+    if len(detections) > 1:
         return {
             "detected": True,
+            "face_count": len(detections),
+            "message": "Multiple faces detected. Please ensure only one person is in the photo.",
+        }
+    confidence = detections[0]["confidence"]
+    if confidence < settings.min_face_confidence:
+        return {
+            "detected": False,
             "face_count": 1,
             "confidence": confidence,
-            "message": "Face detected successfully",
+            "message": "Face is not clear enough. Please try again with a clearer photo.",
         }
-    except Exception as e:
-        logger.warning("Face detection failed: %s", e)
-        return {"detected": False, "face_count": 0, "message": "No face detected in image. Please try again with a clearer photo."}
+    return {
+        "detected": True,
+        "face_count": 1,
+        "confidence": confidence,
+        "facial_area": detections[0]["facial_area"],
+        "message": "Face detected successfully",
+    }
 
 
-def extract_encoding(image_bytes: bytes) -> list[float]:
-    """Extract a 512-dimensional face encoding from an image."""
-    img = _load_image(image_bytes)
-    results = DeepFace.represent(
-        img_path=img,
-        model_name=settings.face_model,
-        detector_backend=settings.face_detector,
-        enforce_detection=True,
-    )
-    if not results:
-        raise ValueError("No face detected in image")
-    if len(results) > 1:
-        raise ValueError("Multiple faces detected. Please ensure only one person is in the photo.")
-    return [float(x) for x in results[0]["embedding"]]
+def analyze_faces(images: list[bytes], model: str | None = None) -> list[dict[str, Any]]:
+    """Detect, validate and embed one face per image, detecting each image only once.
+
+    Every result carries the detection fields of ``detect_face``; results for
+    images with exactly one acceptable face also get an ``embedding``. The crops
+    of all valid images are embedded together in a single model call (``model``
+    as in ``embed_faces``; results for another model than the configured one are
+    not cached).
+    """
+    analyses = []
+    valid: list[tuple[dict[str, Any], Hashable | None, ImageFaces]] = []
+    for image_bytes in images:
+        try:
+            key, found = _image_faces(image_bytes, cached=model is None)
+        except UNDECODABLE:
+            analyses.append(
+                {"detected": False, "face_count": 0, "message": "Image could not be decoded"}
+            )
+            continue
+        analysis = _analysis(found.faces)
+        if "facial_area" in analysis:
+            valid.append((analysis, key, found))
+        analyses.append(analysis)
+
+    embeddings = _embeddings([(key, found) for _, key, found in valid], model=model)
+    for (analysis, _, _), rows in zip(valid, embeddings, strict=True):
+        analysis["embedding"] = [float(x) for x in rows[0]]
+    return analyses
+
+
+def analyze_face(image_bytes: bytes) -> dict[str, Any]:
+    """Single-image ``analyze_faces``."""
+    return analyze_faces([image_bytes])[0]
 
 
 def compare_encodings(encoding1: list[float], encoding2: list[float]) -> float:
@@ -92,40 +322,115 @@ def compare_encodings(encoding1: list[float], encoding2: list[float]) -> float:
     return float(dot / (norm_a * norm_b))
 
 
-def identify_face(
-    image_bytes: bytes, enrolled_employees: dict[str, list[list[float]]]
-) -> dict:
+def identify_face(image_bytes: bytes, gallery: Gallery) -> dict[str, Any]:
     """Identify a face against ALL enrolled employees for a company.
     Returns the best matching employee_id and confidence."""
     try:
         new_encoding = extract_encoding(image_bytes)
     except ValueError as e:
         return {"identified": False, "employee_id": None, "confidence": 0.0, "message": str(e)}
+    return identify_encoding(new_encoding, gallery)
 
-    best_employee_id = None
-    best_confidence = 0.0
 
-    for employee_id, encodings in enrolled_employees.items():
-        for stored in encodings:
-            similarity = compare_encodings(new_encoding, stored)
-            if similarity > best_confidence:
-                best_confidence = similarity
-                best_employee_id = employee_id
+def identify_encoding(encoding: list[float], gallery: Gallery) -> dict[str, Any]:
+    """Match an already extracted encoding against a company gallery."""
+    return identify_encodings([encoding], gallery)[0]
 
-    if best_confidence >= settings.min_confidence and best_employee_id:
-        return {
-            "identified": True,
-            "employee_id": best_employee_id,
-            "confidence": round(best_confidence, 4),
-            "message": "Face identified",
+
+def identify_encodings(encodings: list[list[float]], gallery: Gallery) -> list[dict[str, Any]]:
+    """``identify_encoding`` for many encodings in one matrix product."""
+    if not encodings:
+        return []
+    results = []
+    for candidates in matcher.match(gallery, encodings):
+        best = candidates[0] if candidates else None
+        if best is not None and best.accepted:
+            results.append(
+                {
+                    "identified": True,
+                    "employee_id": best.employee_id,
+                    "confidence": round(best.confidence, 4),
+                    "message": "Face identified",
+                }
+            )
+        else:
+            results.append(
+                {
+                    "identified": False,
+                    "employee_id": None,
+                    "confidence": round(best.confidence, 4) if best else 0.0,
+                    "message": "Face not recognized",
+                }
+            )
+    return results
+
+
+def embed_image_faces(image_bytes: bytes) -> tuple[list[dict[str, Any]], np.ndarray]:
+    """Detect every face in an image and embed them all in one model call.
+
+    Returns ``(faces, embeddings)``: the ``facial_area`` and ``confidence`` of each
+    face, and a matching (N, dim) float32 array. Both are picklable, so this can
+    run in an inference worker process.
+    """
+    key, found = _image_faces(image_bytes)
+    embeddings = _embeddings([(key, found)])[0]
+    faces = [
+        {
+            # Boxes are reported in the pixels of the uploaded image
+            "facial_area": images.rescale_area(face["facial_area"], found.scale),
+            "confidence": face["confidence"],
         }
+        for face in found.faces
+    ]
+    return faces, embeddings
 
-    return {
-        "identified": False,
-        "employee_id": None,
-        "confidence": round(best_confidence, 4),
-        "message": "Face not recognized",
-    }
+
+def identify_embeddings(
+    faces: list[dict[str, Any]], embeddings: np.ndarray, gallery: Gallery
+) -> list[dict[str, Any]]:
+    """Match every face of ``embed_image_faces`` against a gallery in one matrix product.
+
+    One person cannot be two faces of the same image: employees are assigned
+    greedily, best scoring face first, and a face whose best match went to another
+    face falls back to its next candidate.
+    """
+    if not faces:
+        return []
+    candidates = matcher.match(gallery, embeddings, top_k=len(faces))
+    pairs = sorted(
+        ((match, i) for i, matches in enumerate(candidates) for match in matches if match.accepted),
+        key=lambda pair: -pair[0].confidence,
+    )
+    assigned: dict[int, matcher.Match] = {}
+    taken: set[str] = set()
+    for match, i in pairs:
+        if i not in assigned and match.employee_id not in taken:
+            assigned[i] = match
+            taken.add(match.employee_id)
+
+    results = []
+    for i, (face, matches) in enumerate(zip(faces, candidates, strict=True)):
+        best = assigned.get(i) or next((m for m in matches if m.employee_id not in taken), None)
+        identified = i in assigned
+        results.append(
+            {
+                "bbox": bbox(face["facial_area"]),
+                "identified": identified,
+                "employee_id": best.employee_id if best and identified else None,
+                "confidence": round(best.confidence, 4) if best else 0.0,
+            }
+        )
+    return results
+
+
+def identify_faces(image_bytes: bytes, gallery: Gallery) -> list[dict[str, Any]]:
+    """Identify every face in an image. Returns one entry per face with its ``bbox``."""
+    return identify_embeddings(*embed_image_faces(image_bytes), gallery)
+
+
+def bbox(facial_area: dict[str, Any]) -> dict[str, Any]:
+    """The x/y/w/h box of a DeepFace ``facial_area`` (which also carries eye positions)."""
+    return {k: int(facial_area.get(k, 0)) for k in ("x", "y", "w", "h")}
 
 
 def verify_face(
@@ -136,13 +441,12 @@ def verify_face(
         new_encoding = extract_encoding(image_bytes)
     except ValueError as e:
         return {"match": False, "confidence": 0.0, "message": str(e)}
+    return verify_encoding(new_encoding, stored_encodings)
 
-    best_confidence = 0.0
-    for stored in stored_encodings:
-        similarity = compare_encodings(new_encoding, stored)
-        if similarity > best_confidence:
-            best_confidence = similarity
 
+def verify_encoding(encoding: list[float], stored_encodings: list[list[float]]) -> dict[str, Any]:
+    """Compare an already extracted encoding with one employee's stored encodings."""
+    best_confidence = matcher.best_similarity(stored_encodings, encoding)
     is_match = best_confidence >= settings.min_confidence
     return {
         "match": is_match,
@@ -0,0 +1,324 @@
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import storage
+from app.services.ann_index import IVFIndex
+from app.services.embedding_store import normalize
+from app.services.metrics import MetricFamily, registry
+
+logger = logging.getLogger(__name__)
+
+
+def _wants_index(n_rows: int) -> bool:
+    return settings.match_index == "ivf" and n_rows >= settings.ivf_min_rows
+
+
+class GalleryView(NamedTuple):
+    matrix: np.ndarray
+    labels: np.ndarray
+    employee_ids: list[str]
+    ivf: IVFIndex | None
+
+
+class Gallery:
+    """All enrolled face encodings of one company as a single normalized matrix.
+
+    Row ``i`` of the matrix belongs to ``employee_ids[labels[i]]``. The arrays
+    form an immutable, versioned ``GalleryView``: enrollments and deletions
+    apply a delta into new arrays and publish the result as the next version
+    with one reference swap, so readers (the matcher) take ``snapshot`` without
+    a lock and keep a consistent view while updates land. Large galleries also
+    carry an IVF index when ``settings.match_index`` is ``"ivf"``.
+
+    With ``settings.shared_gallery`` a gallery loaded from storage is not updated
+    by deltas but reloaded, as a memory map of the store, once the store's
+    version has moved (``stale``).
+    """
+
+    def __init__(
+        self,
+        company_id: str,
+        matrix: np.ndarray,
+        labels: np.ndarray,
+        employee_ids: list[str],
+    ) -> None:
+        self.company_id = company_id
+        index = IVFIndex.build(matrix, settings.ivf_nlist) if _wants_index(len(matrix)) else None
+        self._current = (1, _frozen(GalleryView(matrix, labels, employee_ids, index)))
+        self._lock = threading.Lock()  # serializes writers only
+        self.store_version: int | None = None  # of the store this was loaded from
+
+    @classmethod
+    def from_encodings(cls, company_id: str, enrolled: dict[str, list[list[float]]]) -> "Gallery":
+        employee_ids = [employee_id for employee_id, encodings in enrolled.items() if encodings]
+        rows = [enc for employee_id in employee_ids for enc in enrolled[employee_id]]
+        counts = [len(enrolled[employee_id]) for employee_id in employee_ids]
+        matrix = normalize(rows) if rows else np.zeros((0, 0), dtype=np.float32)
+        labels = np.repeat(np.arange(len(employee_ids), dtype=np.int32), counts)
+        return cls(company_id, matrix, labels, employee_ids)
+
+    @classmethod
+    def from_storage(cls, company_id: str) -> "Gallery":
+        # Read the version first: a write landing during the load makes it stale
+        version = storage.store_version(company_id)
+        matrix, employee_ids, counts = storage.load_company_embeddings(company_id)
+        labels = np.repeat(np.arange(len(employee_ids), dtype=np.int32), counts)
+        gallery = cls(company_id, matrix, labels, employee_ids)
+        gallery.store_version = version
+        return gallery
+
+    def __len__(self) -> int:
+        return len(self.snapshot().employee_ids)
+
+    @property
+    def version(self) -> int:
+        """Incremented by every published update."""
+        return self._current[0]
+
+    @property
+    def nbytes(self) -> int:
+        matrix, labels, _, index = self.snapshot()
+        index_bytes = index.nbytes if index is not None else 0
+        return int(matrix.nbytes + labels.nbytes + index_bytes)
+
+    def snapshot(self) -> GalleryView:
+        """Return the current view of the matrix, labels, employee ids and index.
+        Views are never modified, so this needs no lock."""
+        return self._current[1]
+
+    def upsert(self, employee_id: str, encodings: list[list[float]]) -> None:
+        """Replace all encodings of an employee."""
+        self.upsert_many({employee_id: encodings})
+
+    def upsert_many(self, enrolled: Mapping[str, list[list[float]] | np.ndarray]) -> None:
+        """Replace the encodings of several employees as one new version."""
+        with self._lock:
+            matrix, labels, employee_ids, index = self._without(set(enrolled))
+            added = {e: normalize(encs) for e, encs in enrolled.items() if len(encs)}
+            if added:
+                rows = np.concatenate(list(added.values()))
+                start = len(matrix)
+                matrix = np.concatenate([matrix, rows]) if matrix.size else rows
+                labels = np.concatenate(
+                    [labels]
+                    + [
+                        np.full(len(encs), len(employee_ids) + i, dtype=np.int32)
+                        for i, encs in enumerate(added.values())
+                    ]
+                )
+                employee_ids = [*employee_ids, *added]
+                if index is not None:
+                    index = index.add(start, rows)
+            self._publish(GalleryView(matrix, labels, employee_ids, index))
+
+    def remove(self, employee_id: str) -> None:
+        """Drop all encodings of an employee."""
+        with self._lock:
+            self._publish(self._without({employee_id}))
+
+    @property
+    def stale(self) -> bool:
+        """Whether the store this gallery was loaded from has been written since."""
+        if self.store_version is None:
+            return False
+        return storage.store_version(self.company_id) != self.store_version
+
+    def reload(self) -> None:
+        """Load the company's store again and publish it as the next version."""
+        with self._lock:
+            version = storage.store_version(self.company_id)
+            matrix, employee_ids, counts = storage.load_company_embeddings(self.company_id)
+            labels = np.repeat(np.arange(len(employee_ids), dtype=np.int32), counts)
+            self.store_version = version
+            # Rows may have moved in the store, so rebucket them, but keep the trained
+            # centroids: _publish retrains only once the gallery has doubled
+            index = self.snapshot().ivf
+            if index is not None and index.centroids.shape[1] == matrix.shape[1]:
+                index = index.reassign(matrix)
+            else:
+                index = None  # a new model's embeddings need new centroids
+            self._publish(GalleryView(matrix, labels, employee_ids, index))
+
+    def _publish(self, view: GalleryView) -> None:
+        # Caller holds self._lock
+        matrix, labels, employee_ids, index = view
+        if not _wants_index(len(matrix)):
+            index = None
+        elif index is None or len(matrix) >= 2 * index.trained_rows:
+            # Retrain once the gallery has doubled so centroids follow the data
+            index = IVFIndex.build(matrix, settings.ivf_nlist)
+        self._current = (
+            self.version + 1,
+            _frozen(GalleryView(matrix, labels, employee_ids, index)),
+        )
+
+    def _without(self, removed: set[str]) -> GalleryView:
+        view = self.snapshot()
+        dropped = np.array([e in removed for e in view.employee_ids], dtype=bool)
+        if not dropped.any():
+            return view
+        keep = ~dropped[view.labels]
+        # Renumber the labels of everyone after a removed employee
+        new_label = (np.cumsum(~dropped) - 1).astype(np.int32)
+        labels = new_label[view.labels[keep]]
+        employee_ids = [e for e, gone in zip(view.employee_ids, dropped, strict=True) if not gone]
+        index = view.ivf.compact(keep) if view.ivf is not None else None
+        return GalleryView(view.matrix[keep], labels, employee_ids, index)
+
+
+def _frozen(view: GalleryView) -> GalleryView:
+    for array in (view.matrix, view.labels):
+        if array.flags.writeable:
+            array.flags.writeable = False
+    return view
+
+
+class GalleryCache:
+    """Process-wide LRU of company galleries, bounded by total matrix bytes.
+
+    Galleries are loaded from storage on first use and kept in sync by the
+    enrollment routes through ``upsert`` and ``remove``. With
+    ``settings.shared_gallery`` those are no-ops: writes may come from any
+    worker process, so ``get`` reloads a gallery whose store has moved on.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._galleries: OrderedDict[str, Gallery] = OrderedDict()
+        self._lock = threading.Lock()
+        self._company_locks: dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _company_lock(self, company_id: str) -> threading.Lock:
+        with self._lock:
+            return self._company_locks.setdefault(company_id, threading.Lock())
+
+    def get(self, company_id: str) -> Gallery:
+        """Return the gallery for a company, loading it from storage if needed."""
+        with self._lock:
+            gallery = self._galleries.get(company_id)
+            if gallery is not None:
+                self._galleries.move_to_end(company_id)
+                self.hits += 1
+        if gallery is not None:
+            if settings.shared_gallery and gallery.stale:
+                with self._company_lock(company_id):
+                    if gallery.stale:
+                        gallery.reload()
+            return gallery
+
+        # Load outside the global lock so one cold tenant doesn't block the others
+        with self._company_lock(company_id):
+            with self._lock:
+                gallery = self._galleries.get(company_id)
+                if gallery is not None:
+                    self.hits += 1
+                    return gallery
+            gallery = Gallery.from_storage(company_id)
+            with self._lock:
+                self.misses += 1
+                self._galleries[company_id] = gallery
+                self._evict()
+            return gallery
+
+    def upsert(self, company_id: str, employee_id: str, encodings: list[list[float]]) -> None:
+        """Apply a freshly saved enrollment to the cached gallery, if loaded."""
+        self.upsert_many(company_id, {employee_id: encodings})
+
+    def upsert_many(
+        self, company_id: str, enrolled: Mapping[str, list[list[float]] | np.ndarray]
+    ) -> None:
+        """Apply several saved enrollments to the cached gallery as one version."""
+        if settings.shared_gallery:
+            return
+        with self._company_lock(company_id):
+            with self._lock:
+                gallery = self._galleries.get(company_id)
+            if gallery is None:
+                return
+            gallery.upsert_many(enrolled)
+            with self._lock:
+                self._evict()
+
+    def remove(self, company_id: str, employee_id: str) -> None:
+        """Drop a deleted enrollment from the cached gallery, if loaded."""
+        if settings.shared_gallery:
+            return
+        with self._company_lock(company_id):
+            with self._lock:
+                gallery = self._galleries.get(company_id)
+            if gallery is not None:
+                gallery.remove(employee_id)
+
+    def invalidate(self, company_id: str | None = None) -> None:
+        """Forget one company's gallery, or all of them."""
+        with self._lock:
+            if company_id is None:
+                self._galleries.clear()
+            else:
+                self._galleries.pop(company_id, None)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return sum(g.nbytes for g in self._galleries.values())
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "companies": len(self._galleries),
+                "bytes": sum(g.nbytes for g in self._galleries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def collect_metrics(self) -> list[MetricFamily]:
+        """Gallery sizes of the loaded companies for ``/metrics``."""
+        with self._lock:
+            galleries = list(self._galleries.items())
+        views = [(company_id, g.snapshot()) for company_id, g in galleries]
+        return [
+            MetricFamily(
+                "face_gallery_employees",
+                "gauge",
+                "Enrolled employees per loaded company gallery",
+                [({"company_id": c}, len(view.employee_ids)) for c, view in views],
+            ),
+            MetricFamily(
+                "face_gallery_embeddings",
+                "gauge",
+                "Embeddings per loaded company gallery",
+                [({"company_id": c}, len(view.labels)) for c, view in views],
+            ),
+            MetricFamily(
+                "face_gallery_cache_bytes",
+                "gauge",
+                "Memory held by cached galleries",
+                [({}, sum(g.nbytes for _, g in galleries))],
+            ),
+        ]
+
+    def _evict(self) -> None:
+        # Caller holds self._lock. The most recently used gallery is always kept,
+        # even if it alone exceeds the budget.
+        total = sum(g.nbytes for g in self._galleries.values())
+        while total > self.max_bytes and len(self._galleries) > 1:
+            company_id, gallery = self._galleries.popitem(last=False)
+            total -= gallery.nbytes
+            self.evictions += 1
+            logger.info("Evicted gallery for company %s (%d bytes)", company_id, gallery.nbytes)
+
+
+# Singleton instance
+gallery_cache = GalleryCache(max_bytes=settings.gallery_cache_max_bytes)
+registry.collector(gallery_cache.collect_metrics)
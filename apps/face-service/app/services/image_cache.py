@@ -0,0 +1,132 @@
+"""Content-addressed cache of per-image face results.
+
+Clients retry ``/attendance/identify`` and ``/enroll/verify`` on timeouts, and
+the web flow sends the same photos to ``/enroll/detect`` and then ``/enroll``.
+``face_engine`` keys what it computed for an image (detections, then
+embeddings) by a hash of the uploaded bytes and the model settings, so a repeat
+costs a hash and a dict lookup instead of decoding, detection and a model call.
+
+Entries expire ``ttl`` seconds after they were stored and the least recently
+used ones are evicted beyond ``max_bytes``. With ``inference_mode="process"``
+every worker process keeps its own cache (and counters).
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+from app.core.config import settings
+from app.services.metrics import MetricFamily, registry
+
+# Bookkeeping per entry on top of its arrays: key, dicts, OrderedDict node
+ENTRY_OVERHEAD_BYTES = 512
+
+
+def digest(data: bytes) -> bytes:
+    """A 128-bit BLAKE2b of ``data``: about 1 GB/s, so well under a millisecond per photo."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ImageCache:
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (value, nbytes, expires at)
+        self._entries: OrderedDict[Hashable, tuple[Any, int, float]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: Hashable) -> Any | None:
+        """The value stored under ``key``, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, nbytes: int) -> None:
+        """Store ``value`` (taking ``nbytes`` of memory) under ``key``, replacing any
+        previous value. Values larger than the whole cache are not stored."""
+        nbytes += ENTRY_OVERHEAD_BYTES
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, nbytes, time.monotonic() + self.ttl)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _drop(self, key: Hashable) -> None:
+        # Caller holds self._lock
+        _, nbytes, _ = self._entries.pop(key)
+        self._bytes -= nbytes
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def collect_metrics(self) -> list[MetricFamily]:
+        """Hit/miss counters and memory use for ``/metrics``."""
+        stats = self.stats()
+        return [
+            MetricFamily(
+                "face_image_cache_requests_total",
+                "counter",
+                "Image cache lookups by result",
+                [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])],
+            ),
+            MetricFamily(
+                "face_image_cache_evictions_total",
+                "counter",
+                "Image cache entries evicted for memory",
+                [({}, stats["evictions"])],
+            ),
+            MetricFamily(
+                "face_image_cache_bytes",
+                "gauge",
+                "Memory held by the image cache",
+                [({}, stats["bytes"])],
+            ),
+        ]
+
+
+# Singleton instance
+image_cache = ImageCache(
+    max_bytes=settings.image_cache_max_bytes, ttl=settings.image_cache_ttl_seconds
+)
+registry.collector(image_cache.collect_metrics)
@@ -0,0 +1,71 @@
+"""Decoding uploaded photos into the RGB arrays the face model works on.
+
+Uploads are decoded no larger than ``settings.image_max_side`` on the long
+side: JPEGs are scaled down inside the decoder (PIL draft mode picks a DCT
+scale of 1/2, 1/4 or 1/8), so a 12 MP phone photo never materializes at full
+resolution, and the remaining (less than 2x) reduction is a cheap bilinear
+resize. EXIF orientation is applied so portrait photos reach the detector
+upright.
+"""
+
+import io
+from typing import Any, NamedTuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+EXIF_ORIENTATION = 0x0112
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png")  # accepted inside uploaded archives
+
+# Raised for truncated, corrupt or unsupported image data
+UNDECODABLE = (OSError, ValueError, Image.DecompressionBombError)
+
+
+class DecodedImage(NamedTuple):
+    pixels: np.ndarray  # RGB uint8, upright
+    scale: float  # decoded size / original (upright) size
+
+
+def decode(image_bytes: bytes, max_side: int | None = None) -> DecodedImage:
+    """Decode image bytes, upright and at most ``max_side`` pixels on the long side
+    (``settings.image_max_side`` by default; 0 keeps the full resolution)."""
+    if max_side is None:
+        max_side = settings.image_max_side
+    img: Image.Image = Image.open(io.BytesIO(image_bytes))
+    orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+    width, height = img.size
+    if orientation in (5, 6, 7, 8):  # rotated by 90 degrees
+        width, height = height, width
+
+    if max_side and max(img.size) > max_side:
+        ratio = max_side / max(img.size)
+        # Only a hint: the decoder returns the smallest scale still >= this size
+        img.draft("RGB", (round(img.size[0] * ratio), round(img.size[1] * ratio)))
+    if orientation != 1:
+        img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    pixels = np.array(img)
+    h, w = pixels.shape[:2]
+    if max_side and max(h, w) > max_side:
+        ratio = max_side / max(h, w)
+        size = (max(1, round(w * ratio)), max(1, round(h * ratio)))
+        pixels = cv2.resize(pixels, size, interpolation=cv2.INTER_LINEAR)
+    return DecodedImage(pixels, pixels.shape[1] / width)
+
+
+def rescale_area(facial_area: dict[str, Any], scale: float) -> dict[str, Any]:
+    """Map a ``facial_area`` found on a decoded image back to original pixels."""
+    if scale == 1.0:
+        return facial_area
+    out = dict(facial_area)
+    for key in ("x", "y", "w", "h"):
+        if key in out:
+            out[key] = int(round(out[key] / scale))
+    for key in ("left_eye", "right_eye"):
+        if out.get(key) is not None:
+            out[key] = tuple(int(round(v / scale)) for v in out[key])
+    return out
@@ -0,0 +1,347 @@
+"""Process-wide executor for face model calls.
+
+Stream pipelines and HTTP routes submit detection/embedding work here instead
+of calling DeepFace on their own threads. The executor
+
+* runs jobs on a fixed pool of threads, or of processes that each load the
+  model once (``settings.inference_mode``),
+* schedules round-robin across tenants and, within a tenant, across sources
+  (cameras or HTTP), so one busy camera cannot starve the others,
+* caps the number of jobs handed to the pool (``max_in_flight``), and
+* merges queued ``embed_faces`` jobs into one model call of up to
+  ``max_batch`` crops, so batches grow with load instead of adding latency.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Literal
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import face_engine
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+JOB_SECONDS = registry.histogram(
+    "face_inference_job_seconds", "Model call on the inference pool", ("kind",)
+)
+
+
+class InferenceOverloadedError(RuntimeError):
+    """Raised instead of queueing when too much work is already waiting."""
+
+
+class InferenceTimeoutError(TimeoutError):
+    """Raised when a job does not finish within its deadline."""
+
+
+@dataclass
+class _Job:
+    fn: Callable[..., Any]
+    args: tuple[Any, ...]
+    future: Future[Any]
+    faces: list[np.ndarray] = field(default_factory=list)  # set for batchable embed jobs
+
+    @property
+    def batchable(self) -> bool:
+        return bool(self.faces)
+
+
+class InferenceExecutor:
+    def __init__(
+        self,
+        mode: Literal["thread", "process"] = "thread",
+        workers: int = 2,
+        max_in_flight: int = 4,
+        max_batch: int = 32,
+        max_queue: int = 64,
+        timeout: float = 30.0,
+    ) -> None:
+        self.mode = mode
+        self.workers = workers
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._queues: OrderedDict[str, OrderedDict[str, deque[_Job]]] = OrderedDict()
+        self._pending = 0
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._pool: Executor | None = None
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self.completed = 0
+        self.failed = 0
+        self.model_calls = 0
+        self.batched_jobs = 0
+        self.shed = 0
+        self.timed_out = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            if self.mode == "process":
+                # Spawn so children don't inherit a half-initialized TensorFlow
+                self._pool = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=face_engine.warm_up,
+                )
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="inference")
+            self._thread = threading.Thread(
+                target=self._run, name="inference-dispatch", daemon=True
+            )
+            self._thread.start()
+
+    def warm_up(self) -> bool:
+        """Load the model where jobs will run, recording progress in ``face_engine.warmup``.
+
+        Thread mode loads it once in this process. Process mode starts the pool now
+        and waits for every worker's initializer instead, so the model is not loaded
+        in this process as well and readiness reflects the workers.
+        """
+        if self.mode != "process":
+            return face_engine.warm_up()
+        state = face_engine.warmup
+        state.status, state.error = "warming_up", None
+        started = time.monotonic()
+        self.start()
+        with self._cond:
+            pool = self._pool
+        try:
+            if pool is None:
+                raise RuntimeError("Inference executor stopped")
+            # Submitted back to back, each report gets its own freshly spawned worker
+            futures = [pool.submit(face_engine.warmup_report) for _ in range(self.workers)]
+            reports = [future.result() for future in futures]
+        except Exception as e:
+            reports = [{"status": "failed", "error": str(e)}]
+        finally:
+            state.seconds = round(time.monotonic() - started, 3)
+        failed = [report for report in reports if report["status"] != "ready"]
+        if failed:
+            logger.error("Inference worker warm-up failed: %s", failed[0]["error"])
+            state.status, state.error = "failed", failed[0]["error"]
+            return False
+        state.status = "ready"
+        return True
+
+    def start_warm_up(self) -> threading.Thread:
+        """Run ``warm_up`` on a background thread so the API can serve /health meanwhile."""
+        thread = threading.Thread(target=self.warm_up, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        with self._cond:
+            thread, pool = self._thread, self._pool
+            self._stopping = True
+            self._thread = None
+            self._pool = None
+            for sources in self._queues.values():
+                for queue in sources.values():
+                    for job in queue:
+                        job.future.cancel()
+            self._queues.clear()
+            self._pending = 0
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join(timeout=10)
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(
+        self, fn: Callable[..., Any], *args: Any, tenant: str = "", source: str = ""
+    ) -> Future[Any]:
+        """Queue ``fn(*args)`` to run on the pool. ``fn`` must be picklable in process mode."""
+        return self._enqueue(_Job(fn, args, Future()), tenant, source)
+
+    def submit_embed(
+        self, faces: list[np.ndarray], tenant: str = "", source: str = ""
+    ) -> "Future[np.ndarray]":
+        """Queue face crops for embedding; may share a model call with other jobs."""
+        if not faces:
+            future: Future[np.ndarray] = Future()
+            future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return future
+        return self._enqueue(_Job(face_engine.embed_faces, (), Future(), faces), tenant, source)
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        tenant: str = "",
+        source: str = "http",
+        timeout: float | None = None,
+    ) -> Any:
+        """Await ``fn(*args)`` on the pool without blocking the event loop.
+
+        Request-path entry point: refuses with ``InferenceOverloadedError`` when
+        ``max_queue`` jobs are already waiting, and raises ``InferenceTimeoutError``
+        (cancelling the job if it has not started) after ``timeout`` seconds.
+        """
+        self.admit()
+        future = self.submit(fn, *args, tenant=tenant, source=source)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except TimeoutError as e:
+            self.timed_out += 1
+            raise InferenceTimeoutError("Inference did not finish in time") from e
+
+    def admit(self, jobs: int = 1) -> None:
+        """Raise ``InferenceOverloadedError`` unless ``jobs`` more fit in ``max_queue``.
+        A request that submits several jobs is refused up front rather than part way."""
+        if self._pending + jobs > max(self.max_queue, jobs):
+            self.shed += 1
+            raise InferenceOverloadedError(f"{self._pending} inference jobs already queued")
+
+    def stats(self) -> dict[str, Any]:
+        with self._cond:
+            return {
+                "mode": self.mode,
+                "workers": self.workers,
+                "max_in_flight": self.max_in_flight,
+                "pending": self._pending,
+                "in_flight": self._in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+                "model_calls": self.model_calls,
+                "batched_jobs": self.batched_jobs,
+                "shed": self.shed,
+                "timed_out": self.timed_out,
+                "tenants_waiting": len(self._queues),
+            }
+
+    def _enqueue(self, job: _Job, tenant: str, source: str) -> Future[Any]:
+        self.start()
+        with self._cond:
+            self._queues.setdefault(tenant, OrderedDict()).setdefault(source, deque()).append(job)
+            self._pending += 1
+            self._cond.notify_all()
+        return job.future
+
+    def _pop(self, batchable_only: bool = False) -> _Job | None:
+        # Caller holds self._cond. Round-robin: the served tenant and source move
+        # to the back so everyone else gets a turn first.
+        for tenant in list(self._queues):
+            sources = self._queues[tenant]
+            for source in list(sources):
+                queue = sources[source]
+                if batchable_only and not queue[0].batchable:
+                    continue
+                job = queue.popleft()
+                if queue:
+                    sources.move_to_end(source)
+                else:
+                    del sources[source]
+                if sources:
+                    self._queues.move_to_end(tenant)
+                else:
+                    del self._queues[tenant]
+                self._pending -= 1
+                return job
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: (
+                        self._stopping or (self._pending and self._in_flight < self.max_in_flight)
+                    )
+                )
+                if self._stopping or self._pool is None:
+                    return
+                job = self._pop()
+                if job is None:
+                    continue
+                jobs = [job]
+                if job.batchable:
+                    size = len(job.faces)
+                    while size < self.max_batch:
+                        extra = self._pop(batchable_only=True)
+                        if extra is None:
+                            break
+                        jobs.append(extra)
+                        size += len(extra.faces)
+                self._in_flight += 1
+                pool = self._pool
+
+            jobs = [j for j in jobs if j.future.set_running_or_notify_cancel()]
+            if not jobs:
+                self._release()
+                continue
+            try:
+                if job.batchable:
+                    faces = [face for j in jobs for face in j.faces]
+                    inner = pool.submit(face_engine.embed_faces, faces)
+                    if len(jobs) > 1:
+                        self.batched_jobs += len(jobs)
+                else:
+                    inner = pool.submit(job.fn, *job.args)
+            except RuntimeError as e:  # pool shut down underneath us
+                for j in jobs:
+                    j.future.set_exception(e)
+                self._release()
+                continue
+            self.model_calls += 1
+            started = time.perf_counter()
+            inner.add_done_callback(partial(self._finish, jobs=jobs, started=started))
+
+    def _finish(self, done: Future[Any], jobs: list[_Job], started: float) -> None:
+        JOB_SECONDS.observe(
+            time.perf_counter() - started, kind="embed" if jobs[0].batchable else "call"
+        )
+        try:
+            result = done.result()
+        except BaseException as e:
+            self.failed += len(jobs)
+            for j in jobs:
+                j.future.set_exception(e)
+        else:
+            self.completed += len(jobs)
+            if jobs[0].batchable:
+                start = 0
+                for j in jobs:
+                    j.future.set_result(result[start : start + len(j.faces)])
+                    start += len(j.faces)
+            else:
+                jobs[0].future.set_result(result)
+        self._release()
+
+    def _release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+
+# Singleton instance
+inference_executor = InferenceExecutor(
+    mode=settings.inference_mode,
+    workers=settings.inference_workers,
+    max_in_flight=settings.inference_max_in_flight,
+    max_batch=settings.inference_max_batch,
+    max_queue=settings.inference_max_queue,
+    timeout=settings.inference_timeout_seconds,
+)
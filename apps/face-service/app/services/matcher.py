@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.ann_index import IVFIndex
+from app.services.embedding_store import normalize
+from app.services.gallery import Gallery
+from app.services.metrics import registry
+
+MATCH_SECONDS = registry.histogram("gallery_match_seconds", "Gallery search per batch of probes")
+
+
+@dataclass(frozen=True)
+class Match:
+    employee_id: str
+    confidence: float
+
+    @property
+    def accepted(self) -> bool:
+        """Whether the similarity clears ``settings.min_confidence``."""
+        return self.confidence >= settings.min_confidence
+
+
+def employee_scores(similarities: np.ndarray, labels: np.ndarray, n_employees: int) -> np.ndarray:
+    """Reduce (probes x rows) similarities to (probes x employees) by max over samples."""
+    out = np.full((similarities.shape[0], n_employees), -np.inf, dtype=np.float32)
+    if not len(labels):
+        return out
+    if np.all(labels[1:] >= labels[:-1]):
+        # Rows of one employee are contiguous, so a segmented reduce does it in one pass
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        out[:, labels[starts]] = np.maximum.reduceat(similarities, starts, axis=1)
+    else:
+        np.maximum.at(out.T, labels, similarities.T)  # out.T is a view: fills out
+    return out
+
+
+@MATCH_SECONDS.time()
+def match(
+    gallery: Gallery,
+    probes: np.ndarray | list[list[float]],
+    top_k: int = 1,
+    exact: bool = False,
+) -> list[list[Match]]:
+    """Score a batch of probe encodings against a company gallery.
+
+    Returns, for every probe, up to ``top_k`` employees ordered best first. Only
+    employees with a positive similarity are returned, mirroring the original
+    loop which started from a best confidence of 0. Galleries that carry an IVF
+    index are searched approximately unless ``exact`` is set.
+    """
+    probe_matrix = normalize(probes)
+    if probe_matrix.ndim == 1:
+        probe_matrix = probe_matrix[None, :]
+    matrix, labels, employee_ids, index = gallery.snapshot()
+    if not len(labels):
+        return [[] for _ in range(len(probe_matrix))]
+    if index is not None and not exact:
+        return _match_indexed(matrix, labels, employee_ids, index, probe_matrix, top_k)
+
+    scores = employee_scores(probe_matrix @ matrix.T, labels, len(employee_ids))
+    k = min(top_k, scores.shape[1])
+    if k < scores.shape[1]:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.broadcast_to(np.arange(k), (len(scores), k))
+
+    results: list[list[Match]] = []
+    for row, cols in zip(scores, candidates, strict=True):
+        ranked = sorted(cols, key=lambda col: -row[col])
+        results.append(
+            [Match(employee_ids[col], float(row[col])) for col in ranked if row[col] > 0.0]
+        )
+    return results
+
+
+def _match_indexed(
+    matrix: np.ndarray,
+    labels: np.ndarray,
+    employee_ids: list[str],
+    index: IVFIndex,
+    probes: np.ndarray,
+    top_k: int,
+) -> list[list[Match]]:
+    results: list[list[Match]] = []
+    for probe, rows in zip(probes, index.candidates(probes, settings.ivf_nprobe), strict=True):
+        similarities = matrix[rows] @ probe
+        order = np.argsort(-similarities)
+        # The first occurrence of each employee in descending order is their best sample
+        found, first = np.unique(labels[rows][order], return_index=True)
+        best = np.argsort(first)[:top_k]
+        results.append(
+            [
+                Match(employee_ids[found[i]], float(similarities[order[first[i]]]))
+                for i in best
+                if similarities[order[first[i]]] > 0.0
+            ]
+        )
+    return results
+
+
+def best_match(gallery: Gallery, probe: np.ndarray | list[float]) -> Match | None:
+    """Return the single best employee for one probe, or None for an empty gallery."""
+    matches = match(gallery, np.asarray(probe)[None, :], top_k=1)[0]
+    return matches[0] if matches else None
+
+
+def best_similarity(
+    stored: np.ndarray | list[list[float]], probe: np.ndarray | list[float]
+) -> float:
+    """Highest cosine similarity between a probe and one employee's stored encodings."""
+    if not len(stored):
+        return 0.0
+    return max(float(np.max(normalize(stored) @ normalize(probe))), 0.0)
@@ -0,0 +1,254 @@
+"""Prometheus metrics without a client library.
+
+Hot paths record into module-level ``Counter``/``Gauge``/``Histogram`` objects:
+one ``perf_counter`` pair, a bisect and a few additions under a lock, about a
+microsecond per observation. Numbers the services already keep (per-camera
+frame counters, gallery sizes, queue depths) are not recorded twice but read
+by collectors when ``/metrics`` is scraped.
+
+With ``inference_mode="process"`` detection and embedding run in worker
+processes, so their timings stay there; ``face_inference_job_seconds`` is
+recorded by the executor and covers both modes.
+"""
+
+import bisect
+import threading
+import time
+from collections.abc import Callable, Iterable
+from contextlib import ContextDecorator
+from typing import Any, NamedTuple, TypeVar
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from sub-millisecond matching to multi-second cold loads
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+
+class MetricFamily(NamedTuple):
+    """One metric as a collector reports it: ``samples`` are (labels, value) pairs."""
+
+    name: str
+    kind: str  # counter | gauge
+    help: str
+    samples: list[tuple[dict[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[Any]) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values, strict=True)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if not labels and not self.labelnames:
+            return ()
+        try:
+            if len(labels) == len(self.labelnames):
+                return tuple([str(labels[n]) for n in self.labelnames])
+        except KeyError:
+            pass
+        raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+
+    def header(self) -> list[str]:
+        help = self.help.replace("\\", "\\\\").replace("\n", "\\n")
+        return [f"# HELP {self.name} {help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_value(v)}" for k, v in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram: "Histogram", labels: dict[str, Any]) -> None:
+        self._histogram = histogram
+        self._labels = labels
+        self._start = 0.0
+
+    def _recreate_cm(self) -> "_Timer":
+        # A fresh timer per decorated call, so concurrent calls don't share _start
+        return _Timer(self._histogram, self._labels)
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf) and the sum
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def time(self, **labels: Any) -> _Timer:
+        """Time a block (``with``) or every call of a function (decorator)."""
+        return _Timer(self, labels)
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = [(k, list(counts), total[0]) for k, (counts, total) in self._series.items()]
+        lines = []
+        names = (*self.labelnames, "le")
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts, strict=True):
+                cumulative += count
+                labels = _labels(names, (*key, _value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], Iterable[MetricFamily]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: M) -> M:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if isinstance(existing, type(metric)):
+                # Re-imports (tests, reloads) get the same series back
+                return existing
+            if existing is not None:
+                raise ValueError(f"{metric.name} is already registered as a {existing.kind}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn: Callable[[], Iterable[MetricFamily]]) -> None:
+        """Register a function called on every scrape for values kept elsewhere."""
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines += metric.header() + metric.render()
+        for collect in collectors:
+            for family in collect():
+                lines.append(f"# HELP {family.name} {family.help}")
+                lines.append(f"# TYPE {family.name} {family.kind}")
+                for labels, value in family.samples:
+                    lines.append(
+                        f"{family.name}{_labels(labels.keys(), labels.values())} {_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+registry = Registry()
@@ -0,0 +1,95 @@
+import time
+from collections.abc import Callable
+from typing import Any
+
+import cv2
+import numpy as np
+
+# Grayscale difference (0-255) above which a downscaled pixel counts as changed
+PIXEL_DELTA = 25
+
+
+class MotionGate:
+    """Adaptive frame sampler for one camera.
+
+    Frames are compared with the previous checked frame on a small blurred
+    grayscale copy. While there has been motion in the last ``hold_seconds`` a
+    frame is let through every ``active_interval`` frames; otherwise only every
+    ``idle_interval`` frames, as a heartbeat for people standing still.
+    Only every ``active_interval``-th frame is compared at all; the rest are
+    gated without any work.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.01,
+        active_interval: int = 5,
+        idle_interval: int = 300,
+        hold_seconds: float = 2.0,
+        width: int = 160,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.threshold = threshold
+        self.active_interval = max(active_interval, 1)
+        self.idle_interval = max(idle_interval, self.active_interval)
+        self.hold_seconds = hold_seconds
+        self.width = width
+        self._clock = clock
+        self._previous: np.ndarray | None = None
+        self._since_inference = 0
+        self._last_motion = float("-inf")
+        self.frames_seen = 0
+        self.frames_gated = 0
+        self.frames_passed = 0
+        self.motion_checks = 0
+
+    @property
+    def active(self) -> bool:
+        return self._clock() - self._last_motion <= self.hold_seconds
+
+    def motion_score(self, frame: np.ndarray) -> float:
+        """Share of pixels that changed since the previously compared frame."""
+        height = max(1, frame.shape[0] * self.width // frame.shape[1])
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        previous, self._previous = self._previous, gray
+        self.motion_checks += 1
+        if previous is None or previous.shape != gray.shape:
+            return 1.0  # first frame: treat as motion so the camera is sampled right away
+        return float(np.count_nonzero(cv2.absdiff(gray, previous) > PIXEL_DELTA)) / gray.size
+
+    def tick(self) -> bool:
+        """Count a new frame. True if it should be decoded and passed to ``examine``."""
+        self.frames_seen += 1
+        self._since_inference += 1
+        # Compare only every active_interval frames, so the check itself is sampled
+        if self._since_inference % self.active_interval == 0:
+            return True
+        self.frames_gated += 1
+        return False
+
+    def examine(self, frame: np.ndarray) -> bool:
+        """Decide whether to run inference on a decoded BGR frame that ``tick`` asked for."""
+        if self.motion_score(frame) >= self.threshold:
+            self._last_motion = self._clock()
+        interval = self.active_interval if self.active else self.idle_interval
+        if self._since_inference >= interval:
+            self._since_inference = 0
+            self.frames_passed += 1
+            return True
+        self.frames_gated += 1
+        return False
+
+    def should_process(self, frame: np.ndarray) -> bool:
+        """``tick`` and ``examine`` for callers that decode every frame anyway."""
+        return self.tick() and self.examine(frame)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "active": self.active,
+            "frames_seen": self.frames_seen,
+            "frames_gated": self.frames_gated,
+            "frames_passed": self.frames_passed,
+            "motion_checks": self.motion_checks,
+        }
@@ -0,0 +1,411 @@
+"""Staged frame-processing pipeline shared by all RTSP stream workers.
+
+Capture threads hand raw frames to the pipeline, which runs them through
+``detect -> embed -> match -> dispatch`` stages. Each stage owns a bounded
+input queue and a thread that drains it in batches, so a slow model call never
+stalls frame grabbing and crops from several frames and cameras share one
+embedding call. Model calls themselves run on the shared ``InferenceExecutor``.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Generic, Literal, TypeVar
+
+import numpy as np
+
+from app.services import face_engine, matcher
+from app.services.gallery import Gallery
+from app.services.inference import InferenceExecutor
+from app.services.tracker import FaceTracker, Track, box_of
+
+logger = logging.getLogger(__name__)
+
+In = TypeVar("In")
+Out = TypeVar("Out")
+
+QueuePolicy = Literal["drop_oldest", "block"]
+
+
+@dataclass
+class FrameTask:
+    camera_id: str
+    company_id: str
+    image: np.ndarray  # RGB, as face_engine expects
+    gallery: Gallery
+    on_identified: Callable[[dict[str, Any]], None]
+    captured_at: float = field(default_factory=time.monotonic)
+    tracker: FaceTracker | None = None  # the camera's tracker, if tracking is on
+
+
+@dataclass
+class FaceTask:
+    frame: FrameTask
+    detection: dict[str, Any]  # a detect_faces entry
+    track: Track | None = None
+
+    @property
+    def face(self) -> np.ndarray:
+        face: np.ndarray = self.detection["face"]
+        return face
+
+
+@dataclass
+class EmbeddedFace:
+    face: FaceTask
+    embedding: np.ndarray
+
+
+@dataclass
+class Identification:
+    frame: FrameTask
+    result: dict[str, Any]
+
+
+class StageStats:
+    """Throughput and latency counters for one stage. Unlocked, as they only feed monitoring."""
+
+    def __init__(self) -> None:
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.emitted = 0
+        self.errors = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.max_batch_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def to_dict(self, queue_depth: int) -> dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "queue_depth": queue_depth,
+            "received": self.received,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "emitted": self.emitted,
+            "errors": self.errors,
+            "batches": self.batches,
+            "avg_batch_size": self.processed / self.batches if self.batches else 0.0,
+            "throughput_per_s": self.processed / elapsed,
+            "avg_batch_ms": 1000 * self.busy_seconds / self.batches if self.batches else 0.0,
+            "max_batch_ms": 1000 * self.max_batch_seconds,
+            "avg_wait_ms": 1000 * self.wait_seconds / self.processed if self.processed else 0.0,
+            "utilization": self.busy_seconds / elapsed,
+        }
+
+
+class BoundedQueue(Generic[In]):
+    """FIFO with a hard size limit.
+
+    With ``drop_oldest`` a full queue discards its oldest item to make room, which
+    suits live frames. With ``block`` producers wait up to ``block_timeout``
+    for room (backpressure) and only then drop the oldest item. Dropped items
+    are passed to ``on_drop``.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        policy: QueuePolicy = "drop_oldest",
+        block_timeout: float = 1.0,
+        on_drop: Callable[[In], None] | None = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.on_drop = on_drop
+        self._items: deque[tuple[float, In]] = deque()
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, item: In) -> bool:
+        """Enqueue an item. Returns False if an older item had to be dropped."""
+        with self._cond:
+            if self.policy == "block" and len(self._items) >= self.maxsize:
+                self._cond.wait_for(lambda: len(self._items) < self.maxsize, self.block_timeout)
+            dropped = None
+            if len(self._items) >= self.maxsize:
+                _, dropped = self._items.popleft()
+                self.dropped += 1
+            self._items.append((time.monotonic(), item))
+            self._cond.notify_all()
+        if dropped is None:
+            return True
+        if self.on_drop is not None:
+            self.on_drop(dropped)
+        return False
+
+    def get_batch(self, max_items: int, timeout: float) -> list[tuple[float, In]]:
+        """Wait up to ``timeout`` for items and return up to ``max_items`` of them."""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            batch: list[tuple[float, In]] = []
+            while self._items and len(batch) < max_items:
+                batch.append(self._items.popleft())
+            if batch:
+                self._cond.notify_all()
+            return batch
+
+
+class Stage(Generic[In, Out]):
+    """A worker thread that drains a bounded queue in batches through ``fn``.
+
+    ``fn`` maps a batch of inputs to any number of outputs, which are pushed to
+    the next stage.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[list[In]], list[Out]],
+        max_batch: int = 1,
+        queue_size: int = 64,
+        policy: QueuePolicy = "block",
+        downstream: "Stage[Out, Any] | None" = None,
+        on_drop: Callable[[In], None] | None = None,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.max_batch = max_batch
+        self.queue: BoundedQueue[In] = BoundedQueue(queue_size, policy, on_drop=on_drop)
+        self.downstream = downstream
+        self.stats = StageStats()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self.stats = StageStats()
+        self._thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def put(self, item: In) -> bool:
+        self.stats.received += 1
+        accepted = self.queue.put(item)
+        self.stats.dropped = self.queue.dropped
+        return accepted
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            batch = self.queue.get_batch(self.max_batch, timeout=0.1)
+            if not batch:
+                continue
+            started = time.monotonic()
+            self.stats.wait_seconds += sum(started - enqueued for enqueued, _ in batch)
+            try:
+                outputs = self.fn([item for _, item in batch])
+            except Exception as e:
+                self.stats.errors += 1
+                logger.error(
+                    "Pipeline stage %s failed on a batch of %d: %s", self.name, len(batch), e
+                )
+                outputs = []
+            elapsed = time.monotonic() - started
+            self.stats.batches += 1
+            self.stats.processed += len(batch)
+            self.stats.emitted += len(outputs)
+            self.stats.busy_seconds += elapsed
+            self.stats.max_batch_seconds = max(self.stats.max_batch_seconds, elapsed)
+            if self.downstream is not None:
+                for output in outputs:
+                    self.downstream.put(output)
+
+
+def release_claim(face: FaceTask) -> None:
+    """Give back the tracker claim of a face that will not reach the match stage."""
+    if face.track is not None and face.frame.tracker is not None:
+        face.frame.tracker.unclaim(face.track)
+
+
+def _release_embedded(face: EmbeddedFace) -> None:
+    release_claim(face.face)
+
+
+def detect_stage(executor: InferenceExecutor, frames: list[FrameTask]) -> list[FaceTask]:
+    futures = [
+        executor.submit(
+            face_engine.detect_faces, frame.image, tenant=frame.company_id, source=frame.camera_id
+        )
+        for frame in frames
+    ]
+    faces: list[FaceTask] = []
+    try:
+        for frame, future in zip(frames, futures, strict=True):
+            detections = future.result()
+            tracker = frame.tracker
+            if tracker is None:
+                faces.extend(FaceTask(frame, detection, None) for detection in detections)
+                continue
+            tracks = tracker.update([box_of(d) for d in detections], frame.captured_at)
+            for detection, track in zip(detections, tracks, strict=True):
+                if not tracker.claim(track):
+                    continue  # already identified, or embedded often enough
+                faces.append(FaceTask(frame, detection, track))
+    except Exception:
+        # The stage drops the whole batch, so none of these faces gets embedded
+        for face in faces:
+            release_claim(face)
+        raise
+    return faces
+
+
+def embed_stage(executor: InferenceExecutor, faces: list[FaceTask]) -> list[EmbeddedFace]:
+    # One job per camera keeps scheduling fair; the executor merges them back
+    # into a single model call when it can
+    by_camera: dict[tuple[str, str], list[FaceTask]] = {}
+    for face in faces:
+        by_camera.setdefault((face.frame.company_id, face.frame.camera_id), []).append(face)
+    futures = [
+        (group, executor.submit_embed([f.face for f in group], tenant=tenant, source=camera))
+        for (tenant, camera), group in by_camera.items()
+    ]
+    embedded: list[EmbeddedFace] = []
+    try:
+        for group, future in futures:
+            embedded.extend(
+                EmbeddedFace(face, emb) for face, emb in zip(group, future.result(), strict=True)
+            )
+    except Exception:
+        for face in faces:
+            release_claim(face)
+        raise
+    return embedded
+
+
+def _probe(face: EmbeddedFace) -> np.ndarray:
+    # Tracked faces are matched on the mean of all of the track's embeddings so far
+    track, tracker = face.face.track, face.face.frame.tracker
+    if track is None or tracker is None:
+        return face.embedding
+    return tracker.add_embedding(track, face.embedding)
+
+
+def match_stage(faces: list[EmbeddedFace]) -> list[Identification]:
+    by_gallery: dict[int, list[EmbeddedFace]] = {}
+    for face in faces:
+        by_gallery.setdefault(id(face.face.frame.gallery), []).append(face)
+
+    identified = []
+    for group in by_gallery.values():
+        gallery = group[0].face.frame.gallery
+        probes = [_probe(face) for face in group]
+        matches = matcher.match(gallery, np.stack(probes))
+        for face, candidates in zip(group, matches, strict=True):
+            if candidates and candidates[0].accepted:
+                best = candidates[0]
+                track, tracker = face.face.track, face.face.frame.tracker
+                if (
+                    track is not None
+                    and tracker is not None
+                    and not tracker.resolve(track, best.employee_id, best.confidence)
+                ):
+                    continue  # another embedding of this track got there first
+                result = {
+                    "identified": True,
+                    "employee_id": best.employee_id,
+                    "confidence": round(best.confidence, 4),
+                    "bbox": face_engine.bbox(face.face.detection["facial_area"]),
+                    "message": "Face identified",
+                }
+                identified.append(Identification(face.face.frame, result))
+    return identified
+
+
+class StreamPipeline:
+    """The ``detect -> embed -> match -> dispatch`` stages, started and stopped together."""
+
+    def __init__(
+        self,
+        executor: InferenceExecutor,
+        frame_queue_size: int = 32,
+        embed_batch_size: int = 16,
+        queue_size: int = 64,
+    ) -> None:
+        self.dispatch: Stage[Identification, None] = Stage(
+            "dispatch", self._dispatch_stage, max_batch=32, queue_size=queue_size
+        )
+        self.match: Stage[EmbeddedFace, Identification] = Stage(
+            "match",
+            match_stage,
+            max_batch=64,
+            queue_size=queue_size,
+            downstream=self.dispatch,
+            on_drop=_release_embedded,
+        )
+        self.embed: Stage[FaceTask, EmbeddedFace] = Stage(
+            "embed",
+            partial(embed_stage, executor),
+            max_batch=embed_batch_size,
+            queue_size=queue_size,
+            downstream=self.match,
+            on_drop=release_claim,
+        )
+        self.detect: Stage[FrameTask, FaceTask] = Stage(
+            "detect",
+            partial(detect_stage, executor),
+            max_batch=4,
+            queue_size=frame_queue_size,
+            policy="drop_oldest",
+            downstream=self.embed,
+        )
+        self.stages: list[Stage[Any, Any]] = [self.detect, self.embed, self.match, self.dispatch]
+        self._latency_seconds = 0.0
+        self._delivered = 0
+        self._lock = threading.Lock()
+        self.running = False
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            for stage in reversed(self.stages):
+                stage.start()
+            self.running = True
+
+    def stop(self) -> None:
+        with self._lock:
+            for stage in self.stages:
+                stage.stop()
+            self.running = False
+
+    def submit(self, frame: FrameTask) -> bool:
+        """Queue a frame for processing. Returns False if an older frame was dropped."""
+        return self.detect.put(frame)
+
+    def _dispatch_stage(self, items: list[Identification]) -> list[None]:
+        now = time.monotonic()
+        for item in items:
+            self._latency_seconds += now - item.frame.captured_at
+            self._delivered += 1
+            try:
+                item.frame.on_identified(item.result)
+            except Exception as e:
+                logger.error(
+                    "Identification handler failed for camera %s: %s", item.frame.camera_id, e
+                )
+        return []
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "stages": {stage.name: stage.stats.to_dict(len(stage.queue)) for stage in self.stages},
+            "identifications": self._delivered,
+            "avg_end_to_end_ms": (
+                1000 * self._latency_seconds / self._delivered if self._delivered else 0.0
+            ),
+        }
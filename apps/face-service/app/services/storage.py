@@ -1,13 +1,26 @@
 import json
 import logging
-import os
 import shutil
+import threading
+from collections.abc import Mapping
 from pathlib import Path
 
+import numpy as np
+
 from app.core.config import settings
+from app.services.embedding_store import EmbeddingStore
+from app.services.metrics import registry
 
 logger = logging.getLogger(__name__)
 
+LOAD_SECONDS = registry.histogram("storage_load_seconds", "Loading a company's embeddings")
+
+# Legacy JSON file of an employee whose id is "index", moved off the store index's name
+LEGACY_INDEX = "index.json.legacy"
+
+_stores: dict[Path, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
 
 def _encodings_dir() -> Path:
     return Path(settings.storage_path) / "encodings"
@@ -23,31 +36,66 @@ def ensure_directories() -> None:
     _photos_dir().mkdir(parents=True, exist_ok=True)
 
 
+def _store(company_id: str) -> EmbeddingStore:
+    directory = _encodings_dir() / company_id
+    with _stores_lock:
+        store = _stores.get(directory)
+        if store is None:
+            # A shared gallery maps the data file as is, so it must not keep tombstones
+            ratio = 0.0 if settings.shared_gallery else settings.store_compact_ratio
+            store = EmbeddingStore(directory, compact_ratio=ratio)
+            _stores[directory] = store
+        return store
+
+
 def save_encoding(company_id: str, employee_id: str, encodings: list[list[float]]) -> None:
-    """Save face encodings to JSON file."""
-    enc_dir = _encodings_dir() / company_id
-    enc_dir.mkdir(parents=True, exist_ok=True)
-    filepath = enc_dir / f"{employee_id}.json"
-    with open(filepath, "w") as f:
-        json.dump({"encodings": encodings}, f)
+    """Save face encodings to the company's embedding store."""
+    _store(company_id).put(employee_id, encodings)
     logger.info("Saved %d encodings for %s/%s", len(encodings), company_id, employee_id)
 
 
+def save_encodings(company_id: str, enrolled: Mapping[str, list[list[float]] | np.ndarray]) -> None:
+    """Save several employees' encodings in one commit."""
+    _store(company_id).put_many(enrolled)
+    logger.info("Saved encodings for %d employees in %s", len(enrolled), company_id)
+
+
+def encoding_fingerprints(company_id: str) -> tuple[int, dict[str, bytes]]:
+    """The store version with a digest of each employee's encodings, for
+    ``update_encodings``."""
+    return _store(company_id).fingerprints()
+
+
+def update_encodings(
+    company_id: str,
+    enrolled: Mapping[str, list[list[float]] | np.ndarray],
+    version: int,
+    fingerprints: dict[str, bytes],
+) -> list[str]:
+    """Save recomputed encodings in one commit, e.g. after re-embedding, except for
+    employees whose encodings changed since ``encoding_fingerprints``. Returns those."""
+    stale = _store(company_id).put_unchanged(enrolled, version, fingerprints)
+    logger.info(
+        "Updated encodings of %d employees in %s, %d changed meanwhile",
+        len(enrolled) - len(stale),
+        company_id,
+        len(stale),
+    )
+    return stale
+
+
 def load_encoding(company_id: str, employee_id: str) -> list[list[float]] | None:
-    """Load face encodings from JSON file. Returns None if not found."""
-    filepath = _encodings_dir() / company_id / f"{employee_id}.json"
-    if not filepath.exists():
+    """Load an employee's (L2-normalized) face encodings. Returns None if not found."""
+    rows = _store(company_id).get(employee_id)
+    if rows is None:
         return None
-    with open(filepath) as f:
-        data = json.load(f)
-    return data.get("encodings")
+    encodings: list[list[float]] = rows.tolist()
+    return encodings
 
 
 def delete_encoding(company_id: str, employee_id: str) -> None:
-    """Delete face encoding file."""
-    filepath = _encodings_dir() / company_id / f"{employee_id}.json"
-    if filepath.exists():
-        filepath.unlink()
+    """Delete an employee's face encodings."""
+    if _store(company_id).delete(employee_id):
         logger.info("Deleted encoding for %s/%s", company_id, employee_id)
 
 
@@ -70,26 +118,111 @@ def delete_photos(company_id: str, employee_id: str) -> None:
         logger.info("Deleted photos for %s/%s", company_id, employee_id)
 
 
+@LOAD_SECONDS.time()
+def load_company_embeddings(company_id: str) -> tuple[np.ndarray, list[str], list[int]]:
+    """Load all encodings for a company as one matrix, memory-mapped when possible.
+    Returns (matrix, employee_ids, counts) with each employee's rows contiguous."""
+    matrix, employee_ids, counts = _store(company_id).load()
+    logger.info("Loaded encodings for %d employees in company %s", len(employee_ids), company_id)
+    return matrix, employee_ids, counts
+
+
+def store_version(company_id: str) -> int:
+    """The commit counter of a company's store, bumped by every write from any process."""
+    return _store(company_id).version()
+
+
 def load_all_encodings(company_id: str) -> dict[str, list[list[float]]]:
     """Load all face encodings for a company. Returns dict of employee_id -> encodings."""
-    enc_dir = _encodings_dir() / company_id
-    if not enc_dir.exists():
-        return {}
+    matrix, employee_ids, counts = load_company_embeddings(company_id)
     result: dict[str, list[list[float]]] = {}
-    for filepath in enc_dir.glob("*.json"):
-        employee_id = filepath.stem
-        try:
-            with open(filepath) as f:
-                data = json.load(f)
-            encodings = data.get("encodings")
-            if encodings:
-                result[employee_id] = encodings
-        except Exception as e:
-            logger.warning("Failed to load encoding %s: %s", filepath, e)
-    logger.info("Loaded encodings for %d employees in company %s", len(result), company_id)
+    start = 0
+    for employee_id, count in zip(employee_ids, counts, strict=True):
+        result[employee_id] = matrix[start : start + count].tolist()
+        start += count
     return result
 
 
+def _read_legacy(filepath: Path) -> list[list[float]] | None:
+    """Encodings of a legacy JSON file, or None (after renaming it aside) if unreadable."""
+    try:
+        with open(filepath) as f:
+            return json.load(f).get("encodings") or []
+    except Exception as e:
+        logger.warning("Unreadable encoding file %s, renamed to *.unreadable: %s", filepath, e)
+        filepath.replace(filepath.with_name(filepath.name + ".unreadable"))
+        return None
+
+
+def _migrate_company(company_dir: Path, store: EmbeddingStore) -> int:
+    """Migrate one company's legacy files. Caller holds the store's exclusive lock."""
+    # The legacy file of an employee whose id is "index" has the store index's
+    # name; move it aside before the store reads or commits its index
+    legacy_index = company_dir / LEGACY_INDEX
+    index_file = company_dir / "index.json"
+    if index_file.exists() and not legacy_index.exists():
+        try:
+            is_legacy = "encodings" in json.loads(index_file.read_text())
+        except Exception:
+            is_legacy = False  # a damaged store index is left for the store to report
+        if is_legacy:
+            index_file.replace(legacy_index)
+    files = {f.stem: f for f in sorted(company_dir.glob("*.json")) if f != index_file}
+    if legacy_index.exists():
+        files["index"] = legacy_index
+    if not files:
+        return 0
+    enrolled: dict[str, list[list[float]]] = {}
+    committed: list[Path] = []
+    for employee_id, filepath in files.items():
+        encodings = _read_legacy(filepath)
+        if encodings is None:
+            continue
+        committed.append(filepath)
+        if encodings:
+            enrolled[employee_id] = encodings
+    # Employees already in the store were enrolled after a previous partial run
+    existing = store.read_index().employees
+    store.put_many({e: encs for e, encs in enrolled.items() if e not in existing})
+    for filepath in committed:
+        filepath.unlink(missing_ok=True)
+    logger.info("Migrated %d JSON encodings for company %s", len(enrolled), company_dir.name)
+    return len(enrolled)
+
+
+def migrate_json_encodings() -> int:
+    """One-shot migration of legacy ``encodings/<company>/<employee>.json`` files into
+    the binary store. A file is removed only once its encodings are committed;
+    unreadable ones are renamed aside. Returns the number of employees migrated."""
+    migrated = 0
+    if not _encodings_dir().exists():
+        return 0
+    for company_dir in sorted(p for p in _encodings_dir().iterdir() if p.is_dir()):
+        store = _store(company_dir.name)
+        # Every uvicorn worker runs the migration at startup; the first one to take
+        # the lock migrates the company and the others find nothing left to do
+        with store.exclusive():
+            migrated += _migrate_company(company_dir, store)
+    return migrated
+
+
+def list_photo_employees(company_id: str) -> list[str]:
+    """Employees of a company with stored photos."""
+    company_dir = _photos_dir() / company_id
+    if not company_dir.exists():
+        return []
+    return sorted(p.name for p in company_dir.iterdir() if p.is_dir())
+
+
+def load_photos(company_id: str, employee_id: str) -> list[bytes]:
+    """Read an employee's stored photos in the order they were saved."""
+    photo_dir = _photos_dir() / company_id / employee_id
+    if not photo_dir.exists():
+        return []
+    files = [f for f in photo_dir.iterdir() if f.suffix in (".jpg", ".jpeg", ".png")]
+    return [f.read_bytes() for f in sorted(files, key=lambda f: (len(f.stem), f.stem))]
+
+
 def get_photo_count(company_id: str, employee_id: str) -> int:
     """Count how many photos are stored for an employee."""
     photo_dir = _photos_dir() / company_id / employee_id
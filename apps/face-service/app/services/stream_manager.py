@@ -1,20 +1,28 @@
 import logging
 import threading
 import time
-
-import cv2
-import httpx
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
 
 from app.core.config import settings
-from app.services import face_engine, storage
+from app.services import face_engine
+from app.services.callbacks import CallbackDispatcher
+from app.services.capture import create_source, frames_per_grab
+from app.services.dedup import DedupStore, create_dedup_store, dedup_key, window_for
+from app.services.gallery import gallery_cache
+from app.services.inference import InferenceExecutor, inference_executor
+from app.services.metrics import MetricFamily, registry
+from app.services.motion import MotionGate
+from app.services.pipeline import FrameTask, StreamPipeline
+from app.services.tracker import FaceTracker
 
 logger = logging.getLogger(__name__)
 
-DEDUP_WINDOW_SECONDS = 300  # 5 minutes
-
 
 class StreamWorker:
-    """Background thread that processes an RTSP stream for face recognition."""
+    """Background thread that reads an RTSP stream and feeds sampled frames to the
+    shared recognition pipeline."""
 
     def __init__(
         self,
@@ -23,6 +31,9 @@ class StreamWorker:
         company_id: str,
         location_id: str,
         callback_url: str,
+        pipeline: StreamPipeline,
+        callbacks: CallbackDispatcher,
+        dedup: DedupStore,
         frame_interval: int = 30,
     ):
         self.camera_id = camera_id
@@ -30,10 +41,47 @@ class StreamWorker:
         self.company_id = company_id
         self.location_id = location_id
         self.callback_url = callback_url
-        self.frame_interval = frame_interval
+        # Intervals are given in stream frames; a keyframe-only source hands over
+        # one frame per GOP, so count them in grabbed frames instead
+        per_grab = frames_per_grab()
+        self.frame_interval = max(frame_interval // per_grab, 1)
+        self._pipeline = pipeline
+        self._callbacks = callbacks
+        self._dedup = dedup
+        self._dedup_window = window_for(location_id)
+        self._gate = (
+            MotionGate(
+                threshold=settings.motion_threshold,
+                # Never sample more slowly than requested while something is moving
+                active_interval=min(
+                    self.frame_interval, settings.motion_active_interval // per_grab
+                ),
+                idle_interval=settings.motion_idle_interval // per_grab,
+                hold_seconds=settings.motion_hold_seconds,
+            )
+            if settings.motion_gating
+            else None
+        )
+        self._tracker = (
+            FaceTracker(
+                iou_threshold=settings.track_iou_threshold,
+                max_age=settings.track_max_age_seconds,
+                max_embeddings=settings.track_max_embeddings,
+            )
+            if settings.face_tracking
+            else None
+        )
+        self.frames_read = 0
+        self.frames_decoded = 0
+        self.frames_gated = 0
+        self.frames_submitted = 0
+        self.identifications = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.reconnects = 0
+        self.gallery_version = 0
         self._stop_event = threading.Event()
         self._thread: threading.Thread | None = None
-        self._last_seen: dict[str, float] = {}  # employee_id -> timestamp
 
     def start(self) -> None:
         self._thread = threading.Thread(target=self._run, daemon=True)
@@ -49,26 +97,27 @@ class StreamWorker:
         return self._thread is not None and self._thread.is_alive()
 
     def _is_dedup(self, employee_id: str) -> bool:
-        now = time.time()
-        last = self._last_seen.get(employee_id)
-        if last and (now - last) < DEDUP_WINDOW_SECONDS:
-            return True
-        self._last_seen[employee_id] = now
-        return False
+        key = dedup_key(self.company_id, self.location_id, employee_id)
+        return self._dedup.check_and_set(key, self._dedup_window)
 
     def _run(self) -> None:
         logger.info("Starting stream worker for camera %s", self.camera_id)
-        enrolled = storage.load_all_encodings(self.company_id)
-        if not enrolled:
-            logger.warning("No enrolled faces for company %s", self.company_id)
-            return
+        if not gallery_cache.get(self.company_id):
+            # Keep streaming: the first enrollment is picked up without a restart
+            logger.warning("No enrolled faces for company %s yet", self.company_id)
 
         reconnect_attempts = 0
         max_reconnects = 5
+        first_attempt = True
 
         while not self._stop_event.is_set() and reconnect_attempts < max_reconnects:
-            cap = cv2.VideoCapture(self.rtsp_url)
-            if not cap.isOpened():
+            if not first_attempt:
+                self.reconnects += 1
+            first_attempt = False
+            source = create_source(self.rtsp_url)
+            if not source.open():
+                source.close()
+                self.errors += 1
                 reconnect_attempts += 1
                 logger.warning(
                     "Failed to open RTSP stream %s (attempt %d/%d)",
@@ -83,33 +132,85 @@ class StreamWorker:
             frame_count = 0
 
             while not self._stop_event.is_set():
-                ret, frame = cap.read()
-                if not ret:
+                if not source.grab():
+                    self.errors += 1
                     logger.warning("Failed to read frame from %s, reconnecting...", self.rtsp_url)
                     break
 
+                self.frames_read += 1
                 frame_count += 1
-                if frame_count % self.frame_interval != 0:
+                # Frames nobody looks at are grabbed but never converted or copied
+                if not self._wants_frame(frame_count):
+                    self.frames_gated += 1
+                    continue
+                # The company's current gallery, so enrollments and deletions apply
+                # from the next frame on; cameras of a company share one gallery
+                gallery = gallery_cache.get(self.company_id)
+                self.gallery_version = gallery.version
+                if not gallery:
+                    self.frames_gated += 1
+                    continue
+                frame = source.retrieve()
+                if frame is None:
+                    self.errors += 1
+                    continue
+                self.frames_decoded += 1
+                if self._gate is not None and not self._gate.examine(frame):
+                    self.frames_gated += 1
                     continue
 
-                try:
-                    _, buffer = cv2.imencode(".jpg", frame)
-                    image_bytes = buffer.tobytes()
-                    result = face_engine.identify_face(image_bytes, enrolled)
-
-                    if result["identified"] and result["employee_id"]:
-                        if not self._is_dedup(result["employee_id"]):
-                            self._send_callback(result)
-                except Exception as e:
-                    logger.error("Error processing frame: %s", e)
+                # Detection and embedding run on the pipeline threads so a slow model
+                # call never stalls capture
+                self._pipeline.submit(
+                    FrameTask(
+                        camera_id=self.camera_id,
+                        company_id=self.company_id,
+                        image=face_engine.frame_to_image(frame),
+                        gallery=gallery,
+                        on_identified=self._on_identified,
+                        tracker=self._tracker,
+                    )
+                )
+                self.frames_submitted += 1
 
-            cap.release()
+            source.close()
 
         logger.info("Stream worker stopped for camera %s", self.camera_id)
 
+    def _wants_frame(self, frame_count: int) -> bool:
+        if self._gate is None:
+            return frame_count % self.frame_interval == 0
+        return self._gate.tick()
+
+    def _on_identified(self, result: dict[str, Any]) -> None:
+        # Runs on the pipeline's dispatch thread
+        self.identifications += 1
+        if self._is_dedup(result["employee_id"]):
+            self.duplicates += 1
+        else:
+            self._send_callback(result)
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "camera_id": self.camera_id,
+            "running": self.is_running,
+            "frames_read": self.frames_read,
+            "frames_decoded": self.frames_decoded,
+            "frames_gated": self.frames_gated,
+            "frames_submitted": self.frames_submitted,
+            "identifications": self.identifications,
+            "duplicates": self.duplicates,
+            "errors": self.errors,
+            "reconnects": self.reconnects,
+            "gallery_version": self.gallery_version,
+            "motion": self._gate.stats() if self._gate else None,
+            "tracking": self._tracker.stats() if self._tracker else None,
+        }
+
     def _send_callback(self, result: dict) -> None:
-        try:
-            payload = {
+        self._callbacks.send(
+            self.callback_url,
+            {
                 "employee_id": result["employee_id"],
                 "camera_id": self.camera_id,
                 "company_id": self.company_id,
@@ -117,20 +218,38 @@ class StreamWorker:
                 "confidence": result["confidence"],
                 "type": "check_in",
                 "source": "rtsp",
-            }
-            headers = {}
-            if settings.internal_api_secret:
-                headers["x-api-secret"] = settings.internal_api_secret
-            httpx.post(self.callback_url, json=payload, headers=headers, timeout=10)
-        except Exception as e:
-            logger.error("Failed to send callback: %s", e)
+                # Delivery can be delayed by retries or the spool
+                "captured_at": datetime.now(UTC).isoformat(),
+            },
+        )
 
 
 class StreamManager:
-    """Singleton managing all active RTSP stream workers."""
+    """Singleton managing all active RTSP stream workers, the recognition pipeline,
+    callback dispatcher and dedup store they share, and the inference executor
+    behind the pipeline (also used by HTTP routes)."""
 
-    def __init__(self) -> None:
+    def __init__(self, inference: InferenceExecutor) -> None:
         self._workers: dict[str, StreamWorker] = {}
+        self.inference = inference
+        self.pipeline = StreamPipeline(
+            inference,
+            frame_queue_size=settings.pipeline_frame_queue_size,
+            embed_batch_size=settings.pipeline_embed_batch_size,
+        )
+        self.callbacks = CallbackDispatcher(
+            Path(settings.storage_path) / "callback-spool",
+            secret=settings.internal_api_secret,
+            batch_url=settings.callback_batch_url,
+            batch_size=settings.callback_batch_size,
+            max_queue=settings.callback_max_queue,
+            max_retries=settings.callback_max_retries,
+            backoff=settings.callback_backoff_seconds,
+            backoff_max=settings.callback_backoff_max_seconds,
+            timeout=settings.callback_timeout_seconds,
+            spool_max_bytes=settings.callback_spool_max_bytes,
+        )
+        self.dedup = create_dedup_store()
 
     def start_stream(
         self,
@@ -150,8 +269,13 @@ class StreamManager:
             company_id=company_id,
             location_id=location_id,
             callback_url=callback_url,
+            pipeline=self.pipeline,
+            callbacks=self.callbacks,
+            dedup=self.dedup,
             frame_interval=frame_interval,
         )
+        self.pipeline.start()
+        self.callbacks.start()
         worker.start()
         self._workers[camera_id] = worker
         return True
@@ -166,13 +290,78 @@ class StreamManager:
     def stop_all(self) -> None:
         for camera_id in list(self._workers.keys()):
             self.stop_stream(camera_id)
+        self.pipeline.stop()
+        # After the pipeline, so the last identifications are queued or spooled
+        self.callbacks.stop()
+        self.inference.stop()
 
     def get_status(self) -> list[dict]:
-        return [
-            {"camera_id": cid, "running": w.is_running}
-            for cid, w in self._workers.items()
+        return [w.status() for w in self._workers.values()]
+
+    def get_pipeline_stats(self) -> dict[str, Any]:
+        return {
+            **self.pipeline.stats(),
+            "inference": self.inference.stats(),
+            "callbacks": self.callbacks.stats(),
+        }
+
+    def collect_metrics(self) -> list[MetricFamily]:
+        """Per-camera counters and queue depths for ``/metrics``."""
+        workers = list(self._workers.values())
+        families = [
+            MetricFamily(
+                f"face_stream_{name}_total",
+                "counter",
+                help,
+                [({"camera_id": w.camera_id}, getattr(w, attr)) for w in workers],
+            )
+            for name, attr, help in (
+                ("frames_read", "frames_read", "Frames grabbed from the camera"),
+                ("frames_decoded", "frames_decoded", "Frames decoded for motion or inference"),
+                ("frames_sampled", "frames_submitted", "Frames sent to the recognition pipeline"),
+                ("identified", "identifications", "Faces identified"),
+                ("deduped", "duplicates", "Identifications suppressed as duplicate check-ins"),
+                ("errors", "errors", "Failed stream opens, reads and decodes"),
+                ("reconnects", "reconnects", "Attempts to reopen the stream"),
+            )
+        ]
+        inference = self.inference.stats()
+        callbacks = self.callbacks.stats()
+        families += [
+            MetricFamily(
+                "face_inference_queue_depth",
+                "gauge",
+                "Inference jobs waiting for the pool",
+                [({}, inference["pending"])],
+            ),
+            MetricFamily(
+                "face_inference_in_flight",
+                "gauge",
+                "Inference jobs running on the pool",
+                [({}, inference["in_flight"])],
+            ),
+            MetricFamily(
+                "face_pipeline_queue_depth",
+                "gauge",
+                "Items waiting for each stream pipeline stage",
+                [({"stage": s.name}, len(s.queue)) for s in self.pipeline.stages],
+            ),
+            MetricFamily(
+                "callback_queue_depth",
+                "gauge",
+                "Callbacks waiting for delivery, retries included",
+                [({}, callbacks["queue_depth"] + callbacks["retry_pending"])],
+            ),
+            MetricFamily(
+                "callback_spool_bytes",
+                "gauge",
+                "Size of the on-disk callback spool",
+                [({}, callbacks["spool_bytes"])],
+            ),
         ]
+        return families
 
 
 # Singleton instance
-stream_manager = StreamManager()
+stream_manager = StreamManager(inference_executor)
+registry.collector(stream_manager.collect_metrics)
@@ -0,0 +1,163 @@
+"""Per-camera face tracking across sampled frames.
+
+Detections are associated with existing tracks by box overlap (IoU), falling
+back to centroid distance for fast movers. The pipeline embeds each track at
+most ``max_embeddings`` times, matches the fused (mean) embedding, and stops
+embedding a track once it has been identified.
+"""
+
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from app.services.embedding_store import normalize
+
+Box = tuple[int, int, int, int]  # x, y, w, h
+
+
+def box_of(detection: dict[str, Any]) -> Box:
+    area = detection.get("facial_area") or {}
+    return (area.get("x", 0), area.get("y", 0), area.get("w", 0), area.get("h", 0))
+
+
+def iou(a: Box, b: Box) -> float:
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _centroid_close(a: Box, b: Box) -> bool:
+    dx = (a[0] + a[2] / 2) - (b[0] + b[2] / 2)
+    dy = (a[1] + a[3] / 2) - (b[1] + b[3] / 2)
+    reach = 0.75 * max(a[2], a[3], b[2], b[3])
+    return dx * dx + dy * dy < reach * reach
+
+
+@dataclass(eq=False)
+class Track:
+    track_id: int
+    box: Box
+    last_seen: float
+    hits: int = 1
+    embeddings: list[np.ndarray] = field(default_factory=list)
+    pending: int = 0  # crops handed to the embed stage and not yet fused
+    employee_id: str | None = None
+    confidence: float = 0.0
+
+    @property
+    def resolved(self) -> bool:
+        return self.employee_id is not None
+
+
+class FaceTracker:
+    """Associates one camera's detections across frames. Safe to share between
+    the detect and match stage threads."""
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.3,
+        max_age: float = 2.0,
+        max_embeddings: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.max_embeddings = max_embeddings
+        self._clock = clock
+        self._tracks: list[Track] = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.tracks_created = 0
+        self.embeds_requested = 0
+        self.embeds_skipped = 0
+        self.resolved = 0
+
+    def update(self, boxes: list[Box], now: float | None = None) -> list[Track]:
+        """Assign each box to a track (new or existing), in input order."""
+        now = self._clock() if now is None else now
+        with self._lock:
+            self._tracks = [t for t in self._tracks if now - t.last_seen <= self.max_age]
+            pairs = sorted(
+                (
+                    (iou(track.box, box), ti, bi)
+                    for ti, track in enumerate(self._tracks)
+                    for bi, box in enumerate(boxes)
+                ),
+                reverse=True,
+            )
+            assigned: dict[int, Track] = {}
+            taken: set[int] = set()
+            for overlap, ti, bi in pairs:
+                if overlap < self.iou_threshold:
+                    break
+                if ti not in taken and bi not in assigned:
+                    assigned[bi] = self._tracks[ti]
+                    taken.add(ti)
+            for bi, box in enumerate(boxes):
+                if bi in assigned:
+                    continue
+                for ti, track in enumerate(self._tracks):
+                    if ti not in taken and _centroid_close(track.box, box):
+                        assigned[bi] = track
+                        taken.add(ti)
+                        break
+            for bi, box in enumerate(boxes):
+                if bi not in assigned:
+                    assigned[bi] = Track(self._next_id, box, now, hits=0)
+                    self._next_id += 1
+                    self._tracks.append(assigned[bi])
+                    self.tracks_created += 1
+                track = assigned[bi]
+                track.box = box
+                track.last_seen = now
+                track.hits += 1
+            return [assigned[bi] for bi in range(len(boxes))]
+
+    def claim(self, track: Track) -> bool:
+        """Reserve an embedding for the track; False if it is resolved or has had enough."""
+        with self._lock:
+            if track.resolved or len(track.embeddings) + track.pending >= self.max_embeddings:
+                self.embeds_skipped += 1
+                return False
+            track.pending += 1
+            self.embeds_requested += 1
+            return True
+
+    def unclaim(self, track: Track) -> None:
+        """Give back a claimed embedding that will never be added, e.g. because its
+        model call failed or its crop was dropped from a full queue."""
+        with self._lock:
+            track.pending = max(track.pending - 1, 0)
+
+    def add_embedding(self, track: Track, embedding: np.ndarray) -> np.ndarray:
+        """Record a claimed embedding and return the track's fused unit embedding."""
+        with self._lock:
+            track.pending = max(track.pending - 1, 0)
+            track.embeddings.append(normalize(embedding))
+            return normalize(np.mean(track.embeddings, axis=0))
+
+    def resolve(self, track: Track, employee_id: str, confidence: float) -> bool:
+        """Mark the track identified. Returns False if it already was."""
+        with self._lock:
+            if track.resolved:
+                return False
+            track.employee_id = employee_id
+            track.confidence = confidence
+            self.resolved += 1
+            return True
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "active_tracks": len(self._tracks),
+                "tracks_created": self.tracks_created,
+                "tracks_resolved": self.resolved,
+                "embeds_requested": self.embeds_requested,
+                "embeds_skipped": self.embeds_skipped,
+            }
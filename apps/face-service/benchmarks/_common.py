@@ -0,0 +1,162 @@
+"""Shared helpers for the offline benchmarks in this package.
+
+Benchmarks are plain scripts run from ``apps/face-service``::
+
+    uv run python -m benchmarks.bench_matcher --json results.json
+"""
+
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+EMBEDDING_DIM = 512
+
+
+def synthetic_enrollments(
+    n_embeddings: int, per_employee: int = 5, dim: int = EMBEDDING_DIM, seed: int = 0
+) -> dict[str, list[np.ndarray]]:
+    """Random embeddings grouped into employees of ``per_employee`` samples each.
+
+    Each employee's samples are jittered copies of one identity vector, which is
+    roughly how real face embeddings of the same person cluster.
+    """
+    rng = np.random.default_rng(seed)
+    n_employees = -(-n_embeddings // per_employee)
+    identities = rng.normal(size=(n_employees, dim)).astype(np.float32)
+    rows = np.repeat(identities, per_employee, axis=0)[:n_embeddings]
+    rows += rng.normal(scale=0.5, size=rows.shape).astype(np.float32)
+    return {
+        f"emp-{i // per_employee:06d}": list(rows[i : i + per_employee])
+        for i in range(0, n_embeddings, per_employee)
+    }
+
+
+def noisy_probes(
+    enrolled: dict[str, list[np.ndarray]], count: int, noise: float = 0.3, seed: int = 1
+) -> tuple[np.ndarray, list[str]]:
+    """Perturbed copies of enrolled samples, with the employee each one came from."""
+    rng = np.random.default_rng(seed)
+    employee_ids = list(enrolled)
+    truth = [employee_ids[i] for i in rng.integers(0, len(employee_ids), size=count)]
+    probes = np.stack(
+        [enrolled[e][0] + rng.normal(scale=noise, size=enrolled[e][0].shape) for e in truth]
+    )
+    return probes.astype(np.float32), truth
+
+
+def synthetic_jpeg(width: int, height: int, quality: int = 90, seed: int = 0) -> bytes:
+    """A JPEG with smooth gradients and some noise, which compresses like a photo."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // max(width, 1), y * 255 // max(height, 1), (x + y) % 256], axis=-1)
+    noisy = base + rng.normal(scale=12, size=base.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(noisy.clip(0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def install_stub_model(model_ms: float, embedding: np.ndarray, faces: int = 1) -> None:
+    """Replace detection and embedding with fixed-cost stubs that find ``faces`` faces
+    and embed each as ``embedding``. Decoding and matching stay real. The image
+    cache is turned off, since benchmarks send the same photos over and over."""
+    from app.services import face_engine
+    from app.services.image_cache import image_cache
+
+    image_cache.max_bytes = 0
+
+    crop = np.zeros((160, 160, 3), dtype=np.float32)
+
+    def detect_faces(img: np.ndarray) -> list[dict]:
+        time.sleep(model_ms / 2000)  # releases the GIL, as the model's kernels do
+        return [
+            {
+                "face": crop,
+                "facial_area": {"x": 10 + 100 * i, "y": 10, "w": 80, "h": 80},
+                "confidence": 0.99,
+            }
+            for i in range(faces)
+        ]
+
+    def embed_faces(crops: list[np.ndarray], model: str | None = None) -> np.ndarray:
+        time.sleep(model_ms / 2000)
+        return np.tile(embedding.astype(np.float32), (len(crops), 1))
+
+    face_engine.detect_faces = detect_faces  # type: ignore[assignment]
+    face_engine.embed_faces = embed_faces  # type: ignore[assignment]
+
+
+def measure(
+    fn: Callable[[], Any],
+    repeat: int = 5,
+    warmup: int = 1,
+    setup: Callable[[], Any] | None = None,
+) -> dict[str, float]:
+    """Wall-clock timings of ``fn`` in milliseconds; ``setup`` runs untimed before each."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+    }
+
+
+def parser(description: str) -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument("--json", type=Path, help="write results to this file as JSON")
+    return p
+
+
+def emit(name: str, results: list[dict[str, Any]], path: Path | None) -> None:
+    """Print results as a table and optionally write them as JSON."""
+    if results:
+        columns = list(results[0])
+        print(" | ".join(columns))
+        for row in results:
+            print(" | ".join(_fmt(row.get(c)) for c in columns))
+    if path is not None:
+        payload = {
+            "benchmark": name,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "numpy": np.__version__,
+            "revision": _revision(),
+            "results": results,
+        }
+        path.write_text(json.dumps(payload, indent=2))
+        print(f"Wrote {path}")
+
+
+def _fmt(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def _revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
@@ -0,0 +1,69 @@
+"""Recall vs latency of the IVF index against exact gallery search.
+
+For each gallery size, sweeps ``nprobe`` and reports top-1 recall (how often
+the approximate search returns the same employee as the exact scan), the
+median latency per probe and the index build time. Use it to pick
+``IVF_NPROBE`` / ``IVF_MIN_ROWS`` for a tenant size.
+"""
+
+import time
+
+from app.core.config import settings
+from app.services import matcher
+from app.services.gallery import Gallery
+from benchmarks._common import emit, measure, noisy_probes, parser, synthetic_enrollments
+
+SIZES = [10_000, 50_000, 250_000]
+NPROBES = [1, 2, 4, 8, 16, 32]
+
+
+def run(sizes: list[int], nprobes: list[int], n_probes: int) -> list[dict]:
+    results = []
+    settings.ivf_min_rows = 0
+    for size in sizes:
+        enrolled = synthetic_enrollments(size)
+        probes, _ = noisy_probes(enrolled, n_probes, noise=0.8)
+
+        settings.match_index = "exact"
+        exact_gallery = Gallery.from_encodings("bench", enrolled)
+        exact = [m[0].employee_id for m in matcher.match(exact_gallery, probes)]
+        exact_ms = measure(lambda: matcher.match(exact_gallery, probes[:1]), repeat=10)
+
+        settings.match_index = "ivf"
+        start = time.perf_counter()
+        ivf_gallery = Gallery.from_encodings("bench", enrolled)
+        build_s = time.perf_counter() - start
+        index = ivf_gallery.snapshot().ivf
+        assert index is not None
+
+        for nprobe in nprobes:
+            settings.ivf_nprobe = nprobe
+            approx = [m[0].employee_id if m else None for m in matcher.match(ivf_gallery, probes)]
+            recall = sum(a == e for a, e in zip(approx, exact, strict=True)) / len(exact)
+            ivf_ms = measure(lambda: matcher.match(ivf_gallery, probes[:1]), repeat=10)
+            results.append(
+                {
+                    "embeddings": size,
+                    "nlist": index.nlist,
+                    "nprobe": nprobe,
+                    "recall_at_1": recall,
+                    "exact_ms": exact_ms["median_ms"],
+                    "ivf_ms": ivf_ms["median_ms"],
+                    "speedup": exact_ms["median_ms"] / ivf_ms["median_ms"],
+                    "build_s": build_s,
+                }
+            )
+    return results
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    p.add_argument("--nprobe", type=int, nargs="+", default=NPROBES)
+    p.add_argument("--probes", type=int, default=200)
+    args = p.parse_args()
+    emit("ann", run(args.sizes, args.nprobe, args.probes), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Throughput and memory of the face detector and embedder backends.
+
+Each backend runs in its own subprocess so its peak RSS (``rss_mb``, which
+includes the Python runtime and, for DeepFace, TensorFlow) is not shared with
+the others. Embedders embed ``--batch`` random face crops per call and
+``per_s`` is faces per second; detectors run on ``--image`` (default: a
+random 1280x720 frame, the cost of a frame without faces) and ``per_s`` is
+frames per second. Backends whose weights cannot be loaded are reported
+with their error instead of numbers.
+"""
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks._common import emit, measure, parser
+
+ROOT = Path(__file__).resolve().parents[1]
+
+EMBEDDERS = [
+    ("Facenet512", "fp32"),
+    ("Facenet512-onnx", "fp32"),
+    ("Facenet512-onnx", "fp16"),
+    ("Facenet512-onnx", "int8"),
+]
+DETECTORS = ["ssd", "yunet", "cv2-ssd", "cv2-yunet"]
+
+
+def _rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_embedder(name: str, precision: str, batch: int, repeat: int) -> dict:
+    from app.services.face_backends import create_embedder
+
+    embedder = create_embedder(name, precision)  # type: ignore[arg-type]
+    start = time.perf_counter()
+    embedder.load()
+    load_s = time.perf_counter() - start
+    rng = np.random.default_rng(0)
+    faces = [rng.random((150, 130, 3)).astype(np.float32) for _ in range(batch)]
+    timing = measure(lambda: embedder.embed(faces), repeat=repeat)
+    return {
+        "load_s": load_s,
+        "call_ms": timing["median_ms"],
+        "per_s": batch * 1000 / timing["median_ms"],
+        "rss_mb": _rss_mb(),
+    }
+
+
+def run_detector(name: str, image: str | None, repeat: int) -> dict:
+    from app.services.face_backends import create_detector
+    from app.services.face_engine import _load_image
+
+    detector = create_detector(name)
+    start = time.perf_counter()
+    detector.load()
+    load_s = time.perf_counter() - start
+    if image:
+        img = _load_image(Path(image).read_bytes())
+    else:
+        img = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    timing = measure(lambda: detector.detect(img), repeat=repeat)
+    return {
+        "load_s": load_s,
+        "call_ms": timing["median_ms"],
+        "per_s": 1000 / timing["median_ms"],
+        "rss_mb": _rss_mb(),
+    }
+
+
+def in_subprocess(args: list[str]) -> dict:
+    row: dict = {"load_s": None, "call_ms": None, "per_s": None, "rss_mb": None, "error": None}
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_backends", "--worker", *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        error = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        return {**row, "error": error[:120]}
+    return {**row, **json.loads(lines[-1])}
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--batch", type=int, default=16)
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--image", help="image to run the detectors on")
+    p.add_argument("--worker", nargs="+", help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.worker:
+        kind, name, *rest = args.worker
+        if kind == "embedder":
+            result = run_embedder(name, rest[0], args.batch, args.repeat)
+        else:
+            result = run_detector(name, args.image, args.repeat)
+        print(json.dumps(result))
+        return
+
+    common = ["--batch", str(args.batch), "--repeat", str(args.repeat)]
+    if args.image:
+        common += ["--image", args.image]
+    results = [
+        {"backend": f"{name}/{precision}", **in_subprocess(["embedder", name, precision, *common])}
+        for name, precision in EMBEDDERS
+    ]
+    results += [
+        {"backend": name, **in_subprocess(["detector", name, *common])} for name in DETECTORS
+    ]
+    emit("backends", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
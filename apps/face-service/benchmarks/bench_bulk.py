@@ -0,0 +1,92 @@
+"""Bulk enrollment throughput against one enrollment request per employee.
+
+Builds a zip archive of ``--employees`` employees with ``--photos`` synthetic
+640x480 JPEGs each and enrolls them through a real ``BulkJobManager`` and
+inference executor, with detection and embedding replaced by a fixed-cost stub
+(``--model-ms`` per call). ``sequential`` enrolls the same employees one after
+another, the way a client calling ``POST /api/v1/enroll`` per employee does.
+Reports employees per second for each bulk chunk size.
+"""
+
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+from app.services import face_engine, storage
+from app.services.bulk_jobs import BulkJobManager
+from app.services.inference import InferenceExecutor
+from benchmarks._common import emit, install_stub_model, parser, synthetic_jpeg
+
+
+def build_archive(path: Path, employees: int, photos: int) -> None:
+    images = [synthetic_jpeg(640, 480, seed=i) for i in range(photos)]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        for e in range(employees):
+            for i, data in enumerate(images):
+                archive.writestr(f"emp-{e:06d}/{i}.jpg", data)
+
+
+def run_bulk(archive: Path, batch_size: int, workers: int, timeout: float) -> float:
+    executor = InferenceExecutor(workers=workers, max_in_flight=workers * 2)
+    manager = BulkJobManager(executor, batch_size=batch_size)
+    copy = archive.with_suffix(".job.zip")
+    copy.write_bytes(archive.read_bytes())
+    start = time.perf_counter()
+    job = manager.submit_enroll("bench", copy)
+    while not job.finished and time.perf_counter() - start < timeout:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    manager.stop()
+    executor.stop()
+    return job.enrolled / elapsed
+
+
+def run_sequential(archive: Path, employees: int) -> float:
+    with zipfile.ZipFile(archive) as zf:
+        names = zf.namelist()
+        start = time.perf_counter()
+        for e in range(employees):
+            prefix = f"emp-{e:06d}/"
+            images = [zf.read(n) for n in names if n.startswith(prefix)]
+            analyses = face_engine.analyze_faces(images)
+            storage.save_encoding("seq", prefix[:-1], [a["embedding"] for a in analyses])
+            for i, data in enumerate(images):
+                storage.save_photo("seq", prefix[:-1], data, i)
+        return employees / (time.perf_counter() - start)
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--employees", type=int, default=500)
+    p.add_argument("--photos", type=int, default=3)
+    p.add_argument("--model-ms", type=float, default=20.0)
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    p.add_argument("--timeout", type=float, default=600.0)
+    args = p.parse_args()
+
+    install_stub_model(args.model_ms, np.ones(512, dtype=np.float32))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_path = tmp
+        archive = Path(tmp) / "staff.zip"
+        build_archive(archive, args.employees, args.photos)
+        results.append(
+            {
+                "mode": "sequential",
+                "batch_size": 1,
+                "employees_per_s": run_sequential(archive, args.employees),
+            }
+        )
+        for batch_size in args.batch_sizes:
+            rate = run_bulk(archive, batch_size, args.workers, args.timeout)
+            results.append({"mode": "bulk", "batch_size": batch_size, "employees_per_s": rate})
+    emit("bulk", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
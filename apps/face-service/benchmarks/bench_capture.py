@@ -0,0 +1,129 @@
+"""CPU cost per camera of the frame capture strategies.
+
+Plays a video file (by default a synthetic 1080p/25fps clip written with
+OpenCV) through each capture mode as fast as possible. Only every
+``--interval``-th frame is looked at, as a stream worker does. Reports CPU
+seconds per second of video as ``cpu_pct`` (100 = one core per camera), which
+includes any ffmpeg subprocess, plus how many times faster than real time the
+mode ran.
+
+Modes: ``read_all`` is the old worker (``cap.read()`` every frame);
+``grab`` grabs every frame and retrieves only the sampled ones; ``grab_scaled``
+also downscales them to ``--width``; ``ffmpeg`` / ``ffmpeg_keyframes`` use the
+subprocess pipe when ffmpeg is installed. Pass ``--video`` with a real camera
+recording (ideally H.264) for representative numbers.
+"""
+
+import resource
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from app.services.capture import FFmpegSource, FrameSource, OpenCVSource
+from benchmarks._common import emit, parser
+
+FPS = 25
+
+
+def synthetic_video(path: Path, seconds: int, size: tuple[int, int] = (1920, 1080)) -> Path:
+    """Noisy background with a moving block, so the encoder has real work to do."""
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), FPS, size)
+    for i in range(seconds * FPS):
+        frame = background.copy()
+        x = (i * 17) % (size[0] - 200)
+        frame[400:600, x : x + 200] = 255
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+class _ReadAll:
+    """The pre-capture-layer behaviour: full decode and conversion of every frame."""
+
+    def __init__(self, url: str) -> None:
+        self._cap = cv2.VideoCapture(url)
+        self._frame: np.ndarray | None = None
+
+    def open(self) -> bool:
+        return self._cap.isOpened()
+
+    def grab(self) -> bool:
+        ok, self._frame = self._cap.read()
+        return ok
+
+    def retrieve(self) -> np.ndarray | None:
+        return self._frame
+
+    def close(self) -> None:
+        self._cap.release()
+
+
+def _cpu_seconds() -> float:
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def play(source: FrameSource, interval: int) -> tuple[int, float, float]:
+    """Returns (frames, cpu_seconds, wall_seconds)."""
+    cpu, wall = _cpu_seconds(), time.perf_counter()
+    assert source.open(), "could not open video"
+    frames = 0
+    try:
+        while source.grab():
+            frames += 1
+            if frames % interval == 0:
+                source.retrieve()
+    finally:
+        source.close()
+    return frames, _cpu_seconds() - cpu, time.perf_counter() - wall
+
+
+def modes(video: str, width: int) -> dict[str, Callable[[], FrameSource]]:
+    found: dict[str, Callable[[], FrameSource]] = {
+        "read_all": lambda: _ReadAll(video),
+        "grab": lambda: OpenCVSource(video),
+        "grab_scaled": lambda: OpenCVSource(video, width=width),
+    }
+    if FFmpegSource.available():
+        found["ffmpeg"] = lambda: FFmpegSource(video, width=width)
+        found["ffmpeg_keyframes"] = lambda: FFmpegSource(video, width=width, keyframes_only=True)
+    return found
+
+
+def run(video: str, interval: int, width: int) -> list[dict]:
+    results = []
+    for name, make in modes(video, width).items():
+        frames, cpu_s, wall_s = play(make(), interval)
+        video_s = frames / FPS
+        results.append(
+            {
+                "mode": name,
+                "frames": frames,
+                "cpu_s": cpu_s,
+                "cpu_pct": 100 * cpu_s / video_s if video_s else 0.0,
+                "realtime_x": video_s / wall_s if wall_s else 0.0,
+            }
+        )
+    return results
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--video", help="video file or stream URL (default: synthetic 1080p clip)")
+    p.add_argument("--seconds", type=int, default=10, help="length of the synthetic clip")
+    p.add_argument("--interval", type=int, default=30)
+    p.add_argument("--width", type=int, default=640)
+    args = p.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video or str(synthetic_video(Path(tmp) / "1080p.mp4", args.seconds))
+        emit("capture", run(video, args.interval, args.width), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Image decode cost of ``face_engine._load_image`` by JPEG size.
+
+Decodes synthetic photo-like JPEGs from VGA up to a 12 MP phone picture and
+reports milliseconds per image and megapixels (of the JPEG) per second, both
+downscaled to ``--max-side`` as uploads are and at full resolution
+(``full_ms``) for comparison.
+"""
+
+from app.core.config import settings
+from app.services import images
+from app.services.face_engine import _load_image
+from benchmarks._common import emit, measure, parser, synthetic_jpeg
+
+SIZES = [(320, 240), (640, 480), (1280, 720), (1920, 1080), (4032, 3024)]
+
+
+def run(sizes: list[tuple[int, int]], quality: int, repeat: int) -> list[dict]:
+    results = []
+    for width, height in sizes:
+        data = synthetic_jpeg(width, height, quality)
+        timing = measure(lambda data=data: _load_image(data), repeat=repeat)
+        full = measure(lambda data=data: images.decode(data, max_side=0), repeat=repeat)
+        results.append(
+            {
+                "size": f"{width}x{height}",
+                "jpeg_kb": len(data) / 1024,
+                "decode_ms": timing["median_ms"],
+                "mp_per_s": width * height / 1e6 / (timing["median_ms"] / 1000),
+                "full_ms": full["median_ms"],
+            }
+        )
+    return results
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--quality", type=int, default=90)
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--max-side", type=int, default=settings.image_max_side)
+    args = p.parse_args()
+    settings.image_max_side = args.max_side
+    emit("decode", run(SIZES, args.quality, args.repeat), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""End-to-end ``POST /api/v1/attendance/identify`` through the ASGI app.
+
+Requests go in-process through ``httpx.ASGITransport`` (no sockets), so the
+numbers cover multipart parsing, JPEG decoding, the inference executor,
+gallery lookup and matching. Detection and embedding are a fixed-cost stub
+(``--model-ms``) returning the embedding of an enrolled employee. Reports
+p50/p99 latency and throughput per concurrency level, and whether every
+request identified the expected employee.
+"""
+
+import asyncio
+import logging
+import statistics
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.main import app
+from app.services import storage
+from app.services.gallery import gallery_cache
+from app.services.inference import inference_executor
+from benchmarks._common import (
+    emit,
+    install_stub_model,
+    parser,
+    synthetic_enrollments,
+    synthetic_jpeg,
+)
+
+COMPANY_ID = "bench"
+
+
+async def _drive(concurrency: int, requests_per_client: int, image: bytes, expected: str) -> dict:
+    latencies: list[float] = []
+    correct = 0
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal correct
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/v1/attendance/identify",
+                data={"company_id": COMPANY_ID},
+                files={"image": ("probe.jpg", image, "image/jpeg")},
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            correct += response.json().get("employee_id") == expected
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as c:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(c) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "correct": correct,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "throughput_rps": len(latencies) / elapsed,
+    }
+
+
+def run(
+    concurrency_levels: list[int], requests_per_client: int, model_ms: float, embeddings: int
+) -> list[dict]:
+    enrolled = synthetic_enrollments(embeddings)
+    storage._store(COMPANY_ID).put_many(enrolled)
+    expected, rows = next(iter(enrolled.items()))
+    install_stub_model(model_ms, rows[0])
+    gallery_cache.get(COMPANY_ID)
+    image = synthetic_jpeg(640, 480)
+    try:
+        return [
+            {
+                "concurrency": concurrency,
+                "embeddings": embeddings,
+                **asyncio.run(_drive(concurrency, requests_per_client, image, expected)),
+            }
+            for concurrency in concurrency_levels
+        ]
+    finally:
+        inference_executor.stop()
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    p.add_argument("--requests", type=int, default=20, help="requests per client")
+    p.add_argument("--model-ms", type=float, default=20.0, help="stubbed model latency")
+    p.add_argument("--embeddings", type=int, default=10_000, help="gallery size")
+    args = p.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_path = tmp
+        results = run(args.concurrency, args.requests, args.model_ms, args.embeddings)
+    emit("identify", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""``POST /api/v1/attendance/identify/batch`` against one request per photo.
+
+Replays a backlog of ``--images`` kiosk photos (640x480 JPEGs) through the ASGI
+app in-process, the way a kiosk catching up after an outage would: as single
+``/identify`` calls one after another (``sequential``), as single calls
+``--concurrency`` at a time (``concurrent``), and as one batch call, with the
+images as multipart parts or as a zip archive. Detection and embedding are a
+fixed-cost stub (``--model-ms`` per call, whatever the batch size). Reports
+photos per second, the time to the first result, and how many photos
+identified the expected employee.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import tempfile
+import time
+import zipfile
+
+import httpx
+
+from app.core.config import settings
+from app.main import app
+from app.services import storage
+from app.services.gallery import gallery_cache
+from app.services.inference import inference_executor
+from benchmarks._common import (
+    emit,
+    install_stub_model,
+    parser,
+    synthetic_enrollments,
+    synthetic_jpeg,
+)
+
+COMPANY_ID = "bench"
+
+
+async def _singles(client: httpx.AsyncClient, photos: list[bytes], concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    done: list[tuple[float, str | None]] = []
+    start = time.perf_counter()
+
+    async def one(image: bytes) -> None:
+        async with semaphore:
+            response = await client.post(
+                "/api/v1/attendance/identify",
+                data={"company_id": COMPANY_ID},
+                files={"image": ("probe.jpg", image, "image/jpeg")},
+            )
+            done.append((time.perf_counter() - start, response.json().get("employee_id")))
+
+    await asyncio.gather(*(one(image) for image in photos))
+    return done
+
+
+async def _batch(client: httpx.AsyncClient, photos: list[bytes], as_archive: bool) -> list:
+    if as_archive:
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            for i, image in enumerate(photos):
+                archive.writestr(f"{i}.jpg", image)
+        files = [("archive", ("backlog.zip", buffer.getvalue(), "application/zip"))]
+    else:
+        files = [("images", (f"{i}.jpg", image, "image/jpeg")) for i, image in enumerate(photos)]
+    done: list[tuple[float, str | None]] = []
+    start = time.perf_counter()
+    async with client.stream(
+        "POST", "/api/v1/attendance/identify/batch", data={"company_id": COMPANY_ID}, files=files
+    ) as response:
+        async for line in response.aiter_lines():
+            if line:
+                done.append((time.perf_counter() - start, json.loads(line)["employee_id"]))
+    return done
+
+
+async def _run(photos: list[bytes], concurrency: int, expected: str) -> list[dict]:
+    modes = [
+        ("sequential", lambda c: _singles(c, photos, 1)),
+        ("concurrent", lambda c: _singles(c, photos, concurrency)),
+        ("batch", lambda c: _batch(c, photos, as_archive=False)),
+        ("batch_archive", lambda c: _batch(c, photos, as_archive=True)),
+    ]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as c:
+        for name, drive in modes:
+            done = await drive(c)
+            elapsed = max(t for t, _ in done)
+            results.append(
+                {
+                    "mode": name,
+                    "images": len(done),
+                    "correct": sum(employee_id == expected for _, employee_id in done),
+                    "total_ms": elapsed * 1000,
+                    "first_result_ms": min(t for t, _ in done) * 1000,
+                    "images_per_s": len(done) / elapsed,
+                }
+            )
+    return results
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--images", type=int, default=64)
+    p.add_argument("--concurrency", type=int, default=8, help="for the concurrent single calls")
+    p.add_argument("--model-ms", type=float, default=20.0, help="stubbed model latency")
+    p.add_argument("--embeddings", type=int, default=10_000, help="gallery size")
+    args = p.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_path = tmp
+        settings.identify_batch_max_images = max(settings.identify_batch_max_images, args.images)
+        enrolled = synthetic_enrollments(args.embeddings)
+        storage._store(COMPANY_ID).put_many(enrolled)
+        expected, rows = next(iter(enrolled.items()))
+        install_stub_model(args.model_ms, rows[0])
+        gallery_cache.get(COMPANY_ID)
+        photos = [synthetic_jpeg(640, 480, seed=i) for i in range(args.images)]
+        try:
+            results = asyncio.run(_run(photos, args.concurrency, expected))
+        finally:
+            inference_executor.stop()
+    emit("identify_batch", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
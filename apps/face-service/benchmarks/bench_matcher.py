@@ -0,0 +1,76 @@
+"""Vectorized gallery matching vs the original per-pair ``compare_encodings`` loop.
+
+Checks that both return the same employee for every probe and reports the
+speedup at 10, 100, 1k, 10k and 100k enrolled embeddings.
+"""
+
+from app.services import matcher
+from app.services.face_engine import compare_encodings
+from app.services.gallery import Gallery
+from benchmarks._common import emit, measure, noisy_probes, parser, synthetic_enrollments
+
+SIZES = [10, 100, 1_000, 10_000, 100_000]
+
+
+def legacy_identify(
+    probe: list[float], enrolled: dict[str, list[list[float]]]
+) -> tuple[str | None, float]:
+    """The matching loop ``identify_face`` used before the matcher existed."""
+    best_employee_id = None
+    best_confidence = 0.0
+    for employee_id, encodings in enrolled.items():
+        for stored in encodings:
+            similarity = compare_encodings(probe, stored)
+            if similarity > best_confidence:
+                best_confidence = similarity
+                best_employee_id = employee_id
+    return best_employee_id, best_confidence
+
+
+def run(sizes: list[int], probes_per_size: int) -> list[dict]:
+    results = []
+    for size in sizes:
+        enrolled_np = synthetic_enrollments(size)
+        enrolled = {e: [row.tolist() for row in rows] for e, rows in enrolled_np.items()}
+        gallery = Gallery.from_encodings("bench", enrolled)
+        probes, _ = noisy_probes(enrolled_np, probes_per_size)
+        probe_lists = probes.tolist()
+
+        legacy = [legacy_identify(p, enrolled) for p in probe_lists]
+        vectorized = [matcher.best_match(gallery, p) for p in probe_lists]
+        same_ids = all(
+            employee_id == (m.employee_id if m else None)
+            for (employee_id, _), m in zip(legacy, vectorized, strict=True)
+        )
+        max_diff = max(
+            abs(confidence - (m.confidence if m else 0.0))
+            for (_, confidence), m in zip(legacy, vectorized, strict=True)
+        )
+
+        loop_timing = measure(lambda: legacy_identify(probe_lists[0], enrolled), repeat=3)
+        single_timing = measure(lambda: matcher.best_match(gallery, probes[0]), repeat=20)
+        batch_timing = measure(lambda: matcher.match(gallery, probes), repeat=5)
+        results.append(
+            {
+                "embeddings": size,
+                "identical_ids": same_ids,
+                "max_confidence_diff": float(max_diff),
+                "loop_ms": loop_timing["median_ms"],
+                "matrix_ms": single_timing["median_ms"],
+                "speedup": loop_timing["median_ms"] / single_timing["median_ms"],
+                "batch_ms_per_probe": batch_timing["median_ms"] / len(probes),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    p.add_argument("--probes", type=int, default=8)
+    args = p.parse_args()
+    emit("matcher", run(args.sizes, args.probes), args.json)
+
+
+if __name__ == "__main__":
+    main()
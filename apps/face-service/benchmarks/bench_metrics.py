@@ -0,0 +1,71 @@
+"""Overhead of the in-process metrics on the hot path.
+
+Times ``Histogram.observe``, a timed block and a timed function call against
+an empty function, from one thread and from several at once (the metric lock
+is shared), plus rendering ``/metrics`` with many cameras' worth of series.
+"""
+
+import threading
+import time
+
+from app.services.metrics import MetricFamily, Registry
+from benchmarks._common import emit, measure, parser
+
+
+def per_call_ns(fn, calls: int, threads: int) -> float:
+    def loop() -> None:
+        for _ in range(calls):
+            fn()
+
+    workers = [threading.Thread(target=loop) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - start) * 1e9 / (calls * threads)
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--calls", type=int, default=200_000)
+    p.add_argument("--cameras", type=int, default=500)
+    args = p.parse_args()
+
+    registry = Registry()
+    histogram = registry.histogram("op_seconds", "op")
+
+    def baseline() -> None:
+        pass
+
+    def timed_block() -> None:
+        with histogram.time():
+            pass
+
+    cases = {
+        "baseline": baseline,
+        "observe": lambda: histogram.observe(0.01),
+        "timed_block": timed_block,
+        "timed_function": histogram.time()(baseline),
+    }
+    results = [
+        {"case": name, "threads": threads, "ns_per_call": per_call_ns(fn, args.calls, threads)}
+        for threads in (1, 4)
+        for name, fn in cases.items()
+    ]
+
+    registry.collector(
+        lambda: [
+            MetricFamily(
+                f"cam_{i}_total", "counter", "c", [({"camera_id": str(c)}, c) for c in range(100)]
+            )
+            for i in range(args.cameras // 100)
+        ]
+    )
+    render = measure(registry.render, repeat=20)
+    results.append({"case": "render", "threads": 1, "ns_per_call": render["median_ms"] * 1e6})
+    emit("metrics", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
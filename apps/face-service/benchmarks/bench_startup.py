@@ -0,0 +1,81 @@
+"""Service startup time: import, liveness and readiness.
+
+Starts ``uvicorn app.main:app`` in a subprocess for each warm-up mode and
+reports the seconds until ``/health`` first answers (liveness) and until
+``/ready`` stops reporting ``warming_up`` (readiness, with its final status).
+``eager`` loads the model before the API binds, as the service used to;
+``background`` binds first and warms up on a thread. ``import_s`` is the
+time to ``import app.main`` alone. Run it twice to see the effect of the
+on-disk model cache (``MODEL_CACHE_PATH``).
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks._common import emit, parser
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_seconds() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], cwd=ROOT, check=True)
+    return time.perf_counter() - start
+
+
+def start_service(background: bool, timeout: float) -> dict:
+    port = _free_port()
+    env = {**os.environ, "WARMUP_IN_BACKGROUND": str(background).lower()}
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)]
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    live_s = ready_s = None
+    status = "timeout"
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1.0) as client:
+            while time.perf_counter() - start < timeout:
+                try:
+                    if live_s is None and client.get("/health").status_code == 200:
+                        live_s = time.perf_counter() - start
+                    if live_s is not None:
+                        status = client.get("/ready").json()["status"]
+                        if status != "warming_up":
+                            ready_s = time.perf_counter() - start
+                            break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.05)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {"live_s": live_s, "ready_s": ready_s, "ready_status": status}
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--timeout", type=float, default=300.0)
+    args = p.parse_args()
+    imported = import_seconds()
+    results = [
+        {"mode": mode, "import_s": imported, **start_service(mode == "background", args.timeout)}
+        for mode in ("eager", "background")
+    ]
+    emit("startup", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
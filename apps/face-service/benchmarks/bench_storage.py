@@ -0,0 +1,75 @@
+"""Loading a company's encodings from the embedding store, cold and warm.
+
+For each employee count (5 encodings each) a store is written to a temporary
+directory, then ``storage.load_all_encodings`` (Python lists) and the
+matrix-level ``storage.load_company_embeddings`` (including reading every
+memory-mapped row) are timed:
+
+* ``cold`` - a fresh process-level store and the data files dropped from the
+  OS page cache (``posix_fadvise``), close to the first load after a restart
+* ``warm`` - repeated loads with everything cached
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from app.core.config import settings
+from app.services import storage
+from benchmarks._common import emit, measure, parser, synthetic_enrollments
+
+COMPANY_ID = "bench"
+SIZES = [10, 100, 1_000, 10_000]
+
+
+def _drop_caches(directory: Path) -> None:
+    storage._stores.clear()
+    for path in directory.rglob("*"):
+        if path.is_file() and hasattr(os, "posix_fadvise"):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def _touch(loaded: tuple) -> float:
+    # The matrix is memory-mapped; reading it is part of the cost of a cold load
+    return float(loaded[0].sum())
+
+
+def run(sizes: list[int], repeat: int) -> list[dict]:
+    results = []
+    for employees in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.storage_path = tmp
+            enrolled = synthetic_enrollments(employees * 5)
+            storage._store(COMPANY_ID).put_many(enrolled)
+            directory = Path(tmp)
+            row: dict = {"employees": employees, "embeddings": employees * 5}
+            for name, fn in (
+                ("load_all_encodings", lambda: storage.load_all_encodings(COMPANY_ID)),
+                (
+                    "load_company_embeddings",
+                    lambda: _touch(storage.load_company_embeddings(COMPANY_ID)),
+                ),
+            ):
+                cold = measure(fn, repeat=repeat, warmup=0, setup=lambda: _drop_caches(directory))
+                warm = measure(fn, repeat=repeat)
+                row[f"{name}_cold_ms"] = cold["median_ms"]
+                row[f"{name}_warm_ms"] = warm["median_ms"]
+            results.append(row)
+        storage._stores.clear()
+    return results
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="employees per company")
+    p.add_argument("--repeat", type=int, default=5)
+    args = p.parse_args()
+    emit("storage", run(args.sizes, args.repeat), args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""``StreamWorker`` throughput on a local video file.
+
+Plays a video (by default the synthetic 1080p clip of ``bench_capture``, with a
+moving block so motion gating sees activity) through a real ``StreamWorker``,
+recognition pipeline and inference executor, with detection and embedding
+replaced by a fixed-cost stub (``--model-ms``). Reports frames read per
+second, how many frames reached the pipeline and were identified, and the
+pipeline's end-to-end latency, for a few sampling configurations.
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+
+from app.core.config import settings
+from app.services import stream_manager as stream_module
+from app.services.dedup import MemoryDedupStore
+from app.services.gallery import Gallery
+from app.services.inference import InferenceExecutor
+from app.services.pipeline import StreamPipeline
+from app.services.stream_manager import StreamWorker
+from benchmarks._common import emit, install_stub_model, parser, synthetic_enrollments
+from benchmarks.bench_capture import synthetic_video
+
+CONFIGS = [
+    {"name": "every_frame", "frame_interval": 1, "motion_gating": False},
+    {"name": "interval_30", "frame_interval": 30, "motion_gating": False},
+    {"name": "motion_gated", "frame_interval": 30, "motion_gating": True},
+]
+
+
+class _Callbacks:
+    def send(self, url: str, payload: dict) -> None:
+        pass
+
+
+def play(video: str, frames: int, config: dict, gallery: Gallery, timeout: float) -> dict:
+    settings.motion_gating = config["motion_gating"]
+    stream_module.gallery_cache.get = lambda company_id: gallery  # type: ignore[method-assign]
+    executor = InferenceExecutor(workers=2)
+    pipeline = StreamPipeline(executor)
+    pipeline.start()
+    worker = StreamWorker(
+        "bench-cam",
+        video,
+        "bench",
+        "loc",
+        "",
+        pipeline,
+        _Callbacks(),  # type: ignore[arg-type]
+        MemoryDedupStore(),
+        frame_interval=config["frame_interval"],
+    )
+    start = time.perf_counter()
+    worker.start()
+    # The worker reopens a finished file like a dropped stream; stop after one pass
+    while worker.frames_read < frames and time.perf_counter() - start < timeout:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    worker.stop()
+    pipeline.stop()
+    executor.stop()
+    stats = pipeline.stats()
+    return {
+        "config": config["name"],
+        "frames_read": worker.frames_read,
+        "read_fps": worker.frames_read / elapsed,
+        "frames_submitted": worker.frames_submitted,
+        "identified": worker.identifications,
+        "dropped": stats["stages"]["detect"]["dropped"],
+        "avg_end_to_end_ms": stats["avg_end_to_end_ms"],
+    }
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--video", help="video file (default: synthetic 1080p clip)")
+    p.add_argument("--seconds", type=int, default=10, help="length of the synthetic clip")
+    p.add_argument("--model-ms", type=float, default=20.0, help="stubbed model latency")
+    p.add_argument("--timeout", type=float, default=120.0)
+    args = p.parse_args()
+
+    enrolled = synthetic_enrollments(500)
+    gallery = Gallery.from_encodings(
+        "bench", {e: [row.tolist() for row in rows] for e, rows in enrolled.items()}
+    )
+    install_stub_model(args.model_ms, next(iter(enrolled.values()))[0])
+    settings.face_tracking = False  # every sampled frame goes through the model
+    with tempfile.TemporaryDirectory() as tmp:
+        video = args.video or str(synthetic_video(Path(tmp) / "1080p.mp4", args.seconds))
+        capture = cv2.VideoCapture(video)
+        frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        capture.release()
+        results = [play(video, frames, config, gallery, args.timeout) for config in CONFIGS]
+    emit("stream", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Memory and identify throughput of several uvicorn-style worker processes.
+
+Starts ``--workers`` processes that each import the app, load one company
+gallery of ``--embeddings`` rows and then serve ``POST /attendance/identify``
+in-process (``httpx.ASGITransport``) for ``--seconds``, with detection and
+embedding replaced by a fixed-cost stub (``--model-ms``), so the model's own
+memory is not part of the numbers. ``private`` is the default setup after an
+enrollment has reached each worker: every worker holds its gallery as its own
+array. ``shared`` runs with ``shared_gallery``: every worker maps the store
+files read-only. Reports the summed RSS (which counts shared pages once per
+process) and PSS (which splits them, so it adds up to the physical memory
+used), and identify requests per second across all workers.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.main import app
+from app.services import storage
+from app.services.gallery import gallery_cache
+from app.services.inference import inference_executor
+from benchmarks._common import (
+    emit,
+    install_stub_model,
+    parser,
+    synthetic_enrollments,
+    synthetic_jpeg,
+)
+
+COMPANY_ID = "bench"
+
+
+def _memory_mb() -> dict[str, float]:
+    fields = {}
+    for line in Path("/proc/self/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split(":", 1)
+        fields[name] = int(value.split()[0]) / 1024
+    return {"rss_mb": fields["Rss"], "pss_mb": fields["Pss"]}
+
+
+async def _serve(seconds: float, concurrency: int, image: bytes, expected: str) -> dict:
+    requests = correct = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        nonlocal requests, correct
+        while time.perf_counter() < deadline:
+            response = await client.post(
+                "/api/v1/attendance/identify",
+                data={"company_id": COMPANY_ID},
+                files={"image": ("probe.jpg", image, "image/jpeg")},
+            )
+            requests += 1
+            correct += response.json().get("employee_id") == expected
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as c:
+        await asyncio.gather(*(client_loop(c) for _ in range(concurrency)))
+    return {"requests": requests, "correct": correct}
+
+
+def _worker(
+    storage_path: str,
+    shared: bool,
+    args: dict[str, Any],
+    expected: str,
+    embedding: np.ndarray,
+    ready: Any,
+    results: Any,
+) -> None:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    settings.storage_path = storage_path
+    settings.shared_gallery = shared
+    install_stub_model(args["model_ms"], embedding)
+    gallery_cache.get(COMPANY_ID)
+    if not shared:
+        # What applying an enrollment does to a worker's gallery
+        gallery_cache.upsert(COMPANY_ID, "new-hire", [embedding.tolist()])
+    image = synthetic_jpeg(640, 480)
+    ready.wait()
+    try:
+        served = asyncio.run(_serve(args["seconds"], args["concurrency"], image, expected))
+    finally:
+        inference_executor.stop()
+    results.put({**served, **_memory_mb()})
+
+
+def run(
+    storage_path: str, shared: bool, workers: int, args: dict, expected: str, row: np.ndarray
+) -> dict:
+    context = multiprocessing.get_context("spawn")
+    ready = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_worker, args=(storage_path, shared, args, expected, row, ready, results)
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=args["seconds"] + 300) for _ in processes]
+    for process in processes:
+        process.join()
+    return {
+        "mode": "shared" if shared else "private",
+        "workers": workers,
+        "identify_per_s": sum(r["requests"] for r in reports) / args["seconds"],
+        "correct": sum(r["correct"] for r in reports) == sum(r["requests"] for r in reports),
+        "rss_mb": sum(r["rss_mb"] for r in reports),
+        "pss_mb": sum(r["pss_mb"] for r in reports),
+    }
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    p.add_argument("--embeddings", type=int, default=100_000, help="gallery rows")
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--concurrency", type=int, default=4, help="clients per worker")
+    p.add_argument("--model-ms", type=float, default=5.0, help="stubbed model latency")
+    args = p.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        enrolled = synthetic_enrollments(args.embeddings)
+        settings.storage_path = tmp
+        storage._store(COMPANY_ID).put_many(enrolled)
+        expected, rows = next(iter(enrolled.items()))
+        worker_args = {k: vars(args)[k] for k in ("seconds", "concurrency", "model_ms")}
+        gallery_mb = args.embeddings * rows[0].nbytes / 2**20
+        for shared in (False, True):
+            for workers in args.workers:
+                result = run(tmp, shared, workers, worker_args, expected, rows[0])
+                results.append({**result, "gallery_mb": gallery_mb})
+    emit("workers", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Load test for the HTTP routes: p50/p99 latency under concurrent clients.
+
+Serves the real app with uvicorn on a local port, with the model replaced by a
+fixed-cost stub (``--model-ms``) and a synthetic company gallery, and compares:
+
+* ``blocking``  - model calls run inline on the event loop, as the routes did
+  before they were offloaded
+* ``offloaded`` - model calls go through the inference executor
+
+While identify requests are running, a probe polls ``/health`` to show how long
+the event loop stays unresponsive.
+
+    uv run python -m benchmarks.loadtest --concurrency 1 8 32
+"""
+
+import asyncio
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+import numpy as np
+import uvicorn
+
+from app.core.config import settings
+from app.main import app
+from app.services import face_engine, storage
+from app.services.gallery import gallery_cache
+from app.services.inference import inference_executor
+from benchmarks._common import emit, parser, synthetic_enrollments
+
+COMPANY_ID = "loadtest"
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    return float(np.percentile(samples, q))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return int(s.getsockname()[1])
+
+
+def _install_stub_model(model_ms: float, probe: list[float]) -> None:
+    def extract_encoding(image_bytes: bytes) -> list[float]:
+        time.sleep(model_ms / 1000)  # releases the GIL, as TensorFlow kernels do
+        return probe
+
+    face_engine.extract_encoding = extract_encoding  # type: ignore[assignment]
+
+
+def _set_mode(mode: str) -> None:
+    original = type(inference_executor).run
+
+    async def inline(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return fn(*args)
+
+    if mode == "blocking":
+        inference_executor.run = inline  # type: ignore[method-assign]
+    else:
+        inference_executor.run = original.__get__(inference_executor)  # type: ignore[method-assign]
+
+
+async def _drive(base_url: str, concurrency: int, requests_per_client: int) -> dict:
+    latencies: list[float] = []
+    health: list[float] = []
+    statuses: dict[int, int] = {}
+    done = asyncio.Event()
+
+    async def client_loop(client: httpx.AsyncClient) -> None:
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/v1/attendance/identify",
+                data={"company_id": COMPANY_ID},
+                files={"image": ("probe.jpg", b"\xff\xd8stub", "image/jpeg")},
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async def health_probe(client: httpx.AsyncClient) -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            await client.get("/health")
+            health.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.02)
+
+    limits = httpx.Limits(max_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        probe = asyncio.create_task(health_probe(client))
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+
+    return {
+        "requests": len(latencies),
+        "ok": statuses.get(200, 0),
+        "shed_503": statuses.get(503, 0),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": max(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "health_p50_ms": statistics.median(health) if health else 0.0,
+        "health_p99_ms": _percentile(health, 99),
+        "health_max_ms": max(health, default=0.0),
+    }
+
+
+def run(concurrency_levels: list[int], requests_per_client: int, model_ms: float) -> list[dict]:
+    enrolled = synthetic_enrollments(5_000)
+    for employee_id, rows in enrolled.items():
+        storage.save_encoding(COMPANY_ID, employee_id, [row.tolist() for row in rows])
+    _install_stub_model(model_ms, next(iter(enrolled.values()))[0].tolist())
+    gallery_cache.get(COMPANY_ID)
+
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    results = []
+    try:
+        for mode in ("blocking", "offloaded"):
+            _set_mode(mode)
+            for concurrency in concurrency_levels:
+                stats = asyncio.run(
+                    _drive(f"http://127.0.0.1:{port}", concurrency, requests_per_client)
+                )
+                results.append({"mode": mode, "concurrency": concurrency, **stats})
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        inference_executor.stop()
+    return results
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    p.add_argument("--requests", type=int, default=10, help="requests per client")
+    p.add_argument("--model-ms", type=float, default=200.0, help="stubbed model latency")
+    args = p.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.storage_path = tmp
+        results = run(args.concurrency, args.requests, args.model_ms)
+    emit("loadtest", results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Run the benchmark suite and collect the results for regression tracking.
+
+Each benchmark runs in its own process and writes ``<out>/<name>.json``; the
+runner then writes ``<out>/summary.json`` with every result, the git revision
+and the wall time of each benchmark. ``--quick`` uses smaller inputs for a
+smoke run (CI); compare two summaries from the same machine to spot
+regressions. Everything runs offline on CPU with synthetic data and stubbed
+models, except ``bench_backends``, which needs downloaded weights and is only
+run when named with ``--only``.
+
+    uv run python -m benchmarks.run_all --out bench-results/$(git rev-parse --short HEAD)
+"""
+
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks._common import parser
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# name -> (full arguments, --quick arguments)
+SUITE: dict[str, tuple[list[str], list[str]]] = {
+    "bench_decode": ([], ["--repeat", "3"]),
+    "bench_matcher": ([], ["--sizes", "10", "1000", "10000", "--probes", "4"]),
+    "bench_ann": ([], ["--sizes", "10000", "--probes", "50"]),
+    "bench_storage": ([], ["--sizes", "10", "1000", "--repeat", "3"]),
+    "bench_identify": ([], ["--concurrency", "1", "8", "--requests", "5"]),
+    "bench_identify_batch": ([], ["--images", "16", "--embeddings", "1000"]),
+    "bench_stream": ([], ["--seconds", "4"]),
+    "bench_capture": ([], ["--seconds", "4"]),
+    "bench_metrics": ([], ["--calls", "20000"]),
+    "bench_bulk": ([], ["--employees", "50", "--batch-sizes", "1", "16"]),
+    "bench_workers": ([], ["--workers", "1", "2", "--embeddings", "20000", "--seconds", "2"]),
+    "loadtest": ([], ["--concurrency", "1", "8", "--requests", "3", "--model-ms", "50"]),
+    "bench_startup": ([], ["--timeout", "60"]),
+}
+OPTIONAL = {"bench_backends": ([], ["--repeat", "3"])}
+
+
+def run(names: list[str], out: Path, quick: bool) -> dict:
+    out.mkdir(parents=True, exist_ok=True)
+    summary: dict = {"quick": quick, "benchmarks": {}}
+    for name in names:
+        full, small = {**SUITE, **OPTIONAL}[name]
+        path = out / f"{name}.json"
+        print(f"== {name}", flush=True)
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-m", f"benchmarks.{name}", "--json", str(path)]
+            + (small if quick else full),
+            cwd=ROOT,
+        )
+        entry: dict = {"seconds": time.perf_counter() - start, "returncode": proc.returncode}
+        if proc.returncode == 0 and path.exists():
+            payload = json.loads(path.read_text())
+            summary.setdefault("revision", payload.get("revision"))
+            entry["results"] = payload["results"]
+        summary["benchmarks"][name] = entry
+    (out / "summary.json").write_text(json.dumps(summary, indent=2))
+    print(f"Wrote {out / 'summary.json'}")
+    return summary
+
+
+def main() -> None:
+    p = parser(__doc__ or "")
+    p.add_argument("--out", type=Path, default=Path("bench-results"))
+    p.add_argument("--quick", action="store_true", help="small inputs, for a smoke run")
+    p.add_argument("--only", nargs="+", choices=[*SUITE, *OPTIONAL], help="benchmarks to run")
+    args = p.parse_args()
+    summary = run(args.only or list(SUITE), args.out, args.quick)
+    failed = [name for name, entry in summary["benchmarks"].items() if entry["returncode"]]
+    if failed:
+        sys.exit(f"Failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import pytest
+
+from app.services.image_cache import image_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_image_cache() -> None:
+    """Tests stub the model differently for the same image bytes; never reuse results."""
+    image_cache.clear()
@@ -0,0 +1,95 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import matcher, storage
+from app.services.ann_index import IVFIndex
+from app.services.embedding_store import normalize
+from app.services.gallery import Gallery
+
+
+def _clustered(n_employees: int, per_employee: int = 3, dim: int = 16) -> dict[str, list]:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(n_employees, dim))
+    return {
+        f"e{i}": (centers[i] + rng.normal(scale=0.1, size=(per_employee, dim))).tolist()
+        for i in range(n_employees)
+    }
+
+
+@pytest.fixture
+def ivf(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "match_index", "ivf")
+    monkeypatch.setattr(settings, "ivf_min_rows", 10)
+    monkeypatch.setattr(settings, "ivf_nlist", 8)
+
+
+def test_index_covers_every_row_once() -> None:
+    matrix = normalize(np.random.default_rng(1).normal(size=(200, 16)))
+    index = IVFIndex.build(matrix, nlist=10)
+
+    rows = np.sort(np.concatenate(index.lists))
+    assert rows.tolist() == list(range(200))
+
+    keep = np.ones(200, dtype=bool)
+    keep[:50] = False
+    compacted = index.compact(keep).add(150, matrix[:10])
+    assert np.sort(np.concatenate(compacted.lists)).tolist() == list(range(160))
+
+
+@pytest.mark.usefixtures("ivf")
+def test_ivf_search_matches_exact_with_all_lists_probed(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "ivf_nprobe", 8)
+    enrolled = _clustered(50)
+    gallery = Gallery.from_encodings("c1", enrolled)
+    assert gallery.snapshot().ivf is not None
+
+    probes = [enrolled[f"e{i}"][0] for i in range(0, 50, 5)]
+    approx = matcher.match(gallery, probes, top_k=3)
+    exact = matcher.match(gallery, probes, top_k=3, exact=True)
+    assert [[m.employee_id for m in r] for r in approx] == [
+        [m.employee_id for m in r] for r in exact
+    ]
+    assert approx[0][0].confidence == pytest.approx(exact[0][0].confidence)
+
+
+@pytest.mark.usefixtures("ivf")
+def test_index_follows_gallery_updates() -> None:
+    enrolled = _clustered(20)
+    gallery = Gallery.from_encodings("c1", enrolled)
+
+    gallery.remove("e3")
+    gallery.upsert("new", enrolled["e3"])
+    index = gallery.snapshot().ivf
+    assert index is not None
+    assert index.size == 60
+
+    best = matcher.best_match(gallery, enrolled["e3"][1])
+    assert best is not None
+    assert best.employee_id == "new"
+
+
+@pytest.mark.usefixtures("ivf")
+def test_reload_keeps_the_trained_centroids(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    monkeypatch.setattr(settings, "shared_gallery", True)
+    enrolled = _clustered(30)
+    storage.save_encodings("c1", {e: enrolled[e] for e in list(enrolled)[:20]})
+    gallery = Gallery.from_storage("c1")
+    trained = gallery.snapshot().ivf
+    assert trained is not None
+
+    storage.save_encodings("c1", {e: enrolled[e] for e in list(enrolled)[20:]})
+    gallery.reload()
+    index = gallery.snapshot().ivf
+    assert index is not None and index.centroids is trained.centroids
+    assert index.size == 90
+
+    storage.save_encodings("c1", _clustered(40, dim=16))
+    gallery.reload()
+    retrained = gallery.snapshot().ivf
+    assert retrained is not None and retrained.trained_rows == 120
@@ -0,0 +1,194 @@
+import io
+import json
+import threading
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core.config import settings
+from app.main import app
+from app.services import face_engine, matcher, storage
+from app.services.gallery import gallery_cache
+
+client = TestClient(app)
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 32), (120, 120, 120)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def stub_model(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    """Detector: three faces per image. Embedder: fixed vectors, one per face."""
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    gallery_cache.invalidate("c1")
+    embed_calls: list[int] = []
+
+    def detect_faces(img: np.ndarray) -> list[dict]:
+        return [
+            {"face": img, "facial_area": {"x": 20 * i, "y": 0, "w": 16, "h": 16}, "confidence": 1}
+            for i in range(3)
+        ]
+
+    def embed_faces(faces: list[np.ndarray], model: str | None = None) -> np.ndarray:
+        embed_calls.append(len(faces))
+        return np.array([[0.9, 0.1, 0.0], [0.0, 0.0, 1.0], [0.1, 0.95, 0.0]], dtype=np.float32)
+
+    monkeypatch.setattr(face_engine, "detect_faces", detect_faces)
+    monkeypatch.setattr(face_engine, "embed_faces", embed_faces)
+    storage.save_encoding("c1", "alice", [[1.0, 0.0, 0.0]])
+    storage.save_encoding("c1", "bob", [[0.0, 1.0, 0.0]])
+    yield embed_calls
+    gallery_cache.invalidate("c1")
+
+
+def test_identify_faces_returns_every_face(stub_model: list[int]) -> None:
+    response = client.post(
+        "/api/v1/attendance/identify/faces",
+        data={"company_id": "c1"},
+        files={"image": ("group.jpg", _jpeg(), "image/jpeg")},
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["message"] == "Identified 2 of 3 faces"
+    assert [(f["bbox"]["x"], f["employee_id"]) for f in body["faces"]] == [
+        (0, "alice"),
+        (20, None),
+        (40, "bob"),
+    ]
+    assert not body["faces"][1]["identified"]
+    assert stub_model == [3]
+
+
+def test_identify_faces_reports_each_employee_once(
+    stub_model: list[int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def embed_faces(faces: list[np.ndarray], model: str | None = None) -> np.ndarray:
+        # Two faces resemble alice; the closer one gets her, the other bob
+        return np.array([[0.9, 0.4, 0.0], [1.0, 0.0, 0.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+
+    monkeypatch.setattr(face_engine, "embed_faces", embed_faces)
+    monkeypatch.setattr(settings, "min_confidence", 0.3)
+    response = client.post(
+        "/api/v1/attendance/identify/faces",
+        data={"company_id": "c1"},
+        files={"image": ("group.jpg", _jpeg(), "image/jpeg")},
+    )
+
+    assert response.status_code == 200
+    assert [f["employee_id"] for f in response.json()["faces"]] == ["bob", "alice", None]
+
+
+def test_identify_faces_rejects_undecodable_images() -> None:
+    response = client.post(
+        "/api/v1/attendance/identify/faces",
+        data={"company_id": "c1"},
+        files={"image": ("group.jpg", b"not an image", "image/jpeg")},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"faces": [], "message": "Image could not be decoded"}
+
+
+def test_identify_faces_matches_off_the_event_loop(monkeypatch: pytest.MonkeyPatch) -> None:
+    threads: list[str] = []
+    match = matcher.match
+
+    def recording_match(*args: Any, **kwargs: Any) -> list:
+        threads.append(threading.current_thread().name)
+        return match(*args, **kwargs)
+
+    monkeypatch.setattr(matcher, "match", recording_match)
+    response = client.post(
+        "/api/v1/attendance/identify/faces",
+        data={"company_id": "c1"},
+        files={"image": ("group.jpg", _jpeg(), "image/jpeg")},
+    )
+
+    assert response.status_code == 200
+    # A worker thread of the event loop's default executor
+    assert len(threads) == 1 and threads[0].startswith("asyncio_")
+
+
+def test_identify_batch_streams_one_result_per_image(
+    stub_model: list[int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """One face per image: bright images are alice, dark ones bob, black ones two people."""
+    monkeypatch.setattr(settings, "identify_batch_chunk", 2)
+
+    def detect_faces(img: np.ndarray) -> list[dict]:
+        face = {"face": img, "facial_area": {"x": 0, "y": 0, "w": 8, "h": 8}, "confidence": 1}
+        return [face, face] if not img.any() else [face]
+
+    def embed_faces(faces: list[np.ndarray], model: str | None = None) -> np.ndarray:
+        stub_model.append(len(faces))
+        return np.array([[1.0, 0.0, 0.0] if f.mean() > 100 else [0.0, 1.0, 0.0] for f in faces])
+
+    monkeypatch.setattr(face_engine, "detect_faces", detect_faces)
+    monkeypatch.setattr(face_engine, "embed_faces", embed_faces)
+
+    def jpeg(value: int) -> bytes:
+        buf = io.BytesIO()
+        Image.new("RGB", (16, 16), (value, value, value)).save(buf, format="JPEG")
+        return buf.getvalue()
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("queue/2.jpg", jpeg(50))
+        zf.writestr("queue/3.jpg", b"not an image")
+        zf.writestr("queue/notes.txt", b"")
+    response = client.post(
+        "/api/v1/attendance/identify/batch",
+        data={"company_id": "c1"},
+        files=[
+            ("images", ("0.jpg", jpeg(200), "image/jpeg")),
+            ("images", ("1.jpg", jpeg(0), "image/jpeg")),
+            ("archive", ("queue.zip", archive.getvalue(), "application/zip")),
+        ],
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = sorted(
+        (json.loads(line) for line in response.text.splitlines()), key=lambda r: r["index"]
+    )
+    assert [(r["filename"], r["employee_id"]) for r in lines] == [
+        ("0.jpg", "alice"),
+        ("1.jpg", None),
+        ("queue/2.jpg", "bob"),
+        ("queue/3.jpg", None),
+    ]
+    assert lines[1]["message"].startswith("Multiple faces detected")
+    assert lines[3]["message"] == "Image could not be decoded"
+    assert stub_model == [1, 1]  # one embedding call per chunk of two images
+
+
+def test_identify_batch_requires_images() -> None:
+    response = client.post("/api/v1/attendance/identify/batch", data={"company_id": "c1"})
+    assert response.status_code == 400
+
+
+def test_identify_batch_caps_images_before_reading_the_archive(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "identify_batch_max_images", 2)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("queue/9.jpg", _jpeg())
+    for count in (2, 3):
+        response = client.post(
+            "/api/v1/attendance/identify/batch",
+            data={"company_id": "c1"},
+            files=[("images", (f"{i}.jpg", _jpeg(), "image/jpeg")) for i in range(count)]
+            + [("archive", ("queue.zip", archive.getvalue(), "application/zip"))],
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Maximum 2 images allowed"
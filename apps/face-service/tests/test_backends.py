@@ -0,0 +1,184 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from deepface.modules import detection, modeling, preprocessing
+
+from app.services import face_backends
+from app.services.face_backends import (
+    DeepFaceDetector,
+    DeepFaceEmbedder,
+    OnnxEmbedder,
+    OpenCVDetector,
+    align_crop,
+    resize_pad,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "faces"
+
+
+@pytest.mark.parametrize("shape", [(160, 160), (97, 131), (240, 80), (20, 500)])
+def test_resize_matches_deepface_preprocessing(shape: tuple[int, int]) -> None:
+    rng = np.random.default_rng(0)
+    face = rng.random((*shape, 3)).astype(np.float32)
+    expected = preprocessing.resize_image(face, (160, 160))[0]
+    np.testing.assert_allclose(resize_pad(face, (160, 160)), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "box, eyes",
+    [
+        ((60, 50, 80, 100), ((120, 80), (80, 92))),  # tilted, well inside the image
+        ((5, 0, 70, 90), ((60, 30), (20, 20))),  # touching the top-left corner
+        ((150, 100, 50, 60), None),  # no landmarks: no rotation
+    ],
+)
+def test_align_crop_matches_deepface(box: tuple, eyes: tuple | None) -> None:
+    img = np.random.default_rng(1).integers(0, 255, (200, 200, 3), dtype=np.uint8)
+    left, right = eyes or (None, None)
+    sub, rx, ry = detection.extract_sub_image(img, box)
+    aligned, angle = detection.align_img_wrt_eyes(sub, left, right)
+    x, y, w, h = box
+    x1, y1, x2, y2 = detection.project_facial_area((rx, ry, rx + w, ry + h), angle, sub.shape[:2])
+    np.testing.assert_array_equal(align_crop(img, box, left, right), aligned[y1:y2, x1:x2])
+
+
+def test_backend_selection() -> None:
+    assert isinstance(face_backends.create_detector("cv2-yunet"), OpenCVDetector)
+    assert isinstance(face_backends.create_detector("ssd"), DeepFaceDetector)
+    embedder = face_backends.create_embedder("Facenet512-onnx", "int8")
+    assert isinstance(embedder, OnnxEmbedder) and embedder.precision == "int8"
+    assert isinstance(face_backends.create_embedder("Facenet512"), DeepFaceEmbedder)
+
+
+def _linear_graph(path: Path, weights: np.ndarray) -> None:
+    """A stand-in embedding model: flatten a 4x4 NHWC input and multiply."""
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+
+    graph = helper.make_graph(
+        [
+            helper.make_node("Flatten", ["input"], ["flat"]),
+            helper.make_node("MatMul", ["flat", "w"], ["embedding"]),
+        ],
+        "linear",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["N", 4, 4, 3])],
+        [helper.make_tensor_value_info("embedding", TensorProto.FLOAT, ["N", 8])],
+        [numpy_helper.from_array(weights, "w")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+
+@pytest.mark.parametrize("runtime", ["onnxruntime", "cv2"])
+def test_onnx_embedder_batches_preprocessed_faces(
+    runtime: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    if runtime == "onnxruntime":
+        pytest.importorskip("onnxruntime")
+    else:
+        monkeypatch.setitem(sys.modules, "onnxruntime", None)
+    monkeypatch.setenv("DEEPFACE_HOME", str(tmp_path))
+    weights = np.random.default_rng(2).normal(size=(48, 8)).astype(np.float32)
+    face_backends.weights_dir().mkdir(parents=True)
+    _linear_graph(face_backends.weights_dir() / "linear.onnx", weights)
+
+    faces = [np.random.default_rng(i).random((6 + i, 5, 3)).astype(np.float32) for i in range(3)]
+    embeddings = OnnxEmbedder("linear.onnx", (4, 4)).embed(faces)
+
+    expected = np.stack([resize_pad(f[:, :, ::-1], (4, 4)).ravel() @ weights for f in faces])
+    np.testing.assert_allclose(embeddings, expected, rtol=1e-4, atol=1e-4)
+
+
+def test_onnx_and_deepface_embedders_feed_the_model_alike(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Both embedders hand their model the same batch for the same RGB crops."""
+    fed: dict[str, np.ndarray] = {}
+
+    class Model:
+        input_shape = (4, 4)
+
+        def forward(self, batch: np.ndarray) -> np.ndarray:
+            fed["deepface"] = batch
+            return np.zeros((len(batch), 8), dtype=np.float32)
+
+    class Session:
+        def get_inputs(self) -> list[SimpleNamespace]:
+            return [SimpleNamespace(name="input")]
+
+        def run(self, outputs: None, feed: dict[str, np.ndarray]) -> list[np.ndarray]:
+            fed["onnx"] = feed["input"]
+            return [np.zeros((len(feed["input"]), 8), dtype=np.float32)]
+
+    monkeypatch.setattr(modeling, "build_model", lambda **kwargs: Model())
+    faces = [np.random.default_rng(i).random((6 + i, 5, 3)).astype(np.float32) for i in range(3)]
+    DeepFaceEmbedder("Facenet512").embed(faces)
+    onnx_embedder = OnnxEmbedder("unused.onnx", (4, 4))
+    onnx_embedder._session = Session()
+    onnx_embedder.embed(faces)
+
+    np.testing.assert_allclose(fed["onnx"], fed["deepface"], atol=1e-6)
+
+
+def test_missing_weights_fail_clearly(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("DEEPFACE_HOME", str(tmp_path))
+    with pytest.raises(FileNotFoundError, match="not-a-model.onnx"):
+        face_backends.fetch_weights("not-a-model.onnx")
+
+
+def _fixture_images() -> list[Path]:
+    return sorted(FIXTURES.glob("*.jpg")) if FIXTURES.is_dir() else []
+
+
+@pytest.mark.skipif(
+    not _fixture_images()
+    or not (face_backends.weights_dir() / "facenet512_weights.onnx").exists()
+    or not (face_backends.weights_dir() / "face_detection_yunet_2023mar.onnx").exists()
+    or not (face_backends.weights_dir() / "facenet512_weights.h5").exists(),
+    reason="needs tests/fixtures/faces/*.jpg and downloaded YuNet/Facenet512 weights",
+)
+@pytest.mark.parametrize("precision, min_similarity", [("fp32", 0.99), ("int8", 0.95)])
+def test_accuracy_parity_on_fixtures(precision: str, min_similarity: float) -> None:
+    """The cv2/ONNX backend finds the same faces as DeepFace and embeds them alike."""
+    from app.services.face_engine import _load_image
+
+    ref_detector, ref_embedder = DeepFaceDetector("yunet"), DeepFaceEmbedder("Facenet512")
+    light_detector = OpenCVDetector("yunet")
+    light_embedder = OnnxEmbedder("facenet512_weights.onnx", (160, 160), precision)
+    ref_all, light_all = [], []
+    for path in _fixture_images():
+        img = _load_image(path.read_bytes())
+        ref_faces, light_faces = ref_detector.detect(img), light_detector.detect(img)
+        assert len(light_faces) == len(ref_faces), path.name
+        if not ref_faces:
+            continue
+        for a, b in zip(ref_faces, light_faces, strict=True):
+            assert _iou(a["facial_area"], b["facial_area"]) >= 0.8, path.name
+        ref_emb = ref_embedder.embed([f["face"] for f in ref_faces])
+        light_emb = light_embedder.embed([f["face"] for f in light_faces])
+        ref_all.append(ref_emb)
+        light_all.append(light_emb)
+        cosine = np.sum(_unit(ref_emb) * _unit(light_emb), axis=1)
+        assert cosine.min() >= min_similarity, (path.name, cosine.min())
+
+    # Either backend's embeddings pick the same nearest fixture face
+    ref, light = _unit(np.concatenate(ref_all)), _unit(np.concatenate(light_all))
+    np.fill_diagonal(ref_sim := ref @ ref.T, -1)
+    np.fill_diagonal(cross := light @ ref.T, -1)
+    assert (ref_sim.argmax(axis=1) == cross.argmax(axis=1)).mean() >= 0.95
+
+
+def _unit(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def _iou(a: dict, b: dict) -> float:
+    ax2, ay2, bx2, by2 = a["x"] + a["w"], a["y"] + a["h"], b["x"] + b["w"], b["y"] + b["h"]
+    iw = max(0, min(ax2, bx2) - max(a["x"], b["x"]))
+    ih = max(0, min(ay2, by2) - max(a["y"], b["y"]))
+    inter = iw * ih
+    return inter / (a["w"] * a["h"] + b["w"] * b["h"] - inter)
@@ -0,0 +1,163 @@
+import io
+import time
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core.config import settings
+from app.main import app
+from app.services import face_engine, storage
+from app.services.bulk_jobs import read_archive
+
+client = TestClient(app)
+
+
+def _jpeg(value: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), (value, value, value)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def _zip(files: dict[str, bytes]) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def stub_model(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> list[str | None]:
+    """Detector: one face per image (two for black images). Embedder: mean pixel
+    value, with a third column for any model but the default."""
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    monkeypatch.setattr(settings, "bulk_batch_size", 2)
+    models: list[str | None] = []
+
+    def detect_faces(img: np.ndarray) -> list[dict]:
+        face = {"face": img / 255.0, "facial_area": {"x": 0, "y": 0}, "confidence": 0.9}
+        return [face, face] if not img.any() else [face]
+
+    def embed_faces(faces: list[np.ndarray], model: str | None = None) -> np.ndarray:
+        models.append(model)
+        extra = [] if model == settings.face_model else [0.5]
+        return np.array([[face.mean(), 1.0, *extra] for face in faces], dtype=np.float32)
+
+    monkeypatch.setattr(face_engine, "detect_faces", detect_faces)
+    monkeypatch.setattr(face_engine, "embed_faces", embed_faces)
+    return models
+
+
+def _wait(job_id: str) -> dict:
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        body = client.get(f"/api/v1/jobs/{job_id}").json()
+        if body["status"] not in ("queued", "running"):
+            return body
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_read_archive_groups_by_directory_or_manifest(tmp_path: Path) -> None:
+    path = tmp_path / "a.zip"
+    path.write_bytes(
+        _zip({"alice/1.jpg": b"1", "alice/2.JPG": b"2", "bob/1.png": b"3", "notes.txt": b""})
+    )
+    assert read_archive(path) == {"alice": ["alice/1.jpg", "alice/2.JPG"], "bob": ["bob/1.png"]}
+
+    path.write_bytes(
+        _zip(
+            {
+                "manifest.csv": b"employee_id,filename\ne1,x.jpg\ne1,y.jpg\n",
+                "x.jpg": b"",
+                "y.jpg": b"",
+            }
+        )
+    )
+    assert read_archive(path) == {"e1": ["x.jpg", "y.jpg"]}
+
+    path.write_bytes(_zip({"manifest.csv": b"employee_id,filename\n..,x.jpg\n", "x.jpg": b""}))
+    with pytest.raises(ValueError):
+        read_archive(path)
+
+
+def test_bulk_enroll_commits_valid_employees_and_reports_the_rest() -> None:
+    archive = _zip(
+        {
+            "alice/1.jpg": _jpeg(100),
+            "alice/2.jpg": _jpeg(150),
+            "bob/1.jpg": _jpeg(200),
+            "carol/1.jpg": _jpeg(0),  # two faces
+        }
+    )
+    response = client.post(
+        "/api/v1/jobs/enroll",
+        data={"company_id": "c1"},
+        files={"archive": ("staff.zip", archive, "application/zip")},
+    )
+    assert response.status_code == 202
+    assert response.json()["total"] == 3
+
+    body = _wait(response.json()["job_id"])
+    assert body["status"] == "completed"
+    assert (body["processed"], body["enrolled"], body["failed"]) == (3, 2, 1)
+    assert body["errors"][0]["employee_id"] == "carol"
+    assert body["errors"][0]["message"].startswith("Image 1: Multiple faces detected")
+    assert len(storage.load_encoding("c1", "alice") or []) == 2
+    assert storage.get_photo_count("c1", "bob") == 1
+    assert storage.load_encoding("c1", "carol") is None
+    assert not list((Path(settings.storage_path) / "jobs").iterdir())
+
+
+def test_bulk_enroll_rejects_unreadable_archive() -> None:
+    response = client.post(
+        "/api/v1/jobs/enroll",
+        data={"company_id": "c1"},
+        files={"archive": ("staff.zip", b"not a zip", "application/zip")},
+    )
+    assert response.status_code == 400
+
+
+def test_reembed_refuses_another_model_than_the_services(stub_model: list[str | None]) -> None:
+    storage.save_photo("c1", "alice", _jpeg(100), 0)
+    storage.save_encoding("c1", "alice", [[1.0, 0.0]])
+
+    response = client.post("/api/v1/jobs/reembed", json={"company_id": "c1", "model": "ArcFace"})
+    assert response.status_code == 422
+    assert stub_model == []
+    assert storage.load_encoding("c1", "alice") == [[1.0, 0.0]]
+
+
+def test_reembed_keeps_failed_and_newly_enrolled_employees(
+    stub_model: list[str | None], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    for employee_id, value in (("alice", 100), ("bob", 200), ("carol", 0)):
+        storage.save_photo("c1", employee_id, _jpeg(value), 0)
+        storage.save_encoding("c1", employee_id, [[1.0, 0.0]])
+    embed = face_engine.embed_faces
+
+    def embed_while_enrolling(faces: list[np.ndarray], model: str | None = None) -> np.ndarray:
+        # Bob is enrolled again while the job embeds his old photos
+        storage.save_encoding("c1", "bob", [[0.0, 1.0]])
+        return embed(faces, model)
+
+    monkeypatch.setattr(face_engine, "embed_faces", embed_while_enrolling)
+    response = client.post("/api/v1/jobs/reembed", json={"company_id": "c1"})
+    assert response.status_code == 202
+    body = _wait(response.json()["job_id"])
+
+    assert body["status"] == "completed"
+    assert (body["enrolled"], body["failed"]) == (1, 1)
+    assert body["errors"][0]["employee_id"] == "carol"  # two faces in a black image
+    assert set(stub_model) == {settings.face_model}
+    reembedded = storage.load_encoding("c1", "alice")
+    assert reembedded is not None and reembedded != [[1.0, 0.0]]
+    assert storage.load_encoding("c1", "bob") == [[0.0, 1.0]]
+    assert storage.load_encoding("c1", "carol") == [[1.0, 0.0]]
+    assert client.get("/api/v1/jobs", params={"company_id": "c1"}).json()["jobs"]
+
+    assert client.post("/api/v1/jobs/reembed", json={"company_id": "c2"}).status_code == 404
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.callbacks import CallbackDispatcher
+
+
+class Backend:
+    """Mock transport that fails with 503 while ``down`` and records delivered bodies."""
+
+    def __init__(self) -> None:
+        self.down = False
+        self.requests: list[tuple[str, dict]] = []
+        self.received = threading.Event()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        if self.down:
+            return httpx.Response(503)
+        self.requests.append((request.url.path, json.loads(request.content)))
+        self.received.set()
+        return httpx.Response(200, json={"success": True})
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _dispatcher(tmp_path: Path, backend: Backend, **kwargs) -> CallbackDispatcher:
+    return CallbackDispatcher(
+        tmp_path, backoff=0.01, backoff_max=0.05, transport=httpx.MockTransport(backend), **kwargs
+    )
+
+
+def test_events_are_coalesced_into_batches(tmp_path: Path) -> None:
+    backend = Backend()
+    dispatcher = _dispatcher(tmp_path, backend, batch_url="http://web/api/attendance/batch")
+    for i in range(5):
+        dispatcher.send("http://web/api/attendance/log", {"employee_id": f"e{i}"})
+    dispatcher.start()
+    try:
+        assert _wait_for(lambda: dispatcher.stats()["delivered"] == 5)
+    finally:
+        dispatcher.stop()
+
+    assert backend.requests[0][0] == "/api/attendance/batch"
+    assert [e["employee_id"] for e in backend.requests[0][1]["events"]] == [
+        f"e{i}" for i in range(5)
+    ]
+
+
+def test_failures_are_retried_then_spooled_and_replayed(tmp_path: Path) -> None:
+    backend = Backend()
+    backend.down = True
+    dispatcher = _dispatcher(tmp_path, backend, max_retries=2)
+    dispatcher.start()
+    try:
+        dispatcher.send("http://web/api/attendance/log", {"employee_id": "e1"})
+        assert _wait_for(lambda: dispatcher.stats()["spooled"] == 1)
+        assert dispatcher.stats()["failed_attempts"] >= 3
+
+        backend.down = False
+        assert backend.received.wait(timeout=5)
+        assert _wait_for(lambda: dispatcher.stats()["spool_bytes"] == 0)
+    finally:
+        dispatcher.stop()
+
+    assert backend.requests == [("/api/attendance/log", {"employee_id": "e1"})]
+
+
+def test_rejected_events_are_not_retried(tmp_path: Path) -> None:
+    dispatcher = CallbackDispatcher(
+        tmp_path, transport=httpx.MockTransport(lambda request: httpx.Response(404))
+    )
+    dispatcher.start()
+    try:
+        dispatcher.send("http://web/api/attendance/log", {"employee_id": "gone"})
+        assert _wait_for(lambda: dispatcher.stats()["rejected"] == 1)
+    finally:
+        dispatcher.stop()
+    assert dispatcher.stats()["failed_attempts"] == 0
+
+
+def test_stop_spools_undelivered_events(tmp_path: Path) -> None:
+    dispatcher = _dispatcher(tmp_path, Backend())
+    for i in range(3):
+        dispatcher.send("http://web/api/attendance/log", {"employee_id": f"e{i}"})
+    dispatcher.stop()  # never started
+
+    lines = (tmp_path / "callbacks.jsonl").read_text().splitlines()
+    assert [json.loads(line)["payload"]["employee_id"] for line in lines] == ["e0", "e1", "e2"]
+
+
+def test_unsendable_urls_are_rejected_without_stopping_delivery(tmp_path: Path) -> None:
+    backend = Backend()
+
+    def transport(request: httpx.Request) -> httpx.Response:
+        if len(request.url.host) > 63:
+            # What resolving the host does in a real transport
+            raise UnicodeError("encoding with 'idna' codec failed (label too long)")
+        return backend(request)
+
+    dispatcher = CallbackDispatcher(tmp_path, transport=httpx.MockTransport(transport))
+    dispatcher.send("http://web/api/attendance/log\x00", {"employee_id": "e0"})
+    dispatcher.send(f"http://{'a' * 64}/log", {"employee_id": "e1"})
+    dispatcher.send("http://web/api/attendance/log", {"employee_id": "e2"})
+    dispatcher.start()
+    try:
+        assert _wait_for(lambda: dispatcher.stats()["delivered"] == 1)
+    finally:
+        dispatcher.stop()
+
+    assert dispatcher.stats()["rejected"] == 2
+    assert backend.requests == [("/api/attendance/log", {"employee_id": "e2"})]
+
+
+def test_stream_start_validates_the_callback_url() -> None:
+    client = TestClient(app)
+    spec = {
+        "camera_id": "cam-1",
+        "rtsp_url": "rtsp://cam-1",
+        "company_id": "c1",
+        "location_id": "l1",
+    }
+    for url in ("http://web/log\x00", f"http://{'a' * 64}.example/log", "/api/log"):
+        response = client.post("/api/v1/stream/start", json={**spec, "callback_url": url})
+        assert response.status_code == 422
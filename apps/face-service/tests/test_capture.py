@@ -0,0 +1,127 @@
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import stream_manager as stream_module
+from app.services.capture import FFmpegSource, OpenCVSource
+from app.services.dedup import MemoryDedupStore
+from app.services.gallery import Gallery
+from app.services.stream_manager import StreamWorker
+
+
+@pytest.fixture
+def video(tmp_path: Path) -> Path:
+    path = tmp_path / "clip.mp4"
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 25, (320, 240))
+    for i in range(50):
+        frame = np.full((240, 320, 3), 40, dtype=np.uint8)
+        frame[100:140, 5 * i : 5 * i + 40] = 220
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def _drain(source) -> list[tuple[int, ...]]:
+    assert source.open()
+    shapes = []
+    try:
+        while source.grab():
+            if len(shapes) % 10 == 0:
+                shapes.append(source.retrieve().shape)
+            else:
+                shapes.append(None)
+    finally:
+        source.close()
+    return shapes
+
+
+def test_opencv_source_grabs_all_and_downscales_retrieved(video: Path) -> None:
+    shapes = _drain(OpenCVSource(str(video), width=160))
+    assert len(shapes) == 50
+    assert shapes[0] == (120, 160, 3)
+
+
+@pytest.mark.skipif(not FFmpegSource.available(), reason="ffmpeg/ffprobe not installed")
+def test_ffmpeg_source_matches_frame_count(video: Path) -> None:
+    shapes = _drain(FFmpegSource(str(video), width=160))
+    assert len(shapes) == 50
+    assert shapes[0] == (120, 160, 3)
+
+
+class RecordingPipeline:
+    def __init__(self) -> None:
+        self.frames = []
+
+    def submit(self, frame) -> bool:
+        self.frames.append(frame)
+        return True
+
+
+def test_worker_only_decodes_sampled_frames(video: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "motion_gating", False)
+    gallery = Gallery.from_encodings("c1", {"e1": [[1.0, 0.0]]})
+    monkeypatch.setattr(stream_module.gallery_cache, "get", lambda company_id: gallery)
+    pipeline = RecordingPipeline()
+    worker = StreamWorker(
+        "cam-1", str(video), "c1", "l1", "", pipeline, None, MemoryDedupStore(), frame_interval=5
+    )
+    worker.start()
+    deadline = time.monotonic() + 10
+    while worker.frames_read < 50 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop()
+
+    status = worker.status()
+    assert status["frames_read"] >= 50
+    assert status["frames_decoded"] == status["frames_submitted"] == len(pipeline.frames)
+    assert status["frames_decoded"] == status["frames_read"] // 5
+    assert pipeline.frames[0].image.shape == (240, 320, 3)
+
+
+def test_worker_picks_up_enrollments_without_restarting(
+    video: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "motion_gating", False)
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    cache = stream_module.gallery_cache
+    cache.invalidate("c1")
+    pipeline = RecordingPipeline()
+    worker = StreamWorker(
+        "cam-1", str(video), "c1", "l1", "", pipeline, None, MemoryDedupStore(), frame_interval=5
+    )
+    worker.start()
+    deadline = time.monotonic() + 10
+    while worker.frames_read < 50 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert worker.is_running
+    assert pipeline.frames == []  # nobody enrolled yet
+
+    gallery = cache.get("c1")
+    cache.upsert("c1", "e1", [[1.0, 0.0]])
+    while not pipeline.frames and time.monotonic() < deadline:
+        time.sleep(0.01)
+    worker.stop()
+    cache.invalidate("c1")
+
+    assert pipeline.frames[-1].gallery is gallery
+    assert worker.status()["gallery_version"] == gallery.version == 2
+
+
+def test_keyframe_capture_counts_intervals_in_keyframes(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "capture_backend", "ffmpeg")
+    monkeypatch.setattr(settings, "capture_keyframes_only", True)
+    monkeypatch.setattr(settings, "capture_keyframe_interval", 30)
+    monkeypatch.setattr(settings, "motion_gating", True)
+    monkeypatch.setattr(settings, "motion_active_interval", 5)
+    monkeypatch.setattr(settings, "motion_idle_interval", 300)
+    worker = StreamWorker(
+        "cam-1", "rtsp://cam", "c1", "l1", "", RecordingPipeline(), None, MemoryDedupStore()
+    )
+
+    assert worker.frame_interval == 1
+    assert worker._gate is not None
+    assert (worker._gate.active_interval, worker._gate.idle_interval) == (1, 10)
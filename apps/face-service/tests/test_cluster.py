@@ -0,0 +1,188 @@
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1.routes import stream
+from app.main import app
+from app.services.cluster import ClusterCoordinator, MemoryClusterStore
+
+client = TestClient(app)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeManager:
+    """The parts of ``StreamManager`` the coordinator drives, with settable frame rates."""
+
+    def __init__(self, clock: FakeClock) -> None:
+        self.clock = clock
+        self.running: dict[str, float] = {}  # camera_id -> started at
+        self.fps: dict[str, float] = {}
+
+    def start_stream(self, **spec: Any) -> bool:
+        self.running[spec["camera_id"]] = self.clock()
+        return True
+
+    def stop_stream(self, camera_id: str) -> bool:
+        return self.running.pop(camera_id, None) is not None
+
+    def get_status(self) -> list[dict]:
+        return [
+            {
+                "camera_id": camera_id,
+                "running": True,
+                "frames_decoded": int(self.fps.get(camera_id, 1.0) * (self.clock() - started)),
+            }
+            for camera_id, started in self.running.items()
+        ]
+
+
+def _spec(camera_id: str) -> dict:
+    return {
+        "camera_id": camera_id,
+        "rtsp_url": f"rtsp://user:secret@{camera_id}",
+        "company_id": "c1",
+        "location_id": "l1",
+        "callback_url": "http://app/callback",
+        "frame_interval": 30,
+    }
+
+
+def _cluster(*node_ids: str) -> tuple[FakeClock, MemoryClusterStore, dict]:
+    clock = FakeClock()
+    store = MemoryClusterStore(clock)
+    nodes = {
+        node_id: ClusterCoordinator(
+            store, FakeManager(clock), node_id, lease_seconds=10, min_hold=30, clock=clock
+        )
+        for node_id in node_ids
+    }
+    for node in nodes.values():
+        node.tick()
+    return clock, store, nodes
+
+
+def _tick(clock: FakeClock, nodes: dict, seconds: float = 3.0) -> None:
+    clock.now += seconds
+    for node in nodes.values():
+        node.tick()
+
+
+def test_cameras_are_spread_over_the_nodes() -> None:
+    clock, _, nodes = _cluster("a", "b", "c")
+    assert nodes["b"].start_stream(**_spec("cam-1"))
+    assert not nodes["c"].start_stream(**_spec("cam-1"))
+    for i in range(2, 7):
+        nodes["a"].start_stream(**_spec(f"cam-{i}"))
+
+    _tick(clock, nodes)
+
+    assert {node_id: len(node.owned) for node_id, node in nodes.items()} == {"a": 2, "b": 2, "c": 2}
+    running = [camera for node in nodes.values() for camera in node.manager.running]
+    assert sorted(running) == [f"cam-{i}" for i in range(1, 7)]
+
+
+def test_orphaned_cameras_are_taken_over_and_a_returning_node_stops_them() -> None:
+    clock, store, nodes = _cluster("a", "b")
+    for i in range(4):
+        nodes["a"].start_stream(**_spec(f"cam-{i}"))
+    _tick(clock, nodes)
+    lost = nodes["a"].owned
+    assert len(lost) == 2
+
+    # Node a hangs: its heartbeat and leases run out and b takes its cameras
+    survivors = {"b": nodes["b"]}
+    for _ in range(4):
+        _tick(clock, survivors)
+    assert len(nodes["b"].owned) == 4
+    assert set(store.owners().values()) == {"b"}
+
+    nodes["a"].tick()  # back again, but its leases are gone
+    assert nodes["a"].owned == [] and nodes["a"].manager.running == {}
+    assert nodes["a"].lost == 2
+
+
+def test_overloaded_node_hands_cameras_to_less_loaded_ones() -> None:
+    clock, _, nodes = _cluster("a", "b")
+    for i in range(4):
+        nodes["a"].start_stream(**_spec(f"cam-{i}"))
+    _tick(clock, nodes)
+    for camera_id in nodes["a"].owned:
+        nodes["a"].manager.fps[camera_id] = 20.0  # a's cameras see a lot of motion
+
+    _tick(clock, nodes)
+    assert nodes["a"].released == 0  # held for less than min_hold
+
+    for _ in range(20):
+        _tick(clock, nodes)
+    assert nodes["a"].released == 1
+    assert (len(nodes["a"].owned), len(nodes["b"].owned)) == (1, 3)
+
+
+def test_stop_reaches_the_owner_and_status_covers_the_cluster() -> None:
+    clock, _, nodes = _cluster("a", "b")
+    for i in range(2):
+        nodes["a"].start_stream(**_spec(f"cam-{i}"))
+    _tick(clock, nodes)
+    _tick(clock, nodes)  # heartbeats with the status of the cameras started
+    owner = next(node for node in nodes.values() if "cam-0" in node.owned)
+
+    status = nodes["a"].status()
+    assert [n["node_id"] for n in status["nodes"]] == ["a", "b"]
+    camera = next(c for c in status["cameras"] if c["camera_id"] == "cam-0")
+    assert camera["node_id"] == owner.node_id
+    assert camera["status"]["running"] is True
+    assert "rtsp_url" not in camera
+
+    assert nodes["b"].stop_stream("cam-0")
+    _tick(clock, nodes)
+    assert "cam-0" not in owner.manager.running
+    assert [c["camera_id"] for c in nodes["b"].status()["cameras"]] == ["cam-1"]
+
+    nodes["a"].stop()  # a graceful stop hands the rest over at once
+    nodes["b"].tick()
+    assert nodes["b"].owned == ["cam-1"]
+
+
+def test_cluster_route(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert client.get("/api/v1/stream/cluster").status_code == 404
+
+    _, _, nodes = _cluster("a")
+    monkeypatch.setattr(stream, "cluster_coordinator", nodes["a"])
+    response = client.post("/api/v1/stream/start", json=_spec("cam-1"))
+    assert response.json()["success"] is True
+    nodes["a"].tick()
+
+    body = client.get("/api/v1/stream/cluster").json()
+    assert body["node_id"] == "a"
+    assert body["cameras"][0]["node_id"] == "a"
+    assert client.get("/api/v1/stream/status").json()["cluster"]["cameras"] == 1
+
+
+def test_dead_or_unstartable_streams_release_their_lease() -> None:
+    clock, store, nodes = _cluster("a", "b")
+    nodes["a"].start_stream(**_spec("cam-1"))
+    _tick(clock, nodes)
+    owner = next(node for node in nodes.values() if node.owned)
+    other = next(node for node in nodes.values() if node is not owner)
+
+    # The owner's worker gives up reconnecting and the other node cannot start it
+    owner.manager.running.clear()
+    other.manager.start_stream = lambda **spec: False
+    owner.tick()
+    assert owner.owned == [] and owner.dead == 1
+    assert store.owners() == {}  # left for the other node to try
+
+    other.tick()
+    assert other.owned == [] and store.owners() == {}
+
+    # Failed everywhere: any node tries again
+    _tick(clock, nodes)
+    assert store.owners() == {"cam-1": owner.node_id}
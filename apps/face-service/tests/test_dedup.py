@@ -0,0 +1,71 @@
+import pytest
+
+from app.core.config import settings
+from app.services.dedup import MemoryDedupStore, RedisDedupStore, dedup_key, window_for
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """Just enough of redis.Redis for ``SET NX PX``, on a fake clock."""
+
+    def __init__(self, clock: FakeClock) -> None:
+        self.clock = clock
+        self.keys: dict[str, float] = {}
+        self.down = False
+
+    def set(self, name: str, value: str, nx: bool = False, px: int | None = None) -> bool | None:
+        if self.down:
+            raise ConnectionError("redis is down")
+        now = self.clock()
+        if nx and self.keys.get(name, float("-inf")) > now:
+            return None
+        self.keys[name] = now + (px or 0) / 1000
+        return True
+
+
+def test_memory_store_expires_and_prunes() -> None:
+    clock = FakeClock()
+    store = MemoryDedupStore(clock)
+    assert not store.check_and_set("c1:l1:alice", 300)
+    assert store.check_and_set("c1:l1:alice", 300)
+    assert not store.check_and_set("c1:l2:alice", 300)  # another location
+
+    clock.now = 301
+    assert not store.check_and_set("c1:l1:bob", 60)
+    assert len(store) == 1  # both alice keys expired and were dropped
+    assert not store.check_and_set("c1:l1:alice", 300)
+
+
+def test_redis_store_shares_keys_between_instances() -> None:
+    clock = FakeClock()
+    redis = FakeRedis(clock)
+    first, second = RedisDedupStore(client=redis), RedisDedupStore(client=redis)
+
+    assert not first.check_and_set("c1:l1:alice", 300)
+    assert second.check_and_set("c1:l1:alice", 300)
+    clock.now = 300.5
+    assert not second.check_and_set("c1:l1:alice", 300)
+
+
+def test_redis_store_falls_back_to_local_when_down() -> None:
+    redis = FakeRedis(FakeClock())
+    redis.down = True
+    store = RedisDedupStore(client=redis)
+
+    assert not store.check_and_set("c1:l1:alice", 300)
+    assert store.check_and_set("c1:l1:alice", 300)
+    assert store.errors == 2
+
+
+def test_per_location_windows(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "dedup_location_windows", {"gate": 30.0})
+    assert window_for("gate") == 30.0
+    assert window_for("lobby") == settings.dedup_window_seconds
+    assert dedup_key("c1", "gate", "alice") == "c1:gate:alice"
@@ -0,0 +1,173 @@
+import json
+import multiprocessing
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import storage
+from app.services.embedding_store import EmbeddingStore
+
+
+def _rows(seed: int, count: int = 2, dim: int = 8) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def _normal(seed: int) -> np.ndarray:
+    rows = _rows(seed)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_put_get_and_replace(tmp_path: Path) -> None:
+    store = EmbeddingStore(tmp_path / "c1", compact_ratio=1.0)
+    store.put("e1", _rows(1))
+    store.put("e2", _rows(2, count=3))
+    store.put("e1", _rows(3, count=1))
+
+    stored = store.get("e1")
+    assert stored is not None
+    np.testing.assert_allclose(stored[0], _rows(3, count=1)[0] / np.linalg.norm(_rows(3, 1)[0]))
+
+    index = store.read_index()
+    assert index.rows == 6
+    assert index.dead == 2
+    matrix, employee_ids, counts = store.load()
+    assert employee_ids == ["e2", "e1"]
+    assert counts == [3, 1]
+    assert matrix.shape == (4, 8)
+
+
+def test_put_unchanged_skips_employees_written_since_the_fingerprints(tmp_path: Path) -> None:
+    store = EmbeddingStore(tmp_path / "c1")
+    store.put_many({"e1": _rows(1), "e2": _rows(2), "e3": _rows(3)})
+    version, fingerprints = store.fingerprints()
+    store.put("e2", _rows(4))
+    store.delete("e3")
+
+    assert store.put_unchanged(
+        {"e1": _rows(5), "e2": _rows(6), "e3": _rows(7)}, version, fingerprints
+    ) == ["e2", "e3"]
+    np.testing.assert_allclose(store.get("e2"), _normal(4), rtol=1e-6)
+    assert store.get("e3") is None
+    np.testing.assert_allclose(store.get("e1"), _normal(5), rtol=1e-6)
+
+    # A new model's dimension replaces the store
+    version, fingerprints = store.fingerprints()
+    assert store.put_unchanged({"e1": _rows(8, dim=4)}, version, fingerprints) == []
+    assert store.load()[1] == ["e1"]
+    assert store.read_index().dim == 4
+
+
+def test_load_is_a_memory_map_without_tombstones(tmp_path: Path) -> None:
+    store = EmbeddingStore(tmp_path / "c1")
+    store.put_many({"e1": _rows(1), "e2": _rows(2)})
+
+    matrix, _, _ = store.load()
+    assert isinstance(matrix, np.memmap)
+    assert (tmp_path / "c1" / "embeddings-0.f32").stat().st_size == 4 * 8 * 4
+
+
+def test_delete_compacts_once_enough_rows_are_dead(tmp_path: Path) -> None:
+    store = EmbeddingStore(tmp_path / "c1", compact_ratio=0.5)
+    store.put_many({"e1": _rows(1), "e2": _rows(2), "e3": _rows(3)})
+
+    assert store.delete("e1")
+    assert store.read_index().dead == 2
+    assert store.delete("e2")
+    assert not store.delete("e2")
+
+    index = store.read_index()
+    assert (index.generation, index.rows, index.dead) == (1, 2, 0)
+    assert not (tmp_path / "c1" / "embeddings-0.f32").exists()
+    np.testing.assert_allclose(
+        store.get("e3"), _rows(3) / np.linalg.norm(_rows(3), axis=1, keepdims=True), rtol=1e-6
+    )
+
+
+def _put_employees(directory: Path, prefix: str) -> None:
+    store = EmbeddingStore(directory)
+    for i in range(20):
+        store.put(f"{prefix}{i}", _rows(i, count=1))
+
+
+def test_writers_in_several_processes_bump_one_version_counter(tmp_path: Path) -> None:
+    reader = EmbeddingStore(tmp_path / "c1")
+    assert reader.version() == 0
+    EmbeddingStore(tmp_path / "c1").put("e1", _rows(1))
+    assert reader.version() == 1
+
+    context = multiprocessing.get_context("fork")
+    writers = [
+        context.Process(target=_put_employees, args=(tmp_path / "c1", prefix)) for prefix in "ab"
+    ]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(timeout=30)
+        assert writer.exitcode == 0
+
+    assert reader.version() == 41
+    matrix, employee_ids, _ = reader.load()
+    assert (len(employee_ids), len(matrix)) == (41, 42)
+
+
+def test_migrates_legacy_json_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    legacy_dir = tmp_path / "encodings" / "c1"
+    legacy_dir.mkdir(parents=True)
+    for employee_id, seed in (("e1", 1), ("e2", 2)):
+        (legacy_dir / f"{employee_id}.json").write_text(
+            json.dumps({"encodings": _rows(seed).tolist()})
+        )
+
+    assert storage.migrate_json_encodings() == 2
+    assert not list(legacy_dir.glob("e*.json"))
+    assert sorted(storage.load_all_encodings("c1")) == ["e1", "e2"]
+    assert storage.migrate_json_encodings() == 0
+
+
+def test_migration_keeps_unreadable_files_and_an_employee_named_index(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    legacy_dir = tmp_path / "encodings" / "c1"
+    legacy_dir.mkdir(parents=True)
+    (legacy_dir / "index.json").write_text(json.dumps({"encodings": _rows(1).tolist()}))
+    (legacy_dir / "e2.json").write_text(json.dumps({"encodings": _rows(2).tolist()}))
+    (legacy_dir / "bad.json").write_text('{"encodings": [[0.1, ')
+
+    assert storage.migrate_json_encodings() == 2
+    assert sorted(storage.load_all_encodings("c1")) == ["e2", "index"]
+    assert (legacy_dir / "bad.json.unreadable").exists()
+    assert not (legacy_dir / storage.LEGACY_INDEX).exists()
+    assert storage.migrate_json_encodings() == 0
+
+
+def _migrate(counts: "multiprocessing.Queue[int]") -> None:
+    counts.put(storage.migrate_json_encodings())
+
+
+def test_workers_migrating_at_once_migrate_each_file_once(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    for company_id in ("c1", "c2"):
+        legacy_dir = tmp_path / "encodings" / company_id
+        legacy_dir.mkdir(parents=True)
+        for i in range(30):
+            (legacy_dir / f"e{i}.json").write_text(json.dumps({"encodings": _rows(i).tolist()}))
+
+    context = multiprocessing.get_context("fork")
+    counts = context.Queue()
+    workers = [context.Process(target=_migrate, args=(counts,)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+
+    assert sum(counts.get(timeout=5) for _ in workers) == 60
+    for company_id in ("c1", "c2"):
+        assert len(storage.load_all_encodings(company_id)) == 30
+        assert not list((tmp_path / "encodings" / company_id).glob("e*.json"))
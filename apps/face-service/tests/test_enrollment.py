@@ -0,0 +1,83 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core.config import settings
+from app.main import app
+from app.services import face_engine, storage
+
+client = TestClient(app)
+
+
+def _jpeg(value: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), (value, value, value)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def stub_model(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> list[int]:
+    """Detector: one face per image (two for black images). Embedder: mean pixel value."""
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    embed_calls: list[int] = []
+
+    def detect_faces(img: np.ndarray) -> list[dict]:
+        face = {"face": img / 255.0, "facial_area": {"x": 0, "y": 0}, "confidence": 0.9}
+        return [face, face] if not img.any() else [face]
+
+    def embed_faces(faces: list[np.ndarray], model: str | None = None) -> np.ndarray:
+        embed_calls.append(len(faces))
+        return np.array([[face.mean(), 1.0] for face in faces], dtype=np.float32)
+
+    monkeypatch.setattr(face_engine, "detect_faces", detect_faces)
+    monkeypatch.setattr(face_engine, "embed_faces", embed_faces)
+    return embed_calls
+
+
+def test_enroll_embeds_all_images_in_one_call(stub_model: list[int]) -> None:
+    response = client.post(
+        "/api/v1/enroll",
+        data={"company_id": "c1", "employee_id": "e1"},
+        files=[("images", (f"{i}.jpg", _jpeg(100 + i * 50), "image/jpeg")) for i in range(3)],
+    )
+
+    assert response.status_code == 200
+    assert response.json()["face_count"] == 3
+    assert stub_model == [3]
+    assert len(storage.load_encoding("c1", "e1") or []) == 3
+    assert storage.get_photo_count("c1", "e1") == 3
+
+
+def test_enroll_rejects_image_with_several_faces_before_saving() -> None:
+    response = client.post(
+        "/api/v1/enroll",
+        data={"company_id": "c1", "employee_id": "e1"},
+        files=[
+            ("images", ("0.jpg", _jpeg(200), "image/jpeg")),
+            ("images", ("1.jpg", _jpeg(0), "image/jpeg")),
+        ],
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Image 2: Multiple faces detected")
+    assert storage.get_photo_count("c1", "e1") == 0
+
+
+def test_verify_uses_single_pass_analysis() -> None:
+    client.post(
+        "/api/v1/enroll",
+        data={"company_id": "c1", "employee_id": "e1"},
+        files=[("images", ("0.jpg", _jpeg(200), "image/jpeg"))],
+    )
+    response = client.post(
+        "/api/v1/enroll/verify",
+        data={"company_id": "c1", "employee_id": "e1"},
+        files={"image": ("p.jpg", _jpeg(200), "image/jpeg")},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["match"] is True
@@ -0,0 +1,123 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import storage
+from app.services.embedding_store import EmbeddingStore
+from app.services.gallery import Gallery, GalleryCache
+
+
+@pytest.fixture(autouse=True)
+def tmp_storage(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    storage.ensure_directories()
+    return tmp_path
+
+
+def _encodings(seed: int, count: int = 2, dim: int = 8) -> list[list[float]]:
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(count, dim)).tolist()
+
+
+def test_gallery_rows_are_normalized_and_labelled() -> None:
+    gallery = Gallery.from_encodings("c1", {"e1": _encodings(1), "e2": _encodings(2, count=3)})
+    matrix, labels, employee_ids, _ = gallery.snapshot()
+
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (5, 8)
+    np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-5)
+    assert [employee_ids[i] for i in labels] == ["e1", "e1", "e2", "e2", "e2"]
+
+
+def test_gallery_upsert_and_remove() -> None:
+    gallery = Gallery.from_encodings("c1", {"e1": _encodings(1), "e2": _encodings(2)})
+    before = gallery.snapshot().matrix
+
+    gallery.upsert("e1", _encodings(3, count=1))
+    matrix, labels, employee_ids, _ = gallery.snapshot()
+    assert matrix.shape == (3, 8)
+    assert sorted(employee_ids[i] for i in labels) == ["e1", "e2", "e2"]
+    assert before.shape == (4, 8)  # earlier snapshots are untouched
+
+    gallery.remove("e2")
+    matrix, labels, employee_ids, _ = gallery.snapshot()
+    assert employee_ids == ["e1"]
+    assert labels.tolist() == [0]
+    assert len(gallery) == 1
+
+
+def test_cache_loads_lazily_and_tracks_enrollment_changes() -> None:
+    storage.save_encoding("c1", "e1", _encodings(1))
+    cache = GalleryCache(max_bytes=1 << 20)
+
+    gallery = cache.get("c1")
+    assert len(gallery) == 1
+    assert cache.get("c1") is gallery
+    assert cache.stats()["hits"] == 1
+
+    cache.upsert("c1", "e2", _encodings(2))
+    assert len(cache.get("c1")) == 2
+    cache.remove("c1", "e1")
+    assert cache.get("c1").snapshot().employee_ids == ["e2"]
+
+
+def test_cache_evicts_least_recently_used_by_bytes() -> None:
+    for company_id in ("c1", "c2", "c3"):
+        storage.save_encoding(company_id, "e1", _encodings(1, count=4, dim=64))
+    one_gallery = 4 * 64 * 4 + 4 * 4
+    cache = GalleryCache(max_bytes=2 * one_gallery)
+
+    cache.get("c1")
+    cache.get("c2")
+    cache.get("c1")
+    cache.get("c3")
+
+    stats = cache.stats()
+    assert stats["companies"] == 2
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= cache.max_bytes
+    cache.get("c2")
+    assert cache.stats()["misses"] == 4
+
+
+def test_updates_publish_new_immutable_versions() -> None:
+    gallery = Gallery.from_encodings("c1", {"e1": _encodings(1)})
+    first = gallery.snapshot()
+    assert gallery.version == 1
+    with pytest.raises(ValueError):
+        first.matrix[0, 0] = 0.0
+
+    gallery.upsert_many({"e1": _encodings(2, count=1), "e2": _encodings(3), "e3": []})
+    assert gallery.version == 2
+    matrix, labels, employee_ids, _ = gallery.snapshot()
+    assert [employee_ids[i] for i in labels] == ["e1", "e2", "e2"]
+    assert first.employee_ids == ["e1"] and len(first.matrix) == 2
+
+    gallery.remove("e1")
+    assert gallery.version == 3
+    assert gallery.snapshot().employee_ids == ["e2"]
+    assert gallery.snapshot().labels.tolist() == [0, 0]
+
+
+def test_shared_gallery_maps_the_store_and_follows_other_writers(
+    tmp_storage: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "shared_gallery", True)
+    storage.save_encoding("c1", "e1", _encodings(1))
+    cache = GalleryCache(max_bytes=1 << 20)
+    gallery = cache.get("c1")
+    assert isinstance(gallery.snapshot().matrix, np.memmap)
+
+    # Another worker process re-enrolls e1 and enrolls e2
+    other = EmbeddingStore(tmp_storage / "encodings" / "c1", compact_ratio=0.0)
+    other.put_many({"e1": _encodings(2, count=1), "e2": _encodings(3)})
+    cache.upsert("c1", "e1", _encodings(2, count=1))  # no-op: the store is the source
+    assert gallery.stale
+
+    assert cache.get("c1") is gallery
+    matrix, labels, employee_ids, _ = gallery.snapshot()
+    assert isinstance(matrix, np.memmap)
+    assert [employee_ids[i] for i in labels] == ["e1", "e2", "e2"]
+    assert gallery.version == 2 and not gallery.stale
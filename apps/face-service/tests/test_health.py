@@ -1,6 +1,12 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
+from app.services import face_engine
 
 client = TestClient(app)
 
@@ -19,3 +25,32 @@ def test_health_check_v1() -> None:
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "healthy"
+
+
+def test_ready_reflects_model_warmup(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(face_engine, "warmup", face_engine.WarmupState())
+    assert client.get("/ready").status_code == 503
+
+    monkeypatch.setattr(face_engine, "preload_model", lambda: None)
+    assert face_engine.warm_up()
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+def test_failed_warmup_is_not_ready(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(face_engine, "warmup", face_engine.WarmupState())
+
+    def fail() -> None:
+        raise OSError("weights unavailable")
+
+    monkeypatch.setattr(face_engine, "preload_model", fail)
+    assert not face_engine.warm_up()
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["error"] == "weights unavailable"
+
+
+def test_importing_the_app_does_not_import_tensorflow() -> None:
+    code = "import sys, app.main; assert 'tensorflow' not in sys.modules, 'tf imported'"
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=Path(__file__).parents[1])
@@ -0,0 +1,116 @@
+import io
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core.config import settings
+from app.main import app
+from app.services import face_engine
+from app.services.image_cache import ENTRY_OVERHEAD_BYTES, ImageCache, image_cache
+
+client = TestClient(app)
+
+
+def _jpeg(value: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (32, 32), (value, value, value)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def calls(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> dict[str, int]:
+    """Stub detector and embedder that count their calls."""
+    monkeypatch.setattr(settings, "storage_path", str(tmp_path))
+    counts = {"detect": 0, "embed": 0}
+
+    def detect_faces(img: np.ndarray) -> list[dict]:
+        counts["detect"] += 1
+        return [{"face": img / 255.0, "facial_area": {"x": 0, "y": 0}, "confidence": 0.9}]
+
+    def embed_faces(faces: list[np.ndarray], model: str | None = None) -> np.ndarray:
+        counts["embed"] += 1
+        return np.array([[face.mean(), 1.0] for face in faces], dtype=np.float32)
+
+    monkeypatch.setattr(face_engine, "detect_faces", detect_faces)
+    monkeypatch.setattr(face_engine, "embed_faces", embed_faces)
+    return counts
+
+
+def test_cache_evicts_least_recently_used_beyond_memory_cap() -> None:
+    cache = ImageCache(max_bytes=3 * (ENTRY_OVERHEAD_BYTES + 100), ttl=60)
+    for key in "abc":
+        cache.put(key, key.upper(), 100)
+    assert cache.get("a") == "A"
+    cache.put("d", "D", 100)
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    cache.put("huge", "X", 10 * cache.max_bytes)
+    assert cache.get("huge") is None
+    assert cache.stats()["evictions"] == 1
+    assert cache.nbytes == 3 * (ENTRY_OVERHEAD_BYTES + 100)
+
+
+def test_cache_entries_expire() -> None:
+    cache = ImageCache(max_bytes=1 << 20, ttl=0.05)
+    cache.put("a", "A", 10)
+    assert cache.get("a") == "A"
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.nbytes == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_detect_then_enroll_runs_the_model_once_per_image(calls: dict[str, int]) -> None:
+    image = _jpeg(120)
+    hits = image_cache.hits
+    detected = client.post("/api/v1/enroll/detect", files={"image": ("a.jpg", image, "image/jpeg")})
+    assert detected.json()["detected"] is True
+    assert calls == {"detect": 1, "embed": 0}
+
+    enrolled = client.post(
+        "/api/v1/enroll",
+        data={"company_id": "c1", "employee_id": "e1"},
+        files=[("images", ("a.jpg", image, "image/jpeg"))],
+    )
+    assert enrolled.status_code == 200
+    assert calls == {"detect": 1, "embed": 1}
+
+    for _ in range(2):  # a retried verify is a cache hit
+        verified = client.post(
+            "/api/v1/enroll/verify",
+            data={"company_id": "c1", "employee_id": "e1"},
+            files={"image": ("a.jpg", image, "image/jpeg")},
+        )
+        assert verified.json()["match"] is True
+    assert calls == {"detect": 1, "embed": 1}
+    assert image_cache.hits - hits == 3
+    metrics = client.get("/metrics").text
+    assert f'face_image_cache_requests_total{{result="hit"}} {image_cache.hits}' in metrics
+
+
+def test_model_settings_are_part_of_the_key(
+    calls: dict[str, int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    image = _jpeg(120)
+    face_engine.extract_encoding(image)
+    monkeypatch.setattr(settings, "face_detector", "cv2-yunet")
+    face_engine.extract_encoding(image)
+    face_engine.analyze_faces([image], model="ArcFace")  # re-embedding bypasses the cache
+    face_engine.analyze_faces([image], model="ArcFace")
+    assert calls == {"detect": 4, "embed": 4}
+
+
+def test_disabled_cache_stores_nothing(
+    calls: dict[str, int], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(image_cache, "max_bytes", 0)
+    image = _jpeg(120)
+    face_engine.extract_encoding(image)
+    face_engine.extract_encoding(image)
+    assert calls == {"detect": 2, "embed": 2}
+    assert image_cache.stats()["entries"] == 0
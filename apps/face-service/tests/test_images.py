@@ -0,0 +1,79 @@
+import io
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.core.config import settings
+from app.main import app
+from app.services import images
+
+client = TestClient(app)
+
+
+def _jpeg(width: int, height: int, orientation: int = 1) -> bytes:
+    img = Image.fromarray(np.full((height, width, 3), 120, dtype=np.uint8))
+    exif = Image.Exif()
+    exif[images.EXIF_ORIENTATION] = orientation
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", exif=exif)
+    return buf.getvalue()
+
+
+def test_decode_downscales_large_photos_to_max_side() -> None:
+    decoded = images.decode(_jpeg(3000, 2000), max_side=1280)
+    assert decoded.pixels.shape == (853, 1280, 3)
+    assert decoded.scale == pytest.approx(1280 / 3000)
+
+    full = images.decode(_jpeg(3000, 2000), max_side=0)
+    assert full.pixels.shape == (2000, 3000, 3)
+    assert full.scale == 1.0
+
+
+def test_decode_applies_exif_orientation() -> None:
+    decoded = images.decode(_jpeg(400, 200, orientation=6), max_side=100)
+    # Stored landscape, displayed portrait
+    assert decoded.pixels.shape == (100, 50, 3)
+    assert decoded.scale == pytest.approx(0.25)
+
+
+def test_rescale_area_maps_back_to_original_pixels() -> None:
+    area = {"x": 10, "y": 20, "w": 30, "h": 40, "left_eye": (15, 25), "right_eye": None}
+    assert images.rescale_area(area, 0.5) == {
+        "x": 20,
+        "y": 40,
+        "w": 60,
+        "h": 80,
+        "left_eye": (30, 50),
+        "right_eye": None,
+    }
+    assert images.rescale_area(area, 1.0) is area
+
+
+def test_oversized_image_is_rejected(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "max_image_bytes", 100)
+    response = client.post(
+        "/api/v1/attendance/identify",
+        data={"company_id": "c1"},
+        files={"image": ("big.jpg", _jpeg(64, 64), "image/jpeg")},
+    )
+    assert response.status_code == 413
+
+
+def test_oversized_body_is_rejected_while_streaming(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "max_upload_bytes", 1000)
+    response = client.post(
+        "/api/v1/attendance/identify",
+        data={"company_id": "c1"},
+        files={"image": ("big.jpg", b"x" * 2000, "image/jpeg")},
+    )
+    assert response.status_code == 413
+
+    # Chunked, without a Content-Length to check up front
+    response = client.post(
+        "/api/v1/attendance/identify",
+        content=(b"x" * 400 for _ in range(5)),
+        headers={"content-type": "multipart/form-data; boundary=b"},
+    )
+    assert response.status_code == 413
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from app.services import face_engine, inference
+from app.services.inference import (
+    InferenceExecutor,
+    InferenceOverloadedError,
+    InferenceTimeoutError,
+)
+
+
+@pytest.fixture
+def executor() -> Iterator[InferenceExecutor]:
+    ex = InferenceExecutor(workers=1, max_in_flight=1, max_batch=8)
+    yield ex
+    ex.stop()
+
+
+def _block(ex: InferenceExecutor) -> threading.Event:
+    """Occupy the only in-flight slot until the returned event is set."""
+    gate = threading.Event()
+    started = threading.Event()
+
+    def hold() -> None:
+        started.set()
+        gate.wait(5)
+
+    ex.submit(hold, tenant="blocker")
+    assert started.wait(5)
+    return gate
+
+
+def test_round_robin_across_tenants(executor: InferenceExecutor) -> None:
+    order: list[str] = []
+    gate = _block(executor)
+    futures = [executor.submit(order.append, f"a{i}", tenant="a") for i in range(3)]
+    futures.append(executor.submit(order.append, "b0", tenant="b"))
+    assert executor.pending == 4
+    gate.set()
+    for f in futures:
+        f.result(timeout=5)
+
+    assert order == ["a0", "b0", "a1", "a2"]
+
+
+def test_embed_jobs_are_merged_into_one_model_call(
+    executor: InferenceExecutor, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls: list[int] = []
+
+    def fake_embed(faces: list[np.ndarray]) -> np.ndarray:
+        calls.append(len(faces))
+        return np.stack([face.reshape(-1) for face in faces])
+
+    monkeypatch.setattr(face_engine, "embed_faces", fake_embed)
+    gate = _block(executor)
+    first = executor.submit_embed([np.full(2, 1.0), np.full(2, 2.0)], tenant="a", source="cam-1")
+    second = executor.submit_embed([np.full(2, 3.0)], tenant="b", source="cam-2")
+    gate.set()
+
+    assert first.result(timeout=5)[:, 0].tolist() == [1.0, 2.0]
+    assert second.result(timeout=5)[:, 0].tolist() == [3.0]
+    assert calls == [3]
+    assert executor.stats()["batched_jobs"] == 2
+
+
+async def test_run_awaits_without_blocking(executor: InferenceExecutor) -> None:
+    assert await executor.run(sum, [1, 2, 3]) == 6
+    with pytest.raises(ValueError):
+        await executor.run(int, "not a number")
+
+
+async def test_run_sheds_when_queue_is_full(executor: InferenceExecutor) -> None:
+    executor.max_queue = 1
+    gate = _block(executor)
+    queued = executor.submit(sum, [1])
+    try:
+        with pytest.raises(InferenceOverloadedError):
+            await executor.run(sum, [2])
+        assert executor.stats()["shed"] == 1
+    finally:
+        gate.set()
+    assert queued.result(timeout=5) == 1
+
+
+async def test_run_times_out_and_cancels_queued_job(executor: InferenceExecutor) -> None:
+    gate = _block(executor)
+    try:
+        with pytest.raises(InferenceTimeoutError):
+            await executor.run(sum, [1], timeout=0.05)
+    finally:
+        gate.set()
+    assert executor.stats()["timed_out"] == 1
+
+
+def _thread_pool_as_processes(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Run process-mode pools on threads, which run the same per-worker initializer."""
+
+    def pool(workers: int, mp_context: object, initializer: Callable[[], object]) -> Executor:
+        return ThreadPoolExecutor(workers, initializer=initializer)
+
+    monkeypatch.setattr(inference, "ProcessPoolExecutor", pool)
+    monkeypatch.setattr(face_engine, "warmup", face_engine.WarmupState())
+
+
+def test_process_mode_warms_up_every_worker_and_not_the_parent(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    _thread_pool_as_processes(monkeypatch)
+    loads: list[str] = []
+
+    def preload() -> None:
+        time.sleep(0.05)
+        loads.append(threading.current_thread().name)
+
+    monkeypatch.setattr(face_engine, "preload_model", preload)
+    ex = InferenceExecutor(mode="process", workers=2)
+    try:
+        assert ex.warm_up()
+    finally:
+        ex.stop()
+    assert len(loads) == 2
+    assert threading.main_thread().name not in loads
+    assert face_engine.warmup.status == "ready"
+
+
+def test_process_mode_is_not_ready_when_a_worker_fails(monkeypatch: pytest.MonkeyPatch) -> None:
+    _thread_pool_as_processes(monkeypatch)
+
+    def fail() -> None:
+        raise OSError("weights unavailable")
+
+    monkeypatch.setattr(face_engine, "preload_model", fail)
+    ex = InferenceExecutor(mode="process", workers=2)
+    try:
+        assert not ex.warm_up()
+    finally:
+        ex.stop()
+    assert face_engine.warmup.status == "failed"
+    assert face_engine.warmup.error == "weights unavailable"
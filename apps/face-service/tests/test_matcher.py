@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import matcher
+from app.services.gallery import Gallery
+
+
+def _gallery() -> Gallery:
+    return Gallery.from_encodings(
+        "c1",
+        {
+            "alice": [[1.0, 0.0, 0.0], [0.8, 0.6, 0.0]],
+            "bob": [[0.0, 1.0, 0.0]],
+            "carol": [[0.0, 0.0, 1.0], [0.0, 0.6, 0.8]],
+        },
+    )
+
+
+def test_match_reduces_to_best_sample_per_employee() -> None:
+    results = matcher.match(_gallery(), [[0.0, 0.6, 0.8]], top_k=3)[0]
+
+    assert [m.employee_id for m in results] == ["carol", "bob", "alice"]
+    assert results[0].confidence == pytest.approx(1.0)
+    assert results[2].confidence == pytest.approx(0.36)
+
+
+def test_match_scores_a_batch_of_probes() -> None:
+    probes = np.array([[2.0, 0.0, 0.0], [0.0, 3.0, 0.0]])
+    results = matcher.match(_gallery(), probes)
+
+    assert [r[0].employee_id for r in results] == ["alice", "bob"]
+
+
+def test_match_handles_unsorted_labels_after_updates() -> None:
+    gallery = _gallery()
+    gallery.upsert("alice", [[0.0, 0.0, -1.0]])
+    gallery.upsert("bob", [[1.0, 0.0, 0.0]])
+
+    assert matcher.best_match(gallery, [1.0, 0.1, 0.0]).employee_id == "bob"  # type: ignore[union-attr]
+
+
+def test_threshold_follows_min_confidence(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "min_confidence", 0.9)
+    best = matcher.best_match(_gallery(), [0.8, 0.2, 0.5])
+
+    assert best is not None
+    assert best.employee_id == "alice"
+    assert not best.accepted
+
+
+def test_empty_gallery_and_negative_scores() -> None:
+    assert matcher.best_match(Gallery.from_encodings("c1", {}), [1.0, 0.0]) is None
+    assert matcher.best_match(_gallery(), [-1.0, -1.0, -1.0]) is None
+    assert matcher.best_similarity([[1.0, 0.0]], [-1.0, 0.0]) == 0.0
@@ -0,0 +1,91 @@
+import io
+import threading
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import app
+from app.services import face_engine
+from app.services.dedup import MemoryDedupStore
+from app.services.gallery import Gallery, gallery_cache
+from app.services.metrics import Registry
+from app.services.stream_manager import StreamWorker, stream_manager
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    registry = Registry()
+    histogram = registry.histogram("op_seconds", "An operation", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, kind="a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE op_seconds histogram" in lines
+    assert 'op_seconds_bucket{kind="a",le="0.1"} 1' in lines
+    assert 'op_seconds_bucket{kind="a",le="1"} 3' in lines
+    assert 'op_seconds_bucket{kind="a",le="+Inf"} 4' in lines
+    assert 'op_seconds_count{kind="a"} 4' in lines
+    assert 'op_seconds_sum{kind="a"} 4.25' in lines
+
+
+def test_counter_labels_are_escaped_and_checked() -> None:
+    registry = Registry()
+    counter = registry.counter("events_total", "Events", ("source",))
+    counter.inc(source='cam "1"\\x')
+    counter.inc(2, source='cam "1"\\x')
+    assert 'events_total{source="cam \\"1\\"\\\\x"} 3' in registry.render()
+    with pytest.raises(ValueError):
+        counter.inc(camera="1")
+    assert registry.counter("events_total", "Events", ("source",)) is counter
+
+
+def test_timer_decorator_is_safe_across_threads() -> None:
+    histogram = Registry().histogram("call_seconds", "Calls")
+    timed = histogram.time()(lambda: None)
+    threads = [threading.Thread(target=lambda: [timed() for _ in range(200)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert histogram.count() == 800
+
+
+def test_metrics_endpoint_exports_cameras_galleries_and_timings(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    worker = StreamWorker(
+        "cam-1", "rtsp://x", "c1", "l1", "", stream_manager.pipeline, None, MemoryDedupStore()
+    )
+    worker.frames_read, worker.frames_submitted, worker.reconnects = 300, 10, 2
+    monkeypatch.setitem(stream_manager._workers, "cam-1", worker)
+    gallery = Gallery.from_encodings("c1", {"e1": [[1.0, 0.0]] * 3, "e2": [[0.0, 1.0]]})
+    monkeypatch.setitem(gallery_cache._galleries, "c1", gallery)
+    png = io.BytesIO()
+    Image.fromarray(np.zeros((8, 8, 3), dtype=np.uint8)).save(png, format="PNG")
+    decoded = face_engine.DECODE_SECONDS.count()
+    face_engine._load_image(png.getvalue())
+    assert face_engine.DECODE_SECONDS.count() == decoded + 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    assert 'face_stream_frames_read_total{camera_id="cam-1"} 300' in lines
+    assert 'face_stream_frames_sampled_total{camera_id="cam-1"} 10' in lines
+    assert 'face_stream_reconnects_total{camera_id="cam-1"} 2' in lines
+    assert 'face_gallery_employees{company_id="c1"} 2' in lines
+    assert 'face_gallery_embeddings{company_id="c1"} 4' in lines
+    assert "face_inference_queue_depth 0" in lines
+    assert 'face_pipeline_queue_depth{stage="detect"} 0' in lines
+    for name in (
+        "face_image_decode_seconds",
+        "face_detect_seconds",
+        "face_embed_seconds",
+        "gallery_match_seconds",
+        "storage_load_seconds",
+        "callback_delivery_seconds",
+    ):
+        assert f"# TYPE {name} histogram" in lines
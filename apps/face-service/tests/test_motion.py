@@ -0,0 +1,64 @@
+import numpy as np
+
+from app.services.motion import MotionGate
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def scene(box_x: int | None = None) -> np.ndarray:
+    frame = np.full((240, 320, 3), 80, dtype=np.uint8)
+    if box_x is not None:
+        frame[80:160, box_x : box_x + 60] = 230
+    return frame
+
+
+def test_still_scene_backs_off_to_idle_interval() -> None:
+    clock = FakeClock()
+    gate = MotionGate(active_interval=5, idle_interval=50, hold_seconds=1.0, clock=clock)
+
+    passed = []
+    for i in range(200):
+        clock.now = i / 25
+        if gate.should_process(scene()):
+            passed.append(i)
+
+    # The first comparison counts as motion; after the hold expires only heartbeats pass
+    assert passed[0] == 4
+    assert all(b - a == 50 for a, b in zip(passed[-3:], passed[-2:], strict=False))
+    assert gate.frames_gated == 200 - len(passed)
+    assert not gate.active
+
+
+def test_motion_samples_at_active_interval() -> None:
+    clock = FakeClock()
+    gate = MotionGate(active_interval=5, idle_interval=50, hold_seconds=1.0, clock=clock)
+    for i in range(100):
+        clock.now = i / 25
+        gate.should_process(scene())
+    idle_passed = gate.frames_passed
+
+    for i in range(100, 150):
+        clock.now = i / 25
+        gate.should_process(scene(box_x=(i * 4) % 250))
+
+    assert gate.active
+    assert gate.frames_passed - idle_passed >= 9
+    # Frames between samples are skipped without being compared
+    assert gate.motion_checks <= gate.frames_seen // 5 + 1
+
+
+def test_small_changes_below_threshold_are_ignored() -> None:
+    gate = MotionGate(threshold=0.05, active_interval=1, idle_interval=1000)
+    rng = np.random.default_rng(0)
+    gate.should_process(scene())
+    noisy = [
+        np.clip(scene().astype(int) + rng.integers(-3, 4, (240, 320, 3)), 0, 255).astype(np.uint8)
+        for _ in range(5)
+    ]
+    assert [gate.motion_score(frame) < 0.05 for frame in noisy] == [True] * 5
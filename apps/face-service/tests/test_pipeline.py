@@ -0,0 +1,64 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.services import face_engine
+from app.services.gallery import Gallery
+from app.services.inference import InferenceExecutor
+from app.services.pipeline import BoundedQueue, FrameTask, StreamPipeline
+
+
+def test_bounded_queue_drops_oldest_when_full() -> None:
+    queue: BoundedQueue[int] = BoundedQueue(maxsize=2)
+    assert queue.put(1)
+    assert queue.put(2)
+    assert not queue.put(3)
+
+    assert [item for _, item in queue.get_batch(10, timeout=0)] == [2, 3]
+    assert queue.dropped == 1
+
+
+def test_pipeline_batches_frames_through_to_the_handler(monkeypatch: pytest.MonkeyPatch) -> None:
+    embed_batches: list[int] = []
+
+    def fake_detect(img: np.ndarray) -> list[dict]:
+        return [{"face": img, "facial_area": {}, "confidence": 0.99}] if img.any() else []
+
+    def fake_embed(faces: list[np.ndarray]) -> np.ndarray:
+        embed_batches.append(len(faces))
+        return np.stack([face.reshape(-1).astype(np.float32) for face in faces])
+
+    monkeypatch.setattr(face_engine, "detect_faces", fake_detect)
+    monkeypatch.setattr(face_engine, "embed_faces", fake_embed)
+
+    gallery = Gallery.from_encodings("c1", {"alice": [[1.0, 0.0]], "bob": [[0.0, 1.0]]})
+    results: list[tuple[str, str]] = []
+    done = threading.Event()
+
+    def frame(camera_id: str, pixels: list[float]) -> FrameTask:
+        def on_identified(result: dict) -> None:
+            results.append((camera_id, result["employee_id"]))
+            if len(results) == 2:
+                done.set()
+
+        image = np.array(pixels, dtype=np.float32).reshape(1, 2, 1)
+        return FrameTask(camera_id, "c1", image, gallery, on_identified)
+
+    executor = InferenceExecutor(workers=2)
+    pipeline = StreamPipeline(executor)
+    pipeline.start()
+    try:
+        pipeline.submit(frame("cam-1", [0.9, 0.1]))
+        pipeline.submit(frame("cam-2", [0.0, 0.0]))  # no face
+        pipeline.submit(frame("cam-3", [0.2, 0.8]))
+        assert done.wait(timeout=5)
+    finally:
+        pipeline.stop()
+        executor.stop()
+
+    assert sorted(results) == [("cam-1", "alice"), ("cam-3", "bob")]
+    stats = pipeline.stats()
+    assert stats["stages"]["detect"]["processed"] == 3
+    assert stats["stages"]["embed"]["processed"] == 2
+    assert sum(embed_batches) == 2
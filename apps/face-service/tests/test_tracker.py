@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from app.services import face_engine
+from app.services.gallery import Gallery
+from app.services.inference import InferenceExecutor
+from app.services.pipeline import (
+    BoundedQueue,
+    EmbeddedFace,
+    FaceTask,
+    FrameTask,
+    detect_stage,
+    embed_stage,
+    match_stage,
+    release_claim,
+)
+from app.services.tracker import FaceTracker, iou
+
+
+def test_iou() -> None:
+    assert iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert iou((0, 0, 10, 10), (5, 0, 10, 10)) == pytest.approx(50 / 150)
+    assert iou((0, 0, 10, 10), (20, 20, 5, 5)) == 0.0
+
+
+def test_tracks_follow_moving_faces_and_expire() -> None:
+    tracker = FaceTracker(max_age=1.0)
+    a, b = tracker.update([(0, 0, 40, 40), (200, 0, 40, 40)], now=0.0)
+    assert a.track_id != b.track_id
+
+    # Listed in the other order and moved; the right-hand face jumps further than IoU allows
+    b2, a2 = tracker.update([(225, 5, 40, 40), (8, 2, 40, 40)], now=0.2)
+    assert (a2, b2) == (a, b)
+    assert a.hits == 2
+
+    (c,) = tracker.update([(8, 2, 40, 40)], now=5.0)
+    assert c is not a
+    assert tracker.stats()["active_tracks"] == 1
+
+
+def test_claims_stop_after_quota_or_resolution() -> None:
+    tracker = FaceTracker(max_embeddings=2)
+    (track,) = tracker.update([(0, 0, 10, 10)], now=0.0)
+    assert tracker.claim(track)
+    assert tracker.claim(track)
+    assert not tracker.claim(track)
+
+    fused = tracker.add_embedding(track, np.array([1.0, 0.0], dtype=np.float32))
+    fused = tracker.add_embedding(track, np.array([0.0, 1.0], dtype=np.float32))
+    np.testing.assert_allclose(fused, [2**-0.5, 2**-0.5], rtol=1e-6)
+
+    (other,) = tracker.update([(100, 100, 10, 10)], now=0.0)
+    assert tracker.resolve(other, "alice", 0.9)
+    assert not tracker.resolve(other, "alice", 0.9)
+    assert not tracker.claim(other)
+
+
+def test_resolved_track_is_not_embedded_again(monkeypatch: pytest.MonkeyPatch) -> None:
+    detection = {"face": np.ones((2, 2)), "facial_area": {"x": 10, "y": 10, "w": 50, "h": 50}}
+    monkeypatch.setattr(face_engine, "detect_faces", lambda img: [{**detection, "confidence": 1}])
+    gallery = Gallery.from_encodings("c1", {"alice": [[1.0, 0.0]]})
+    tracker = FaceTracker(max_embeddings=3)
+    identified: list[dict] = []
+    executor = InferenceExecutor(workers=1)
+
+    def frame(at: float) -> FrameTask:
+        image = np.zeros((1, 1, 3))
+        return FrameTask("cam-1", "c1", image, gallery, identified.append, at, tracker)
+
+    try:
+        faces = detect_stage(executor, [frame(0.0)])
+        assert len(faces) == 1
+        embedded = [EmbeddedFace(faces[0], np.array([0.95, 0.05], dtype=np.float32))]
+        for item in match_stage(embedded):
+            item.frame.on_identified(item.result)
+
+        assert detect_stage(executor, [frame(0.2), frame(0.4)]) == []
+    finally:
+        executor.stop()
+
+    assert [r["employee_id"] for r in identified] == ["alice"]
+    assert tracker.stats()["embeds_skipped"] == 2
+
+
+def test_failed_or_dropped_embeds_give_their_claim_back(monkeypatch: pytest.MonkeyPatch) -> None:
+    detection = {"face": np.ones((2, 2)), "facial_area": {"x": 10, "y": 10, "w": 50, "h": 50}}
+    monkeypatch.setattr(face_engine, "detect_faces", lambda img: [{**detection, "confidence": 1}])
+
+    def fail(faces: list[np.ndarray]) -> np.ndarray:
+        raise RuntimeError("model crashed")
+
+    monkeypatch.setattr(face_engine, "embed_faces", fail)
+    gallery = Gallery.from_encodings("c1", {"alice": [[1.0, 0.0]]})
+    tracker = FaceTracker(max_embeddings=1)
+    executor = InferenceExecutor(workers=1)
+
+    def frame(at: float) -> FrameTask:
+        image = np.zeros((1, 1, 3))
+        return FrameTask("cam-1", "c1", image, gallery, lambda result: None, at, tracker)
+
+    try:
+        faces = detect_stage(executor, [frame(0.0)])
+        with pytest.raises(RuntimeError):
+            embed_stage(executor, faces)
+
+        # The failed embed no longer counts against the quota
+        (face,) = detect_stage(executor, [frame(0.2)])
+        assert face.track.pending == 1
+        # Neither does one dropped from a full queue
+        queue: BoundedQueue[FaceTask] = BoundedQueue(maxsize=1, on_drop=release_claim)
+        queue.put(face)
+        queue.put(FaceTask(frame(0.3), detection))
+        assert face.track.pending == 0
+        assert len(detect_stage(executor, [frame(0.4)])) == 1
+    finally:
+        executor.stop()